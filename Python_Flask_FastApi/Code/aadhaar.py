@@ -0,0 +1,169 @@
+import gzip
+import os
+import re
+import zlib
+from xml.etree import ElementTree
+
+from word_diff import normalize, same_word
+
+# Aadhaar QR payloads (secure QR and the older XML QR): parsing, signature check and
+# cross-check against the printed text. The signature is checked only when IDP_UIDAI_CERT
+# is set and `cryptography` is installed; otherwise it is reported as None.
+
+UIDAI_CERT = os.environ.get("IDP_UIDAI_CERT")
+DELIMITER = b"\xff"
+SIGNATURE_BYTES = 256
+HASH_BYTES = 32
+
+SECURE_FIELDS = ("email_mobile_status", "reference_id", "name", "dob", "gender", "care_of", "district",
+                 "landmark", "house", "location", "pincode", "post_office", "state", "street",
+                 "sub_district", "vtc")
+XML_FIELDS = {"uid": "uid", "name": "name", "gender": "gender", "yob": "yob", "dob": "dob", "co": "care_of",
+              "house": "house", "street": "street", "lm": "landmark", "loc": "location", "vtc": "vtc",
+              "po": "post_office", "dist": "district", "subdist": "sub_district", "state": "state", "pc": "pincode"}
+GENDERS = {"m": "male", "f": "female", "t": "transgender"}
+
+_DATE = re.compile(r"\b(\d{2})[/\-.](\d{2})[/\-.](\d{4})\b")
+_AADHAAR_NUMBER = re.compile(r"\b[\dxX]{4}\s?[\dxX]{4}\s?(\d{4})\b")
+
+
+def parse_secure_qr(text):
+    """Fields of a secure QR payload (the decimal string), or None if it is not one."""
+    text = text.strip()
+    if len(text) < 100 or not text.isdigit():
+        return None
+    number = int(text)
+    try:
+        data = gzip.decompress(number.to_bytes((number.bit_length() + 7) // 8, "big"))
+    except (OSError, EOFError, zlib.error):
+        return None
+
+    version = None
+    if data[:1] == b"V":
+        version, _, rest = data.partition(DELIMITER)
+        version = version.decode("latin-1")
+    else:
+        rest = data
+    names = SECURE_FIELDS + (("mobile_last4",) if version else ())
+    parts = rest.split(DELIMITER, len(names))
+    if len(parts) <= len(names):
+        return None
+
+    fields = {name: value.decode("latin-1") for name, value in zip(names, parts)}
+    tail = parts[-1]  # Photo, hashes and signature; binary, so it may contain 0xFF itself
+    status = int(fields["email_mobile_status"]) if fields["email_mobile_status"].isdigit() else 0
+    hashes = HASH_BYTES * ((status & 1) + (status >> 1 & 1))
+    result = dict(fields, format="secure", version=version or "V1",
+                  aadhaar_last4=fields["reference_id"][:4],
+                  photo=tail[:max(len(tail) - SIGNATURE_BYTES - hashes, 0)],
+                  signed_data=data[:-SIGNATURE_BYTES], signature=data[-SIGNATURE_BYTES:])
+    return result
+
+
+def parse_xml_qr(text):
+    """Fields of an older XML QR payload, or None."""
+    start = text.find("<PrintLetterBarcodeData")
+    if start < 0:
+        return None
+    try:
+        element = ElementTree.fromstring(text[start:])
+    except ElementTree.ParseError:
+        return None
+    fields = {name: element.attrib.get(attribute, "") for attribute, name in XML_FIELDS.items()}
+    fields.update(format="xml", version="xml", aadhaar_last4=fields["uid"][-4:])
+    return fields
+
+
+def parse(text):
+    """Parsed Aadhaar QR fields for a decoded payload, or None if it is not an Aadhaar QR."""
+    return parse_secure_qr(text) or parse_xml_qr(text)
+
+
+def verify_signature(parsed, cert_path=UIDAI_CERT):
+    """True/False for a secure QR's UIDAI signature; None when it cannot be checked here."""
+    if parsed.get("format") != "secure" or not cert_path:
+        return None
+    try:
+        from cryptography import x509
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+    except ImportError:
+        return None
+    with open(cert_path, "rb") as source:
+        certificate = x509.load_pem_x509_certificate(source.read())
+    try:
+        certificate.public_key().verify(parsed["signature"], parsed["signed_data"], padding.PKCS1v15(),
+                                        hashes.SHA256())
+        return True
+    except InvalidSignature:
+        return False
+
+
+def _check_name(name, words):
+    tokens = [normalize(token) for token in name.split() if normalize(token)]
+    if not tokens:
+        return "missing"
+    found = sum(1 for token in tokens if any(same_word(token, word) for word in words))
+    if found == len(tokens):
+        return "match"
+    return "mismatch" if found else "missing"
+
+
+def _check_dob(parsed, text):
+    dates = {"".join(match) for match in _DATE.findall(text)}
+    dob = re.sub(r"\D", "", parsed.get("dob") or "")
+    if len(dob) == 8:
+        if dob in dates:
+            return "match"
+        return "mismatch" if dates else "missing"
+    year = parsed.get("yob") or ""
+    if year:
+        years = set(re.findall(r"\b(?:19|20)\d{2}\b", text))
+        if year in years:
+            return "match"
+        return "mismatch" if years else "missing"
+    return "missing"
+
+
+def _check_gender(parsed, words):
+    expected = GENDERS.get((parsed.get("gender") or "")[:1].lower())
+    printed = {word for word in words if word in GENDERS.values()}
+    if expected is None or not printed:
+        return "missing"
+    return "match" if expected in printed else "mismatch"
+
+
+def _check_number(parsed, text):
+    printed = set(_AADHAAR_NUMBER.findall(text))
+    if not printed or not parsed.get("aadhaar_last4"):
+        return "missing"
+    return "match" if parsed["aadhaar_last4"] in printed else "mismatch"
+
+
+def verify_against_text(parsed, text, cert_path=UIDAI_CERT):
+    """
+    Cross-check QR fields with the OCR text of the card. Each check is
+    "match", "mismatch" (printed differently) or "missing" (not found in
+    the text). The card is verified when the name matches and nothing
+    mismatches; a failed signature check overrides both.
+    """
+    words = [normalize(word) for word in text.split()]
+    checks = {
+        "name": _check_name(parsed.get("name") or "", words),
+        "dob": _check_dob(parsed, text),
+        "gender": _check_gender(parsed, words),
+        "aadhaar_last4": _check_number(parsed, text),
+    }
+    signature = verify_signature(parsed, cert_path)
+    verified = checks["name"] == "match" and "mismatch" not in checks.values() and signature is not False
+    return {"checks": checks, "signature_valid": signature, "verified": verified}
+
+
+def summary(parsed):
+    """The JSON-ready part of parsed fields (no photo or signature bytes)."""
+    hidden = ("photo", "signed_data", "signature")
+    result = {key: value for key, value in parsed.items() if key not in hidden}
+    if "photo" in parsed:
+        result["photo_bytes"] = len(parsed["photo"])
+    return result
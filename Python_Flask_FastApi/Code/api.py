@@ -0,0 +1,434 @@
+import asyncio
+import contextvars
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from PIL import UnidentifiedImageError
+
+import bank_statement
+import detect_based_on_pixel
+import instrument
+import jobs
+import pages
+import pyramid
+import result_cache
+import text_extraction
+import triage as triage_module
+from output_cache import outputs
+from result_cache import results
+
+# One async FastAPI service for all document analyzers: uvicorn api:app --host 0.0.0.0 --port 5000
+# CPU-bound work runs in a bounded worker pool, so a full pool answers 429 and a slow analysis 504.
+# Results are cached by content (result_cache.py); /metrics and Server-Timing come from instrument.py.
+
+POOL_KIND = os.environ.get("IDP_POOL", "process")  # "process" or "thread"
+WORKERS = int(os.environ.get("IDP_WORKERS", os.cpu_count() or 1))
+QUEUE_SIZE = int(os.environ.get("IDP_QUEUE_SIZE", 2 * WORKERS))  # Requests allowed to wait for a worker
+TIMEOUT = float(os.environ.get("IDP_TIMEOUT", 30))  # Seconds per analysis
+MAX_UPLOAD_BYTES = int(float(os.environ.get("IDP_MAX_UPLOAD_MB", 25)) * 1024 * 1024)
+UPLOAD_CHUNK = 1024 * 1024
+JOB_WORKERS = int(os.environ.get("IDP_JOB_WORKERS", 0))  # Job queue workers started with the app; 0: run jobs.py separately
+PROFILE_KINDS = ("cprofile", "pyinstrument")
+
+# Per-request timing state shared between the middleware and analyze()
+_request_timing = contextvars.ContextVar("idp_request_timing", default=None)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Executor wrapper that admits at most `workers + queue_size` tasks.
+    A slot is only released when the task really finishes, so a request
+    that timed out keeps counting against capacity until its worker is free.
+    """
+
+    def __init__(self, executor, capacity):
+        self.executor = executor
+        self.capacity = capacity
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args, timeout=TIMEOUT):
+        with self._lock:
+            if self.pending >= self.capacity:
+                raise QueueFull()
+            self.pending += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _make_executor():
+    if POOL_KIND == "thread":
+        executor = ThreadPoolExecutor(max_workers=WORKERS)
+    else:
+        executor = ProcessPoolExecutor(max_workers=WORKERS)
+    return BoundedExecutor(executor, WORKERS + QUEUE_SIZE)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.pool = _make_executor()
+    app.state.jobs = jobs.JobStore()
+    supervisor = None
+    if JOB_WORKERS:
+        supervisor = multiprocessing.Process(target=jobs.supervise, args=(JOB_WORKERS, app.state.jobs.db_path))
+        supervisor.start()
+    yield
+    if supervisor is not None:
+        supervisor.terminate()  # SIGTERM: supervise() stops and joins its workers
+        await asyncio.to_thread(supervisor.join)
+    app.state.pool.shutdown()
+
+
+app = FastAPI(title="SealSure document analysis", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["Server-Timing", "X-Profile-Report"])
+
+
+def _server_timing(records):
+    # Stages that ran more than once (e.g. ELA recompress per quality) are summed
+    totals = {}
+    for entry in records:
+        totals[entry["stage"]] = totals.get(entry["stage"], 0.0) + entry["seconds"]
+    return ", ".join(f'{name.replace(".", "-")};dur={seconds * 1000:.1f}' for name, seconds in totals.items())
+
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    profile_kind = request.headers.get(instrument.PROFILE_HEADER, "").strip().lower() or None
+    if not instrument.ALLOW_PROFILE or profile_kind not in PROFILE_KINDS:
+        profile_kind = None
+    # A mutable holder: the endpoint runs in a copy of this context and fills it in
+    timing = {"records": [], "profile": profile_kind, "report": None}
+    token = _request_timing.set(timing)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_timing.reset(token)
+    route = request.scope.get("route")
+    instrument.observe("idp_request_seconds", "path", getattr(route, "path", "unmatched"),
+                       time.perf_counter() - start)
+    if timing["records"]:
+        response.headers["Server-Timing"] = _server_timing(timing["records"])
+    if timing["report"] is not None:
+        name = await asyncio.to_thread(outputs.put, timing["report"].encode("utf-8"), ".txt")
+        response.headers["X-Profile-Report"] = f"outputs/{name}"
+    return response
+
+
+# Analyzer jobs. They run inside the worker pool, so they take and return
+# plain picklable values (bytes in, JSON-ready dicts out).
+
+def verify_code_job(data):
+    return text_extraction.detect_and_verify_barcode(data, {})
+
+
+def detect_tables_job(data):
+    # The annotated PNG comes back as bytes; the handler puts it in the output cache
+    detected_tables, annotated = bank_statement.process_bytes(data)
+    return {"detected_tables": detected_tables, "annotated": annotated}
+
+
+def ela_job(data):
+    # Raises, so a failure is a 400/500 rather than an {"error"} result cached for these bytes
+    try:
+        result = detect_based_on_pixel.ela_report(data, output_dir=None)
+    except UnidentifiedImageError as e:
+        raise ValueError(f"Not an image: {e}") from None
+    result.pop("error_map", None)
+    return result
+
+
+def _no_progress(stage, progress):
+    pass
+
+
+def _traced(job, data, profile_kind=None):
+    """
+    Run `job` in the worker under a trace (and a profiler when asked for).
+    Returns (result, stage records, profile report); the records go back to
+    the parent so its /metrics covers work done in worker processes.
+    """
+    with instrument.trace() as records:
+        if profile_kind is None:
+            return job(data), records, None
+        with instrument.profile(profile_kind) as profiled:
+            result = job(data)
+    return result, records, profiled["report"]
+
+
+def tamper_job(data, scale=None):
+    return jobs.tamper_analyzer(data, _no_progress, scale=scale)
+
+
+def tamper_words_job(data):
+    return jobs.tampered_words_analyzer(data, _no_progress)
+
+
+def jpeg_dq_job(data):
+    return jobs.jpeg_dq_analyzer(data, _no_progress)
+
+
+def triage_job(data, doc_type=None):
+    return jobs.triage_analyzer(data, _no_progress, doc_type=doc_type)
+
+
+def table_structure_job(data):
+    return jobs.table_structure_analyzer(data, _no_progress)
+
+
+async def read_upload(upload):
+    """Read an upload chunk by chunk, rejecting it (413) once it exceeds the size limit."""
+    chunks = []
+    size = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Upload too large")
+        chunks.append(chunk)
+    if not size:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    return b"".join(chunks)
+
+
+def _cache_params():
+    # Settings that change the detectors' output are part of the cache key
+    return {"scale": pyramid.snap_scale(pyramid.DEFAULT_SCALE)}
+
+
+async def analyze(job, upload, analyzer=None, params=None):
+    """Run `job` on the upload in the worker pool; results are cached under `analyzer` when given."""
+    data = await read_upload(upload)
+    timing = _request_timing.get() or {"records": [], "profile": None, "report": None}
+    if analyzer is not None:
+        key = await asyncio.to_thread(result_cache.make_key, data, analyzer, params)
+        # A profiled request always runs the analyzer
+        cached = await asyncio.to_thread(results.get, key) if timing["profile"] is None else None
+        if cached is not None:
+            return cached
+    start = time.perf_counter()
+    try:
+        result, records, timing["report"] = await app.state.pool.run(_traced, job, data, timing["profile"])
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Server busy, retry later", headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analysis timed out")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    instrument.observe("idp_analyzer_seconds", "analyzer", analyzer or job.__name__, time.perf_counter() - start)
+    if POOL_KIND != "thread":  # Thread workers already observed their stages in this process
+        instrument.record(records)
+    timing["records"].extend(records)
+    if analyzer is not None:  # Results that hit a transient failure are not stored (result_cache.failed)
+        await asyncio.to_thread(results.put, key, analyzer, result)
+    return result
+
+
+@app.post("/verify-code")
+async def verify_code(image: UploadFile = File(...)):
+    return await analyze(verify_code_job, image, "barcode")
+
+
+@app.post("/detect_tables")
+async def detect_tables(file: UploadFile = File(...), inline: bool = False):
+    result = await analyze(detect_tables_job, file, "tables", _cache_params())
+    annotated = result.pop("annotated")
+    if inline:
+        return Response(annotated, media_type="image/png")
+    result["result_image"] = outputs.put(annotated, ".png")
+    return result
+
+
+@app.post("/extract_tables")
+async def extract_tables(file: UploadFile = File(...)):
+    """Rows x columns of cell text per table, with amount columns parsed."""
+    return await analyze(table_structure_job, file, "table-structure")
+
+
+@app.post("/process-image")
+async def process_image(file: UploadFile = File(...)):
+    result = await analyze(ela_job, file, "ela", _cache_params())
+    if "ela_image" in result:
+        result["ela_image_url"] = f"outputs/{outputs.put(result.pop('ela_image'), '.jpg')}"
+    return result
+
+
+@app.post("/jpeg-forensics")
+async def jpeg_forensics(file: UploadFile = File(...)):
+    """Double-quantization analysis of a JPEG in the DCT domain; regions in the same shape as /process-image."""
+    return await analyze(jpeg_dq_job, file, "jpeg-dq")
+
+
+@app.post("/triage")
+async def triage(file: UploadFile = File(...), doc_type: str = Query(None)):
+    """Cheap checks first (EXIF, known originals, DCT statistics), OCR and the model only when still unsure."""
+    # The key covers the document type, the originals index, the policy file and the pyramid scale
+    job = functools.partial(triage_job, doc_type=doc_type)
+    return await analyze(job, file, "triage", await asyncio.to_thread(triage_module.cache_params, doc_type))
+
+
+@app.post("/detect-tampering")
+async def detect_tampering(file: UploadFile = File(...)):
+    # The pyramid scale in the cache key is the one the job runs with
+    params = _cache_params()
+    return await analyze(functools.partial(tamper_job, scale=params["scale"]), file, "tamper", params)
+
+
+@app.post("/tampered-words")
+async def tampered_words(file: UploadFile = File(...)):
+    return await analyze(tamper_words_job, file, "tampered-words")
+
+
+@app.post("/analyze-pages")
+async def analyze_pages(file: UploadFile = File(...), analyzers: str = Query("tables"),
+                        dpi: int = Query(pages.DEFAULT_DPI, ge=36, le=600)):
+    """Multi-page PDF/TIFF: streams one JSON line per page as each page finishes."""
+    names = [name.strip() for name in analyzers.split(",") if name.strip()]
+    unknown = [name for name in names if name not in pages.PAGE_ANALYZERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown page analyzers: {', '.join(unknown)}")
+    data = await read_upload(file)
+    source = pages.iter_pages(data, dpi=dpi)
+    pool = app.state.pool
+
+    async def next_page():
+        # Rasterizing is CPU work too: off the event loop, one page at a time
+        return await asyncio.to_thread(next, source, None)
+
+    def submit(page):
+        # Each page goes through the bounded pool: the same 429 and 504 as a single-image request
+        return asyncio.ensure_future(pool.run(pages.analyze_page, *page, names))
+
+    # Fail the request as a whole while nothing has been streamed yet
+    try:
+        first = await next_page()
+        first_record = await submit(first) if first is not None else None
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Server busy, retry later", headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analysis timed out")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def stream():
+        in_flight = {}
+        try:
+            if first_record is not None:
+                yield json.dumps(first_record) + "\n"
+            exhausted = first_record is None
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < pages.DEFAULT_WORKERS:
+                    page = await next_page()
+                    if page is None:
+                        exhausted = True
+                    else:
+                        in_flight[submit(page)] = page[0]
+                if not in_flight:
+                    break
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    number = in_flight.pop(task)
+                    try:
+                        record = task.result()
+                    except QueueFull:
+                        record = {"page": number, "errors": {"page": "Server busy, retry later"}}
+                    except asyncio.TimeoutError:
+                        record = {"page": number, "errors": {"page": "Analysis timed out"}}
+                    yield json.dumps(record) + "\n"
+        finally:
+            for task in in_flight:
+                task.cancel()
+            try:
+                source.close()
+            except ValueError:  # Still rasterizing in its thread after a disconnect; it is dropped
+                pass
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), analyzer: str = Form("tampered-words"), priority: int = Form(0)):
+    if analyzer not in jobs.ANALYZERS:
+        raise HTTPException(status_code=400, detail=f"Unknown analyzer, expected one of: {', '.join(jobs.ANALYZERS)}")
+    data = await read_upload(file)
+    job_id, deduplicated = await asyncio.to_thread(app.state.jobs.submit, data, analyzer, priority)
+    return {"job_id": job_id, "deduplicated": deduplicated, "status_url": f"/jobs/{job_id}",
+            "events_url": f"/jobs/{job_id}/events"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(app.state.jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    store = app.state.jobs
+    if await asyncio.to_thread(store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    async def stream():
+        last_seq = 0
+        while True:
+            for event in await asyncio.to_thread(store.events, job_id, last_seq):
+                last_seq = event["seq"]
+                yield f"id: {last_seq}\nevent: {event['status']}\ndata: {json.dumps(event)}\n\n"
+            job = await asyncio.to_thread(store.get, job_id)
+            if job["status"] in ("done", "failed"):
+                yield f"event: result\ndata: {json.dumps(job, default=str)}\n\n"
+                return
+            await asyncio.sleep(jobs.POLL_INTERVAL)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/outputs/{filename}")
+async def serve_output_image(filename: str):
+    stored = outputs.get(filename)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Result image expired or not found")
+    data, media_type = stored
+    return Response(data, media_type=media_type)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(instrument.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+async def health():
+    pool = app.state.pool
+    return {"status": "ok", "workers": WORKERS, "pending": pool.pending, "capacity": pool.capacity,
+            "outputs": outputs.stats(), "result_cache": await asyncio.to_thread(results.stats)}
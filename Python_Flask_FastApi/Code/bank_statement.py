@@ -1,17 +1,24 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 import cv2
+import io
 import numpy as np
 import os
 import uuid
 
+import document
+import instrument
+import pyramid
+import table_structure
+from instrument import stage
+from output_cache import outputs
+from result_cache import results
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-UPLOAD_FOLDER = 'uploads'
-OUTPUT_FOLDER = 'outputs'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+OUTPUT_FOLDER = 'outputs'  # Only used by the process_image script path
+MIN_TABLE_SIZE = 100  # Contours narrower or shorter than this (in pixels) are not tables
 
 @app.route('/detect_tables', methods=['POST'])
 def detect_tables():
@@ -23,69 +30,159 @@ def detect_tables():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     
-    # Save the uploaded file
-    filename = f"{uuid.uuid4().hex}.png"  # Ensure unique file name
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(file_path)
-
-    # Detect tables in the image
-    detected_tables, output_path = process_image(file_path)
-
-    # Return the table detection results (bounding boxes) and the output image path
+    # Decode straight from the request buffer; nothing is written to disk.
+    # A re-upload of the same bytes is served from the result cache without decoding.
+    try:
+        data = file.read()
+        result, _ = results.cached('tables', data, lambda: tables_result(data), params=cache_params())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    detected_tables, annotated = result['detected_tables'], result['annotated']
+
+    # ?inline=1 streams the annotated image back directly
+    if request.args.get('inline'):
+        return send_file(io.BytesIO(annotated), mimetype='image/png')
+
+    # Otherwise keep it in the output cache for the client to fetch from /outputs/<name>
     return jsonify({
         'detected_tables': detected_tables,
-        'result_image': output_path.split(os.sep)[-1]  # Return just the file name
+        'result_image': outputs.put(annotated, '.png')
     })
 
-def process_image(image_path):
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+@app.route('/extract_tables', methods=['POST'])
+def extract_tables():
+    # Rows x columns of cell text per table, with the amount columns parsed
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+    try:
+        data = request.files['file'].read()
+        tables, _ = results.cached('table-structure', data, lambda: {'tables': structure_bytes(data)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(tables)
+
+def table_mask(image):
+    """Dilated Canny edges of the page; table borders come out as closed blobs."""
+    blurred = document.view(image, 'blurred')  # Gray, then a 5x5 Gaussian blur; memoized on a Document
     edges = cv2.Canny(blurred, 50, 150)
 
     kernel = np.ones((3, 3), np.uint8)
-    dilated = cv2.dilate(edges, kernel, iterations=2)
+    return cv2.dilate(edges, kernel, iterations=2)
 
-    contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+def _table_contour_boxes(mask, min_size):
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-    detected_tables = []
+    boxes = []
     for contour in contours:
         x, y, w, h = cv2.boundingRect(contour)
+        if w > min_size and h > min_size:
+            boxes.append((x, y, w, h))
+    return boxes
+
+def detect_table_boxes(image, scale=pyramid.DEFAULT_SCALE):
+    """
+    Bounding boxes (x, y, w, h) of table-like contours larger than 100x100.
+    With scale < 1 the edges are found on a downscaled copy first and only
+    candidate areas are re-examined at full resolution (see pyramid.py).
+    """
+    # Coarse candidates get some slack so tables just over the limit are not lost to rounding
+    scale = pyramid.snap_scale(scale)
+    candidates = lambda coarse: _table_contour_boxes(coarse, MIN_TABLE_SIZE * scale * 0.75)
+    mask = pyramid.coarse_to_fine_mask(image, table_mask, candidates, scale=scale)
+    return _table_contour_boxes(mask, MIN_TABLE_SIZE)
+
+def annotate_tables(image, boxes):
+    """Draw the table boxes (plus last-column / third-row hints) onto `image` in place."""
+    for x, y, w, h in boxes:
+        # Draw the table bounding box in green
+        cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 3)  # Green color for the table box
+
+        last_column_x = x + w - 50  # Approximate position of the last column
+        last_column_width = 50  # Width of the last column
+
+        # Highlight the last column in red
+        cv2.rectangle(image, (last_column_x, y), (last_column_x + last_column_width, y + h), (0, 0, 255), 3)  # Red color for the last column
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        cv2.putText(image, "Total of Amount", (last_column_x + 5, y + 30), font, 1, (0, 0, 255), 2, cv2.LINE_AA)
+
+        # To highlight the third row in the last column
+        row_height = h // 5  # Divide the height into 5 rows (this can vary depending on the table structure)
+
+        # Assuming that the third row is around 3/5 of the total height
+        third_row_y = y + 2 * row_height
+
+        # Draw the third row in the last column in blue
+        cv2.rectangle(image, (last_column_x, third_row_y), (last_column_x + last_column_width, third_row_y + row_height), (255, 0, 0), 3)  # Blue color
+
+    return image
 
-        if w > 100 and h > 100:
-            detected_tables.append({'bbox': (x, y, w, h)})
-            
-            # Draw the table bounding box in green
-            cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 3)  # Green color for the table box
-
-            last_column_x = x + w - 50  # Approximate position of the last column
-            last_column_width = 50  # Width of the last column
-
-            # Highlight the last column in red
-            cv2.rectangle(image, (last_column_x, y), (last_column_x + last_column_width, y + h), (0, 0, 255), 3)  # Red color for the last column
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            cv2.putText(image, "Total of Amount", (last_column_x + 5, y + 30), font, 1, (0, 0, 255), 2, cv2.LINE_AA)
-
-            # To highlight the third row in the last column
-            row_height = h // 5  # Divide the height into 5 rows (this can vary depending on the table structure)
-
-            # Assuming that the third row is around 3/5 of the total height
-            third_row_y = y + 2 * row_height
+def process_image(image_path):
+    # Accepts a path or an already decoded BGR image (e.g. a rasterized PDF page)
+    with stage('tables.decode'):
+        image = cv2.imread(image_path) if isinstance(image_path, str) else image_path.copy()
 
-            # Draw the third row in the last column in blue
-            cv2.rectangle(image, (last_column_x, third_row_y), (last_column_x + last_column_width, third_row_y + row_height), (255, 0, 0), 3)  # Blue color
+    with stage('tables.detect'):
+        boxes = detect_table_boxes(image)
+    detected_tables = [{'bbox': box} for box in boxes]
+    with stage('tables.annotate'):
+        annotate_tables(image, boxes)
 
     # Save the result image with highlighted tables
-    output_path = os.path.join(OUTPUT_FOLDER, f"{uuid.uuid4().hex}.png")
-    cv2.imwrite(output_path, image)
+    with stage('tables.write'):
+        os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+        output_path = os.path.join(OUTPUT_FOLDER, f"{uuid.uuid4().hex}.png")
+        cv2.imwrite(output_path, image)
 
     return detected_tables, output_path
 
+def process_bytes(image_bytes):
+    """
+    In-memory version of process_image: decodes the upload bytes and returns
+    the detected tables plus the annotated image encoded as PNG bytes.
+    """
+    with stage('tables.decode'):
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError('Could not decode image')
+
+    with stage('tables.detect'):
+        boxes = detect_table_boxes(image)
+    with stage('tables.annotate'):
+        annotate_tables(image, boxes)
+    with stage('tables.encode'):
+        ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])  # Fast, still lossless
+    return [{'bbox': box} for box in boxes], encoded.tobytes()
+
+def structure_bytes(image_bytes):
+    """Structured tables (see table_structure.extract_tables) of an uploaded page."""
+    with stage('tables.decode'):
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError('Could not decode image')
+    return table_structure.extract_tables(image)
+
+def tables_result(image_bytes):
+    """process_bytes as one cacheable dict."""
+    detected_tables, annotated = process_bytes(image_bytes)
+    return {'detected_tables': detected_tables, 'annotated': annotated}
+
+def cache_params():
+    # Anything that changes the output belongs in the cache key
+    return {'scale': pyramid.snap_scale(pyramid.DEFAULT_SCALE)}
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text format: per-stage latency histograms
+    return Response(instrument.render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/outputs/<filename>', methods=['GET'])
 def serve_output_image(filename):
-    # Serve the result image from the outputs folder
-    return send_from_directory(OUTPUT_FOLDER, filename)
+    # Serve the result image from the in-memory output cache
+    stored = outputs.get(filename)
+    if stored is None:
+        return jsonify({'error': 'Result image expired or not found'}), 404
+    data, media_type = stored
+    return send_file(io.BytesIO(data), mimetype=media_type)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,222 @@
+import functools
+
+import cv2
+import numpy as np
+
+import pyramid
+
+# Barcode and QR reading: propose regions on a downscaled copy, decode grayscale crops with
+# every available decoder, and fall back to the whole page only when no crop decoded.
+# Each result's "method" says which step found it.
+
+PROPOSAL_SIDE = 1024  # Long side of the copy regions are proposed on
+MAX_CANDIDATES = 8  # Crops tried before falling back to the whole page
+CROP_SIDE = (240, 1000)  # Crops are rescaled so their long side falls in this range
+QUIET_ZONE = 0.15  # Margin added around a candidate, as a fraction of its size
+MIN_CANDIDATE_AREA = 0.0004  # Candidates smaller than this fraction of the page are ignored
+MAX_ASPECT = 8.0  # Longer-than-this blocks are text lines, not codes
+
+
+@functools.lru_cache(maxsize=1)
+def _zbar():
+    # pyzbar raises ImportError when the zbar shared library is not installed
+    try:
+        from pyzbar import pyzbar
+        return pyzbar
+    except ImportError:
+        return None
+
+
+def _points_box(points):
+    points = np.asarray(points, np.float32).reshape(-1, 2)
+    x, y, w, h = cv2.boundingRect(points)
+    return int(x), int(y), int(w), int(h)
+
+
+def decode_zbar(gray):
+    pyzbar = _zbar()
+    if pyzbar is None:
+        return []
+    return [{"type": code.type, "bytes": code.data, "box": tuple(int(v) for v in code.rect)}
+            for code in pyzbar.decode(gray)]
+
+
+def decode_opencv_qr(gray, detector_class=cv2.QRCodeDetector):
+    ok, decoded, points, _ = detector_class().detectAndDecodeBytesMulti(gray)
+    if not ok:
+        return []
+    return [{"type": "QRCODE", "bytes": bytes(data), "box": _points_box(quad)}
+            for data, quad in zip(decoded, points) if data]
+
+
+def decode_opencv_qr_aruco(gray):
+    return decode_opencv_qr(gray, cv2.QRCodeDetectorAruco)
+
+
+def decode_opencv_1d(gray):
+    ok, decoded, types, points = cv2.barcode.BarcodeDetector().detectAndDecodeWithType(gray)
+    if not ok:
+        return []
+    return [{"type": kind, "bytes": data.encode("utf-8"), "box": _points_box(quad)}
+            for data, kind, quad in zip(decoded, types, points) if data]
+
+
+DECODERS = [
+    ("zbar", decode_zbar),
+    ("opencv-qr", decode_opencv_qr),
+    ("opencv-qr-aruco", decode_opencv_qr_aruco),
+    ("opencv-1d", decode_opencv_1d),
+]
+
+
+def decode_gray(gray, decoders=DECODERS):
+    """Codes in a grayscale image from the first decoder that finds any, with the decoder's name."""
+    for name, decoder in decoders:
+        try:
+            found = decoder(gray)
+        except cv2.error:
+            found = []
+        if found:
+            for code in found:
+                code["decoder"] = name
+            return found
+    return []
+
+
+def to_gray(image):
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def propose_regions(gray, max_side=PROPOSAL_SIDE, limit=MAX_CANDIDATES):
+    """
+    Candidate (x, y, w, h) boxes in full-resolution coordinates, most likely
+    first: QR finder-pattern detections, then dense high-gradient blocks.
+    """
+    height, width = gray.shape[:2]
+    scale = pyramid.snap_scale(min(1.0, max_side / float(max(height, width))))
+    small = pyramid.downscale(gray, scale)
+
+    boxes = []
+    try:
+        ok, quads = cv2.QRCodeDetector().detectMulti(small)
+    except cv2.error:
+        ok, quads = False, None
+    if ok:
+        boxes.extend(_points_box(quad) for quad in quads)
+
+    # Codes are blocks of strong gradients in both (QR) or one (1D) direction, denser than text
+    grad_x = cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 1, 0, ksize=3))
+    grad_y = cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 0, 1, ksize=3))
+    gradient = cv2.blur(cv2.max(grad_x, grad_y), (5, 5))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9)))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = MIN_CANDIDATE_AREA * small.shape[0] * small.shape[1]
+    scored = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h < min_area or max(w, h) > MAX_ASPECT * min(w, h):
+            continue
+        fill = cv2.contourArea(contour) / float(w * h)  # Codes fill their box; ragged text does not
+        scored.append((fill * np.sqrt(w * h), (x, y, w, h)))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    boxes.extend(box for _, box in scored)
+
+    full = []
+    for x, y, w, h in pyramid.to_full(boxes, scale, gray.shape, margin=0):
+        pad = int(QUIET_ZONE * max(w, h))
+        x1, y1 = max(x - pad, 0), max(y - pad, 0)
+        x2, y2 = min(x + w + pad, width), min(y + h + pad, height)
+        box = (x1, y1, x2 - x1, y2 - y1)
+        if not any(_inside(box, other) for other in full):
+            full.append(box)
+    return full[:limit]
+
+
+def _inside(box, other):
+    x, y, w, h = box
+    ox, oy, ow, oh = other
+    return x >= ox and y >= oy and x + w <= ox + ow and y + h <= oy + oh
+
+
+def _fit(crop):
+    """Rescale a crop so its long side lies in CROP_SIDE; returns (crop, factor)."""
+    side = max(crop.shape[:2])
+    low, high = CROP_SIDE
+    if side > high:
+        factor = high / float(side)
+        return cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA), factor
+    if side < low:
+        factor = low / float(side)
+        return cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC), factor
+    return crop, 1.0
+
+
+def _upscale(gray):
+    return cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC), 2.0
+
+
+def _binarize(gray):
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1], 1.0
+
+
+def _rotate45(gray):
+    # Only 1D barcodes need this: zbar scans rows and columns, QR readers handle any angle
+    height, width = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), 45, 1.0)
+    size = int(np.ceil(np.hypot(width, height)))
+    matrix[:, 2] += (size - width) / 2.0, (size - height) / 2.0
+    return cv2.warpAffine(gray, matrix, (size, size), borderValue=255), None
+
+
+FALLBACKS = [("upscale", _upscale), ("binary", _binarize), ("rotate45", _rotate45)]
+
+
+def _decode_at(gray, box, transform=None):
+    x, y, w, h = box
+    crop, factor = _fit(gray[y:y + h, x:x + w])
+    if transform is not None:
+        crop, extra = transform(crop)
+        factor = None if extra is None else factor * extra
+    found = decode_gray(crop)
+    for code in found:
+        if factor is None:  # Rotated: the candidate box is the best location there is
+            code["box"] = box
+        else:
+            cx, cy, cw, ch = code["box"]
+            code["box"] = (x + int(cx / factor), y + int(cy / factor), int(np.ceil(cw / factor)), int(np.ceil(ch / factor)))
+    return found
+
+
+def read_barcodes(image, max_side=PROPOSAL_SIDE, fallbacks=True):
+    """
+    All barcodes/QR codes found in a BGR or grayscale image, as dicts with
+    "type", "bytes", "data" (UTF-8 text, undecodable bytes replaced), "box"
+    (x, y, w, h), "decoder" and "method" (region, page or a fallback name).
+    """
+    gray = to_gray(image)
+    height, width = gray.shape[:2]
+    candidates = propose_regions(gray, max_side=max_side)
+
+    found = []
+    for box in candidates:
+        found.extend(dict(code, method="region") for code in _decode_at(gray, box))
+
+    if not found:
+        found = [dict(code, method="page") for code in decode_gray(gray)]
+
+    if not found and fallbacks:
+        for name, transform in FALLBACKS:
+            for box in candidates or [(0, 0, width, height)]:
+                found.extend(dict(code, method=name) for code in _decode_at(gray, box, transform))
+            if found:
+                break
+
+    unique = {}
+    for code in found:
+        code["data"] = code["bytes"].decode("utf-8", errors="replace")
+        code["box"] = [int(v) for v in code["box"]]
+        unique.setdefault((code["type"], code["bytes"]), code)
+    return list(unique.values())
@@ -0,0 +1,242 @@
+"""
+Run the forgery detectors over many documents, one JSON line per document.
+Re-running with the same output file skips documents already in it.
+
+    python batch_process.py scans/ -o results.jsonl --workers 8
+    python batch_process.py manifest.txt -o results.jsonl --analyzers ela,barcode
+    IDP_TRIAGE_DOC_TYPE=id_card python batch_process.py cards/ --analyzers triage
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+# The dark-background detector lives next to the sample images
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "images"))
+
+import bank_statement
+import ela
+import jpeg_forensics
+import tempered
+import text_extraction
+import triage
+from document import Document
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp")
+MAX_REGIONS = 50  # Regions kept per analyzer in the JSON output
+
+
+# Analyzers take the document's Document: one decode, views shared between analyzers
+
+def run_ela(document):
+    result = ela.analyze_source(document)
+    return {
+        "tampered_box": result["tampered_box"],
+        "tampered_regions": result["tampered_regions"][:MAX_REGIONS],
+        "tampered_ratio": round(result["tampered_ratio"], 6),
+    }
+
+
+def run_jpeg_dq(document):
+    result = jpeg_forensics.analyze_source(document)
+    return {
+        "tampered_box": result["tampered_box"],
+        "tampered_regions": result["tampered_regions"][:MAX_REGIONS],
+        "tampered_ratio": round(result["tampered_ratio"], 6),
+        "quality": result["quality"],
+        "double_compressed": result["double_compressed"],
+    }
+
+
+def run_triage(document):
+    return triage.triage(document)
+
+
+def run_tamper(document):
+    regions = tempered.detect_tampered_regions(document)
+    return {"tampered": bool(regions), "regions": regions[:MAX_REGIONS]}
+
+
+def run_barcode(document):
+    return text_extraction.detect_and_verify_barcode(document, {})
+
+
+def run_tables(document):
+    return {"detected_tables": [{"bbox": box} for box in bank_statement.detect_table_boxes(document)]}
+
+
+ANALYZERS = {
+    "ela": run_ela,
+    "jpeg-dq": run_jpeg_dq,
+    "tamper": run_tamper,
+    "barcode": run_barcode,
+    "tables": run_tables,
+    "triage": run_triage,
+}
+
+
+def list_documents(source):
+    """(doc_id, path) pairs from a directory (recursive) or a manifest file."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, source), path
+        return
+
+    # Manifest: one path per line, or JSON lines with "path" and optional "id"
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                path, doc_id = entry["path"], entry.get("id", entry["path"])
+            else:
+                path = doc_id = line
+            yield doc_id, os.path.join(base, path)
+
+
+def process_document(doc_id, path, analyzers):
+    """Run the analyzers on one document; never raises, errors go in the record."""
+    record = {"id": doc_id, "path": path, "results": {}, "errors": {}, "timings": {}}
+    start = time.perf_counter()
+    try:
+        document = Document.open(path)
+        document.bgr  # Decode now: an unreadable file fails here, once, not in every analyzer
+        record["timings"]["decode"] = time.perf_counter() - start
+    except Exception as e:
+        record["errors"]["decode"] = str(e)
+        record["timings"]["total"] = time.perf_counter() - start
+        return record
+
+    for name in analyzers:
+        stage_start = time.perf_counter()
+        try:
+            record["results"][name] = ANALYZERS[name](document)
+        except Exception as e:
+            record["errors"][name] = f"{type(e).__name__}: {e}"
+        record["timings"][name] = time.perf_counter() - stage_start
+
+    record["memory"] = document.memory_report()
+    record["timings"]["total"] = time.perf_counter() - start
+    return record
+
+
+def load_completed(output_path):
+    """
+    Ids already in the output file. A torn last line from a crash is cut
+    off so new records start on a clean line.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    valid_bytes = 0
+    with open(output_path, "rb") as output:
+        for line in output:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                completed.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                break
+            valid_bytes += len(line)
+
+    if valid_bytes != os.path.getsize(output_path):
+        with open(output_path, "r+b") as output:
+            output.truncate(valid_bytes)
+    return completed
+
+
+def summarize(records, elapsed):
+    """Docs/sec and per-stage timing statistics for a finished batch."""
+    stages = {}
+    for record in records:
+        for stage, seconds in record["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    summary = {
+        "documents": len(records),
+        "failed": sum(1 for record in records if record["errors"]),
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(len(records) / elapsed, 3) if elapsed > 0 else None,
+        "stages": {},
+    }
+    for stage, values in stages.items():
+        values = np.array(values)
+        summary["stages"][stage] = {
+            "count": int(values.size),
+            "mean_s": round(float(values.mean()), 4),
+            "p50_s": round(float(np.percentile(values, 50)), 4),
+            "p95_s": round(float(np.percentile(values, 95)), 4),
+            "total_s": round(float(values.sum()), 3),
+        }
+    triaged = [record["results"]["triage"] for record in records if "triage" in record["results"]]
+    if triaged:
+        summary["triage"] = triage.summarize(triaged)
+    return summary
+
+
+def run_batch(source, output_path, analyzers, workers=None, max_in_flight=None):
+    """Process every pending document in `source`, appending records to `output_path`."""
+    completed = load_completed(output_path)
+    pending = ((doc_id, path) for doc_id, path in list_documents(source) if doc_id not in completed)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4  # Don't queue tens of thousands of futures up front
+
+    records = []
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as output, ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < max_in_flight:
+                document = next(pending, None)
+                if document is None:
+                    exhausted = True
+                    break
+                in_flight.add(pool.submit(process_document, *document, analyzers))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                output.write(json.dumps(record, default=str) + "\n")
+                output.flush()
+                records.append(record)
+
+    summary = summarize(records, time.perf_counter() - start)
+    summary["skipped"] = len(completed)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory of scans or a manifest file")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL output (appended to, used to resume)")
+    parser.add_argument("--analyzers", default=",".join(ANALYZERS),
+                        help=f"Comma-separated subset of: {', '.join(ANALYZERS)}")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    analyzers = [name.strip() for name in args.analyzers.split(",") if name.strip()]
+    unknown = [name for name in analyzers if name not in ANALYZERS]
+    if unknown:
+        parser.error(f"Unknown analyzers: {', '.join(unknown)}")
+
+    summary = run_batch(args.source, args.output, analyzers, workers=args.workers)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,11 @@
-from PIL import Image, ImageChops, ImageEnhance, ImageDraw
+from PIL import Image, ImageDraw
+import piexif
+import io
 import os
+import sys
+
+import ela
+from instrument import stage
 
 def check_exif(image_path):
     """
@@ -29,87 +35,72 @@ def check_exif(image_path):
     except Exception as e:
         print(f"❌ Error reading EXIF data: {e}")
 
-def error_level_analysis(image_path):
+def exif_software(image_source):
+    """
+    The EXIF Software tag of an image (path or bytes), "" when the EXIF has
+    none, or None when there is no EXIF at all. Only the file header is
+    read; the pixels are never decoded.
+    """
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        image_source = io.BytesIO(image_source)
+    with Image.open(image_source) as img:
+        exif = img.info.get("exif")
+    if not exif:
+        return None
+    exif_data = piexif.load(exif)
+    return exif_data["0th"].get(piexif.ImageIFD.Software, b"").decode("utf-8", "ignore").strip("\x00 ")
+
+def error_level_analysis(image_source, threshold=ela.DEFAULT_THRESHOLD, qualities=ela.DEFAULT_QUALITIES,
+                         output_dir="."):
     """
     Performs Error Level Analysis (ELA) on an image to detect manipulations.
-    Highlights tampered regions with a blue box (default).
+    `image_source` can be a file path or the raw bytes of an upload; the
+    recompression happens in memory, so nothing is written for the analysis.
+    Highlights every connected tampered region with a blue box. When
+    `output_dir` is None the annotated image and error map are returned as
+    JPEG/PNG bytes instead of being saved. Errors come back as {"error"}.
     """
     try:
         # Check if the file exists
-        if not os.path.exists(file_path):
-            return {"error": f"File not found: {file_path}"}
-
-        # Open the original image
-        original = Image.open(file_path).convert("RGB")
-        
-        # Re-save the image with a known compression quality (to simulate recompression)
-        temp_path = "temp.jpg"
-        original.save(temp_path, quality=90)
-        recompressed = Image.open(temp_path)
-
-        # Perform the error level analysis (ELA)
-        diff = ImageChops.difference(original, recompressed)
-        diff = ImageEnhance.Brightness(diff).enhance(20)  # Enhance the differences to make them more visible
-
-        # Create an image draw object to draw bounding boxes
-        draw = ImageDraw.Draw(original)
-        
-        # Detect tampered regions by analyzing the differences
-        diff_pixels = diff.load()
-        width, height = diff.size
-
-        tampered_regions = []
-        threshold = 30  # Adjust this threshold to fine-tune tampered pixel detection
-
-        # Check for differences in pixel values and identify tampered regions
-        for x in range(width):
-            for y in range(height):
-                r, g, b = diff_pixels[x, y]
-                if r > threshold or g > threshold or b > threshold:
-                    # Found a tampered pixel (difference larger than threshold)
-                    tampered_regions.append((x, y))
-
-        # If tampered regions are found, calculate the bounding box
-        if tampered_regions:
-            # Only focus on the lower-center part of the image and make it wider
-            center_x = width // 2
-            center_y = height // 2
-            margin_x = 100  # Width margin to make the bounding box wider
-            margin_y = 100  # Height margin to make the bounding box lower and wider
-
-            min_x = max(min(tampered_regions, key=lambda p: p[0])[0] - margin_x, 0)
-            max_x = min(max(tampered_regions, key=lambda p: p[0])[0] + margin_x, width)
-
-            # Focus on the lower part of the image with a smaller height for the bounding box
-            min_y = max(min(tampered_regions, key=lambda p: p[1])[1] - margin_y, height // 2)  # Start from the lower half
-            bounding_box_height = 80  # Set a fixed height for the bounding box, you can adjust this value as needed
-            max_y = min(min_y + bounding_box_height, height)  # Limit the bounding box height to 80 pixels
-
-            # Draw the bounding box with a blue color around the tampered area
-            draw.rectangle([min_x, min_y, max_x, max_y], outline="blue", width=5)
-
-            tampered_box = {
-                "x1": min_x,
-                "y1": min_y,
-                "x2": max_x,
-                "y2": max_y
-            }
-        else:
-            tampered_box = None
-
-        # Save the resulting image with the bounding box
-        result_image_path = "result_with_ela.jpg"
-        original.save(result_image_path)
-
-        # Return the result image path and the tampered box coordinates
-        return {
-            "ela_image_url": result_image_path,
-            "tampered_box": tampered_box
-        }
+        if isinstance(image_source, str) and not os.path.exists(image_source):
+            return {"error": f"File not found: {image_source}"}
+        return ela_report(image_source, threshold=threshold, qualities=qualities, output_dir=output_dir)
 
     except Exception as e:
         return {"error": str(e)}
 
+def ela_report(image_source, threshold=ela.DEFAULT_THRESHOLD, qualities=ela.DEFAULT_QUALITIES, output_dir="."):
+    """error_level_analysis without the error catching: failures raise."""
+    # Decode once, recompress in memory at each quality and diff over whole arrays
+    result = ela.analyze_source(image_source, qualities=qualities, threshold=threshold)
+
+    # Draw a blue box around each tampered region
+    with stage("ela.annotate"):
+        # A tiled result's page is a private memory-mapped copy: draw on it directly
+        annotated = ela.annotate(result["image"], result["tampered_regions"], copy="tiles" not in result)
+
+    response = {
+        "tampered_box": result["tampered_box"],
+        "tampered_regions": result["tampered_regions"],
+        "quality_ratios": result["quality_ratios"],
+    }
+
+    if output_dir is None:
+        with stage("ela.encode"):
+            response["ela_image"] = ela.encode_image(annotated, "JPEG")
+            response["error_map"] = ela.encode_image(result["error_map"], "PNG")
+        return response
+
+    # Save the resulting image with the bounding boxes and the error map
+    result_image_path = os.path.join(output_dir, "result_with_ela.jpg")
+    (annotated if isinstance(annotated, Image.Image) else Image.fromarray(annotated)).save(result_image_path)
+    error_map_path = os.path.join(output_dir, "ela_error_map.png")
+    Image.fromarray(result["error_map"]).save(error_map_path)
+
+    response["ela_image_url"] = result_image_path
+    response["error_map_url"] = error_map_path
+    return response
+
 if __name__ == "__main__":
     image_path = "1.jpg"  # Change this to your image file path
 def process_image(file_path):
@@ -163,7 +154,7 @@ def process_image(file_path):
 
 # Example usage:
 if __name__ == '__main__':
-    file_path = 'second.jpg'  # Replace this with the path to your image
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'second.jpg'  # Path to your image
 
     # Process the image based on the filename
     result = process_image(file_path)
@@ -0,0 +1,157 @@
+import collections
+import hashlib
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from instrument import stage
+
+# One uploaded page, decoded once, with lazily computed and memoized views
+# (bgr, rgb, pil, gray, hsv, luma, blurred, binary, downscaled). A Document
+# belongs to one request or page and is not shared between threads.
+
+BINARY_THRESHOLD = 150
+
+
+class Document:
+    """An upload (bytes) or an already decoded BGR page, with memoized views."""
+
+    def __init__(self, data=None, image=None):
+        if data is None and image is None:
+            raise ValueError("A document needs its bytes or a decoded image")
+        self.data = bytes(data) if data is not None else None
+        self._views = {}
+        self._computed = collections.Counter()
+        if image is not None:
+            self._views["bgr"] = image
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as file:
+            return cls(file.read())
+
+    def _memo(self, name, compute):
+        if name not in self._views:
+            with stage(f"document.{name}"):
+                self._views[name] = compute()
+            self._computed[name] += 1
+        return self._views[name]
+
+    def _decode(self):
+        image = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image")
+        return image
+
+    @property
+    def decoded(self):
+        return "bgr" in self._views
+
+    @property
+    def shape(self):
+        """(height, width, 3) of the page; read from the file header when not decoded yet."""
+        if not self.decoded:
+            with Image.open(io.BytesIO(self.data)) as image:
+                return image.size[1], image.size[0], 3
+        return self.bgr.shape
+
+    @property
+    def bgr(self):
+        return self._memo("bgr", self._decode)
+
+    @property
+    def rgb(self):
+        return self._memo("rgb", lambda: self.bgr[..., ::-1])
+
+    @property
+    def pil(self):
+        return self._memo("pil", lambda: Image.fromarray(np.ascontiguousarray(self.rgb)))
+
+    @property
+    def gray(self):
+        return self._memo("gray", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def luma(self):
+        """The file's own luminance plane (IMREAD_GRAYSCALE): for a JPEG, its Y channel without a colour round trip."""
+        def decode():
+            if self.data is None:
+                return self.gray
+            image = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                raise ValueError("Could not decode image")
+            return image
+        return self._memo("luma", decode)
+
+    @property
+    def hsv(self):
+        return self._memo("hsv", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV))
+
+    @property
+    def blurred(self):
+        return self._memo("blurred", lambda: cv2.GaussianBlur(self.gray, (5, 5), 0))
+
+    @property
+    def binary(self):
+        return self._memo("binary", lambda: cv2.threshold(self.gray, BINARY_THRESHOLD, 255, cv2.THRESH_BINARY)[1])
+
+    @property
+    def pixel_hash(self):
+        """SHA-256 of the decoded pixels, as ocr.image_hash computes it for the bgr array."""
+        def digest():
+            array = np.ascontiguousarray(self.bgr)
+            sha = hashlib.sha256(f"{array.shape}{array.dtype}".encode())
+            sha.update(memoryview(array).cast("B"))
+            return sha.hexdigest()
+        return self._memo("pixel_hash", digest)
+
+    def downscaled(self, scale):
+        """The page at a power-of-two `scale` (1, 1/2, 1/4, ...), same as pyramid.downscale."""
+        if scale >= 1:
+            return self.bgr
+        return self._memo(f"downscaled@{scale:g}", lambda: cv2.resize(
+            self.downscaled(scale * 2), None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA))
+
+    def view(self, name):
+        return getattr(self, name)
+
+    def memory_report(self):
+        """Bytes held per view (0 for views sharing another view's memory) and how often each was computed."""
+        bgr = self._views.get("bgr")
+        views = {}
+        for name, value in self._views.items():
+            if isinstance(value, np.ndarray):
+                shared = name != "bgr" and bgr is not None and np.may_share_memory(value, bgr)
+                views[name] = 0 if shared else int(value.nbytes)
+            elif isinstance(value, Image.Image):
+                views[name] = len(value.getbands()) * value.width * value.height
+        return {
+            "encoded_bytes": len(self.data) if self.data is not None else 0,
+            "views": views,
+            "total_bytes": sum(views.values()),
+            "computed": dict(self._computed),
+        }
+
+
+VIEWS = {
+    "bgr": lambda image: image,
+    "rgb": lambda image: image[..., ::-1],
+    "gray": lambda image: image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY),
+    "hsv": lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2HSV),
+    "blurred": lambda image: cv2.GaussianBlur(VIEWS["gray"](image), (5, 5), 0),
+    "binary": lambda image: cv2.threshold(VIEWS["gray"](image), BINARY_THRESHOLD, 255, cv2.THRESH_BINARY)[1],
+}
+
+
+def view(source, name):
+    """The `name` view of a Document (memoized), or computed on the spot from a BGR array."""
+    if isinstance(source, Document):
+        return source.view(name)
+    return VIEWS[name](source)
+
+
+def as_array(source):
+    """The BGR array of a Document, or the array itself."""
+    return source.bgr if isinstance(source, Document) else source
@@ -0,0 +1,351 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+import pyramid
+import tiles
+from document import Document
+from instrument import stage
+
+# Error Level Analysis (ELA) engine, vectorized over whole NumPy arrays. The recompression
+# always runs at full resolution (resampling destroys the 8x8 JPEG grid); pages above
+# tiles.TILE_THRESHOLD_MP go through analyze_tiled.
+
+DEFAULT_THRESHOLD = 30  # Error level (after scaling) above which a pixel counts as tampered
+DEFAULT_SCALE = 20  # Same amplification the old ImageEnhance.Brightness(20) step applied
+DEFAULT_MIN_AREA = 25  # Ignore specks smaller than this many pixels
+DEFAULT_LINK_DISTANCE = 5  # Flagged pixels closer than this are joined into one region
+DEFAULT_QUALITIES = (90,)  # JPEG quality levels the image is recompressed at
+TILE_ALIGN = 16  # JPEG MCU size with 4:2:0 chroma subsampling
+TILE_BYTES_PER_PIXEL = 32  # Working memory per window pixel: RGB copies, recompressed copy, diff, labels
+
+
+def load_image(source):
+    """
+    Open an image from a path, raw upload bytes, a file-like object, a PIL
+    image or a Document, and return it as RGB. Nothing is written to disk.
+    """
+    if isinstance(source, Document):
+        return source.pil  # Built from the document's single decode and kept for other callers
+    if isinstance(source, Image.Image):
+        return source.convert("RGB")
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+    image.load()
+    return image.convert("RGB")
+
+
+def recompress(image, quality):
+    """Re-save an image as JPEG at `quality` into a private in-memory buffer and decode it."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    buffer.seek(0)
+    return np.asarray(Image.open(buffer).convert("RGB"))
+
+
+def to_array(image):
+    """Return an HxWx3 uint8 RGB array for a PIL image or an array."""
+    if isinstance(image, np.ndarray):
+        array = image
+    else:
+        array = np.asarray(image.convert("RGB"))
+    if array.ndim == 2:
+        array = np.stack([array] * 3, axis=-1)
+    return np.ascontiguousarray(array, dtype=np.uint8)
+
+
+def compute_error_map(original, recompressed, scale=DEFAULT_SCALE):
+    """
+    Per-pixel error level of an image against its recompressed copy.
+    The largest channel difference is kept and amplified by `scale`
+    (saturating at 255), so the map can be viewed directly as an image.
+    """
+    original = to_array(original)
+    recompressed = to_array(recompressed)
+    if original.shape != recompressed.shape:
+        raise ValueError(f"Shape mismatch: {original.shape} vs {recompressed.shape}")
+
+    diff = cv2.absdiff(original, recompressed)
+    # Channel-wise maximum; much faster than diff.max(axis=2) on interleaved uint8
+    diff = np.maximum(np.maximum(diff[..., 0], diff[..., 1]), diff[..., 2])
+    return cv2.convertScaleAbs(diff, alpha=scale)
+
+
+def _region_order(region):
+    # Largest first; ties in reading order, so every path lists regions alike
+    return -region["area"], region["y1"], region["x1"]
+
+
+def find_regions(mask, error_map=None, min_area=DEFAULT_MIN_AREA, link_distance=DEFAULT_LINK_DISTANCE):
+    """
+    Group flagged pixels into connected tampered regions.
+    Pixels within `link_distance` of each other are joined before labelling,
+    so a re-typed word comes back as one region instead of one per stroke.
+    """
+    mask_u8 = mask.astype(np.uint8)
+    if link_distance > 0:
+        kernel = np.ones((link_distance, link_distance), np.uint8)
+        linked = cv2.morphologyEx(mask_u8, cv2.MORPH_CLOSE, kernel)
+    else:
+        linked = mask_u8
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(linked, connectivity=8)
+    if count <= 1:
+        return []
+
+    # Count only originally flagged pixels (not the ones filled in by linking)
+    flagged = labels[mask]
+    pixel_counts = np.bincount(flagged, minlength=count)
+    if error_map is not None:
+        error_sums = np.bincount(flagged, weights=error_map[mask], minlength=count)
+    else:
+        error_sums = None
+
+    regions = []
+    for label in range(1, count):
+        area = int(pixel_counts[label])
+        if area < min_area:
+            continue
+        x, y, w, h = (int(v) for v in stats[label, :4])
+        region = {"x1": x, "y1": y, "x2": x + w, "y2": y + h, "area": area}
+        if error_sums is not None:
+            region["mean_error"] = round(float(error_sums[label]) / area, 2)
+        regions.append(region)
+
+    regions.sort(key=_region_order)
+    return regions
+
+
+def find_regions_coarse(mask, error_map=None, min_area=DEFAULT_MIN_AREA, link_distance=DEFAULT_LINK_DISTANCE,
+                        coarse_scale=pyramid.DEFAULT_SCALE):
+    """
+    find_regions, coarse-to-fine. Coarse blobs are kept when the flagged
+    pixels they stand for could add up to `min_area`, so regions found at
+    full resolution are not lost; only their areas are relabelled at full
+    resolution.
+    """
+    coarse_scale = pyramid.snap_scale(coarse_scale)
+    if coarse_scale >= 1:
+        return find_regions(mask, error_map, min_area=min_area, link_distance=link_distance)
+
+    # Fraction of flagged pixels under each coarse pixel
+    fraction = cv2.resize(mask.astype(np.float32), None, fx=coarse_scale, fy=coarse_scale,
+                          interpolation=cv2.INTER_AREA)
+    coarse = (fraction > 0).astype(np.uint8)
+    # Link at least as far as the full-resolution pass, so coarse blobs contain its regions
+    link = int(np.ceil(link_distance * coarse_scale)) + 1
+    coarse = cv2.morphologyEx(coarse, cv2.MORPH_CLOSE, np.ones((link, link), np.uint8))
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(coarse, connectivity=8)
+    flagged = np.bincount(labels.ravel(), weights=fraction.ravel(), minlength=count) / coarse_scale ** 2
+
+    boxes = [tuple(int(v) for v in stats[label, :4]) for label in range(1, count) if flagged[label] >= min_area / 2]
+    rois = pyramid.merge_boxes(pyramid.to_full(boxes, coarse_scale, mask.shape, margin=link_distance + 2))
+
+    regions = []
+    for x, y, w, h in rois:
+        window = error_map[y:y + h, x:x + w] if error_map is not None else None
+        for region in find_regions(mask[y:y + h, x:x + w], window, min_area=min_area, link_distance=link_distance):
+            region.update(x1=region["x1"] + x, y1=region["y1"] + y, x2=region["x2"] + x, y2=region["y2"] + y)
+            regions.append(region)
+    regions.sort(key=_region_order)
+    return regions
+
+
+def analyze(original, recompressed, threshold=DEFAULT_THRESHOLD, scale=DEFAULT_SCALE,
+            min_area=DEFAULT_MIN_AREA, link_distance=DEFAULT_LINK_DISTANCE):
+    """
+    Run ELA on an image and its recompressed copy.
+    Returns the error map, the tampered mask, the overall bounding box and
+    the connected tampered regions (largest first).
+    """
+    error_map = compute_error_map(original, recompressed, scale=scale)
+    mask = error_map > threshold
+    regions = find_regions(mask, error_map, min_area=min_area, link_distance=link_distance)
+    return _summarize(error_map, mask, regions)
+
+
+def _summarize(error_map, mask, regions, tampered_ratio=None):
+    if regions:
+        tampered_box = {
+            "x1": min(r["x1"] for r in regions),
+            "y1": min(r["y1"] for r in regions),
+            "x2": max(r["x2"] for r in regions),
+            "y2": max(r["y2"] for r in regions),
+        }
+    else:
+        tampered_box = None
+
+    return {
+        "error_map": error_map,
+        "mask": mask,
+        "tampered_box": tampered_box,
+        "tampered_regions": regions,
+        "tampered_ratio": float(np.count_nonzero(mask)) / mask.size if tampered_ratio is None else tampered_ratio,
+    }
+
+
+def analyze_source(source, qualities=DEFAULT_QUALITIES, threshold=DEFAULT_THRESHOLD, scale=DEFAULT_SCALE,
+                   min_area=DEFAULT_MIN_AREA, link_distance=DEFAULT_LINK_DISTANCE, coarse_scale=pyramid.DEFAULT_SCALE,
+                   tiled=None):
+    """
+    Full ELA for one image: decode once, recompress in memory at every
+    quality in `qualities`, and combine the error maps (per-pixel maximum).
+    Every call uses its own buffers, so concurrent requests never share state.
+    Pages above tiles.TILE_THRESHOLD_MP go through analyze_tiled unless
+    `tiled` says otherwise.
+    """
+    if not qualities:
+        raise ValueError("At least one JPEG quality is required")
+    if tiled is None:
+        tiled = tiles.should_tile(*(source.shape[:2] if isinstance(source, Document) else tiles.image_size(source)))
+    if tiled:
+        if isinstance(source, Document):
+            # Spill from the upload band by band rather than from a full decoded copy
+            source = source.data if source.data is not None and not source.decoded else source.rgb
+        return analyze_tiled(source, qualities=qualities, threshold=threshold, scale=scale,
+                             min_area=min_area, link_distance=link_distance)
+
+    with stage("ela.load"):
+        image = load_image(source)
+        original = np.asarray(image)
+
+    error_map = None
+    per_quality = {}
+    for quality in qualities:
+        with stage("ela.recompress"):
+            recompressed = recompress(image, quality)
+        with stage("ela.error_map"):
+            level = compute_error_map(original, recompressed, scale=scale)
+        per_quality[int(quality)] = round(float(np.count_nonzero(level > threshold)) / level.size, 6)
+        error_map = level if error_map is None else np.maximum(error_map, level)
+
+    mask = error_map > threshold
+    with stage("ela.regions"):
+        regions = find_regions_coarse(mask, error_map, min_area=min_area, link_distance=link_distance,
+                                      coarse_scale=coarse_scale)
+    result = _summarize(error_map, mask, regions)
+    result["image"] = image
+    result["quality_ratios"] = per_quality
+    return result
+
+
+def _link_window(mask, kernel, window, shape):
+    """
+    The closing find_regions applies, for one window. Edges inside the page
+    are padded with background first: the default border makes a closing
+    stick to the image edge, which would join unrelated blobs along a seam.
+    """
+    x1, y1, x2, y2 = window
+    pad = kernel.shape[0]
+    top, bottom = pad * (y1 > 0), pad * (y2 < shape[0])
+    left, right = pad * (x1 > 0), pad * (x2 < shape[1])
+    padded = cv2.copyMakeBorder(mask.astype(np.uint8), top, bottom, left, right, cv2.BORDER_CONSTANT, value=0)
+    linked = cv2.morphologyEx(padded, cv2.MORPH_CLOSE, kernel)
+    return linked[top:top + mask.shape[0], left:left + mask.shape[1]]
+
+
+def analyze_tiled(source, qualities=DEFAULT_QUALITIES, threshold=DEFAULT_THRESHOLD, scale=DEFAULT_SCALE,
+                  min_area=DEFAULT_MIN_AREA, link_distance=DEFAULT_LINK_DISTANCE, overlap=tiles.DEFAULT_OVERLAP,
+                  budget_mb=tiles.TILE_BUDGET_MB):
+    """
+    analyze_source with bounded memory for very large pages. The page is
+    decoded into a memory-mapped file and analyzed in overlapping windows
+    of about `budget_mb`; regions crossing tile seams are merged. Same
+    result shape, except that "image" and "error_map" are memory-mapped
+    arrays and "mask" is None (there is no full-size mask).
+    """
+    if not qualities:
+        raise ValueError("At least one JPEG quality is required")
+    if overlap % TILE_ALIGN or overlap <= TILE_ALIGN + link_distance:
+        raise ValueError(f"overlap must be a multiple of {TILE_ALIGN} and exceed {TILE_ALIGN} + link_distance")
+
+    with stage("ela.load"):
+        image = tiles.decode_to_spill(source)
+    height, width = image.shape[:2]
+    error_map = tiles.spill((height, width))
+    merger = tiles.SeamMerger(height, width)
+    kernel = np.ones((link_distance, link_distance), np.uint8) if link_distance > 0 else None
+    flagged = dict.fromkeys((int(quality) for quality in qualities), 0)
+    flagged_total = 0
+    tile = tiles.tile_size(TILE_BYTES_PER_PIXEL, overlap, budget_mb, align=TILE_ALIGN)
+
+    count = 0
+    for core, window in tiles.grid(height, width, tile, overlap):
+        x1, y1, x2, y2 = window
+        if x1 == 0:  # A new row of tiles: rows above this window are done with
+            tiles.release(image, y1)
+            tiles.release(error_map, core[1])
+        inner = (slice(core[1] - y1, core[3] - y1), slice(core[0] - x1, core[2] - x1))
+        patch = np.ascontiguousarray(image[y1:y2, x1:x2])
+        patch_image = Image.fromarray(patch)
+
+        level_max = None
+        for quality in qualities:
+            with stage("ela.recompress"):
+                recompressed = recompress(patch_image, quality)
+            with stage("ela.error_map"):
+                level = compute_error_map(patch, recompressed, scale=scale)
+            flagged[int(quality)] += int(np.count_nonzero(level[inner] > threshold))
+            level_max = level if level_max is None else np.maximum(level_max, level)
+
+        error_map[core[1]:core[3], core[0]:core[2]] = level_max[inner]
+        mask = level_max > threshold
+        flagged_total += int(np.count_nonzero(mask[inner]))
+
+        # Error levels within a JPEG block of a window edge inside the page are not the page's: trim them
+        trim = (TILE_ALIGN * (x1 > 0), TILE_ALIGN * (y1 > 0), TILE_ALIGN * (x2 < width), TILE_ALIGN * (y2 < height))
+        trusted = (x1 + trim[0], y1 + trim[1], x2 - trim[2], y2 - trim[3])
+        mask = mask[trim[1]:mask.shape[0] - trim[3], trim[0]:mask.shape[1] - trim[2]]
+        level_max = level_max[trim[1]:level_max.shape[0] - trim[3], trim[0]:level_max.shape[1] - trim[2]]
+        with stage("ela.regions"):
+            linked = _link_window(mask, kernel, trusted, (height, width)) if kernel is not None else None
+            merger.add(core, trusted, mask, linked, level_max)
+        count += 1
+
+    regions = []
+    for component in merger.components():
+        if component["area"] < min_area:
+            continue
+        region = {key: component[key] for key in ("x1", "y1", "x2", "y2", "area")}
+        region["mean_error"] = round(component["weight"] / component["area"], 2)
+        regions.append(region)
+    regions.sort(key=_region_order)
+
+    pixels = float(height * width)
+    result = _summarize(error_map, None, regions, tampered_ratio=flagged_total / pixels)
+    result["image"] = image
+    result["quality_ratios"] = {quality: round(value / pixels, 6) for quality, value in flagged.items()}
+    result["tiles"] = count
+    return result
+
+
+def annotate(image, regions, color="blue", width=5, copy=True):
+    """
+    Return `image` (a PIL image or an RGB array) with a box drawn around
+    every region. Arrays are drawn on in place when copy=False, e.g. the
+    memory-mapped page of analyze_tiled, which nothing else shares.
+    """
+    if isinstance(image, np.ndarray):
+        annotated = image.copy() if copy else image
+        rgb = ImageColor.getrgb(color) if isinstance(color, str) else color
+        for region in regions:
+            cv2.rectangle(annotated, (region["x1"], region["y1"]), (region["x2"], region["y2"]), rgb, width)
+        return annotated
+
+    annotated = image.copy()
+    draw = ImageDraw.Draw(annotated)
+    for region in regions:
+        draw.rectangle([region["x1"], region["y1"], region["x2"], region["y2"]], outline=color, width=width)
+    return annotated
+
+
+def encode_image(image, format="JPEG", **params):
+    """Encode a PIL image or array to bytes in memory (e.g. for an HTTP response)."""
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
@@ -0,0 +1,312 @@
+"""
+Perceptual-hash index of verified originals, searched by Hamming distance.
+
+    python hash_index.py add originals.npz archive/
+    python hash_index.py query originals.npz suspect.jpg -k 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from itertools import combinations
+
+import imagehash
+import numpy as np
+from PIL import Image
+
+HASH_KINDS = ("ahash", "phash", "dhash")
+HASH_FUNCTIONS = {
+    "ahash": imagehash.average_hash,
+    "phash": imagehash.phash,
+    "dhash": imagehash.dhash,
+}
+DEFAULT_KIND = "phash"
+DEFAULT_DISTANCE = 8
+CHUNKS = 4  # 16-bit chunks per 64-bit hash
+CHUNK_BITS = 64 // CHUNKS
+MAX_CHUNK_RADIUS = 2  # Beyond this, enumerating chunk neighbours costs more than a linear scan
+TAIL_MERGE_SIZE = 4096  # Unsorted rows scanned directly before they are merged into the tables
+LINEAR_SCAN_SIZE = 50000  # Below this a popcount over every row is already faster
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp")
+
+
+def pack_hash(image_hash):
+    """imagehash.ImageHash (8x8 bits) -> Python int."""
+    return int.from_bytes(np.packbits(image_hash.hash.flatten()).tobytes(), "big")
+
+
+def compute_hashes(image):
+    """{'ahash', 'phash', 'dhash'} packed 64-bit hashes for a path or PIL image."""
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    return {kind: pack_hash(HASH_FUNCTIONS[kind](image)) for kind in HASH_KINDS}
+
+
+def hamming(a, b):
+    """Bit distance between two packed hashes."""
+    return bin(int(a) ^ int(b)).count("1")
+
+
+def _chunk_masks(radius):
+    """XOR masks of every 16-bit pattern with at most `radius` bits set."""
+    masks = [0]
+    for bits in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), bits):
+            masks.append(sum(1 << p for p in positions))
+    return np.array(masks, dtype=np.uint64)
+
+
+CHUNK_MASKS = {radius: _chunk_masks(radius) for radius in range(MAX_CHUNK_RADIUS + 1)}
+
+
+def _chunk(values, index):
+    return (values >> np.uint64(index * CHUNK_BITS)) & np.uint64(0xFFFF)
+
+
+def _chunk_keys(values):
+    """Table keys of every chunk of every value: chunk position << 16 | chunk value."""
+    return np.concatenate([_chunk(values, index) | np.uint64(index << CHUNK_BITS)
+                           for index in range(CHUNKS)]).astype(np.int64)
+
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    def _popcount(values):
+        # NumPy < 2.0: count the bits of each uint64 through its eight bytes
+        octets = np.ascontiguousarray(values, dtype=np.uint64).view(np.uint8).reshape(-1, 8)
+        return np.unpackbits(octets, axis=1).sum(axis=1, dtype=np.uint8)
+
+
+class HashIndex:
+    """Near-duplicate lookup of perceptual hashes by Hamming distance."""
+
+    def __init__(self, path=None, readonly=False):
+        self.path = path
+        self.ids = []
+        self._hashes = {kind: np.zeros(1024, dtype=np.uint64) for kind in HASH_KINDS}
+        self._size = 0
+        self._sorted_size = 0  # Rows [0, _sorted_size) are covered by the chunk tables
+        self._tables = {}  # kind -> [(sorted chunk values, row order)] per chunk
+        self._lock = threading.RLock()
+        self._journal = None
+        if path is not None:
+            self._load()
+        if path is not None and not readonly:
+            self._journal = open(self._journal_path(), "a", encoding="utf-8")
+
+    def __len__(self):
+        return self._size
+
+    def hashes(self, kind=DEFAULT_KIND):
+        return self._hashes[kind][:self._size]
+
+    # Inserts
+
+    def _append(self, doc_id, hashes):
+        if self._size == len(self._hashes[DEFAULT_KIND]):
+            for kind in HASH_KINDS:
+                grown = np.zeros(self._size * 2, dtype=np.uint64)
+                grown[:self._size] = self._hashes[kind][:self._size]
+                self._hashes[kind] = grown
+        for kind in HASH_KINDS:
+            self._hashes[kind][self._size] = hashes[kind]
+        self.ids.append(doc_id)
+        self._size += 1
+
+    def add(self, doc_id, image=None, hashes=None):
+        """Insert one original by image (path or PIL) or precomputed hashes."""
+        if hashes is None:
+            hashes = compute_hashes(image)
+        with self._lock:
+            self._append(doc_id, hashes)
+            if self._journal is not None:
+                self._journal.write(json.dumps({"id": doc_id, **{kind: hashes[kind] for kind in HASH_KINDS}}) + "\n")
+                self._journal.flush()
+            if self._size - self._sorted_size >= TAIL_MERGE_SIZE:
+                self._update_tables()
+        return hashes
+
+    def add_many(self, ids, hashes):
+        """Bulk insert: `hashes` maps each kind to an array of packed hashes."""
+        with self._lock:
+            count = len(ids)
+            needed = self._size + count
+            for kind in HASH_KINDS:
+                if needed > len(self._hashes[kind]):
+                    grown = np.zeros(max(needed, self._size * 2), dtype=np.uint64)
+                    grown[:self._size] = self._hashes[kind][:self._size]
+                    self._hashes[kind] = grown
+                self._hashes[kind][self._size:needed] = np.asarray(hashes[kind], dtype=np.uint64)
+            self.ids.extend(ids)
+            self._size = needed
+            if self._journal is not None:
+                for row in range(needed - count, needed):
+                    entry = {"id": self.ids[row], **{kind: int(self._hashes[kind][row]) for kind in HASH_KINDS}}
+                    self._journal.write(json.dumps(entry) + "\n")
+                self._journal.flush()
+            self._update_tables()
+
+    def _update_tables(self):
+        """Make the chunk tables cover every row (the tail becomes empty)."""
+        if not self._tables or self._size - self._sorted_size > self._sorted_size:
+            self._build_tables()
+        else:
+            self._merge_tail()
+
+    def _build_tables(self):
+        """Sort the chunk tables from scratch."""
+        self._tables = {}
+        rows = np.arange(self._size, dtype=np.int64)
+        for kind in HASH_KINDS:
+            # One sorted array for all chunks
+            keys = _chunk_keys(self.hashes(kind))
+            order = np.argsort(keys, kind="stable")
+            # Bucket directory: rows for key b are rows[buckets[b]:buckets[b + 1]]
+            buckets = np.zeros((CHUNKS << CHUNK_BITS) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(keys, minlength=CHUNKS << CHUNK_BITS), out=buckets[1:])
+            self._tables[kind] = (buckets, np.tile(rows, CHUNKS)[order])
+        self._sorted_size = self._size
+
+    def _merge_tail(self):
+        """Merge the tail into the sorted tables: sort only the tail, then one linear insert."""
+        tail = np.arange(self._sorted_size, self._size, dtype=np.int64)
+        for kind in HASH_KINDS:
+            buckets, rows = self._tables[kind]
+            keys = _chunk_keys(self._hashes[kind][self._sorted_size:self._size])
+            order = np.argsort(keys, kind="stable")
+            keys = keys[order]
+            # Each new row goes at the end of its bucket: rows stay in row order within a bucket
+            merged = np.insert(rows, buckets[keys + 1], np.tile(tail, CHUNKS)[order])
+            buckets = buckets.copy()
+            buckets[1:] += np.cumsum(np.bincount(keys, minlength=CHUNKS << CHUNK_BITS))
+            self._tables[kind] = (buckets, merged)
+        self._sorted_size = self._size
+
+    # Queries
+
+    def _candidates(self, kind, query, radius):
+        buckets, rows = self._tables[kind]
+        probes = np.concatenate([(_chunk(query, index) ^ CHUNK_MASKS[radius]) | np.uint64(index << CHUNK_BITS)
+                                 for index in range(CHUNKS)]).astype(np.int64)
+        starts = buckets[probes]
+        lengths = buckets[probes + 1] - starts
+        # Gather every matching range without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return rows[np.arange(lengths.sum()) + offsets]
+
+    def search(self, query, k=DEFAULT_DISTANCE, kind=DEFAULT_KIND, limit=10):
+        """
+        Entries within Hamming distance k of a packed query hash, nearest
+        first: [{"id", "distance"}].
+        """
+        query = np.uint64(query)
+        with self._lock:
+            values = self.hashes(kind)
+            # Pigeonhole: an entry within k bits has some chunk within k // CHUNKS bits of the query
+            radius = k // CHUNKS
+            if radius > MAX_CHUNK_RADIUS or kind not in self._tables or self._size < LINEAR_SCAN_SIZE:
+                distances = _popcount(values ^ query)
+                rows = np.flatnonzero(distances <= k)
+                distances = distances[rows]
+            else:
+                tail = np.arange(self._sorted_size, self._size)
+                rows = np.concatenate([self._candidates(kind, query, radius), tail])
+                distances = _popcount(values[rows] ^ query)
+                keep = distances <= k
+                # A row matching on several chunks shows up more than once
+                rows, first = np.unique(rows[keep], return_index=True)
+                distances = distances[keep][first]
+            nearest = np.argsort(distances, kind="stable")[:limit]
+            return [{"id": self.ids[rows[i]], "distance": int(distances[i])} for i in nearest]
+
+    def lookup(self, image, k=DEFAULT_DISTANCE, kind=DEFAULT_KIND, limit=10):
+        """Nearest known originals for an image (path or PIL)."""
+        hashes = compute_hashes(image)
+        return self.search(hashes[kind], k=k, kind=kind, limit=limit)
+
+    # Persistence
+
+    def _journal_path(self):
+        return self.path + ".journal"
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with np.load(self.path, allow_pickle=False) as snapshot:
+                ids = [str(doc_id) for doc_id in snapshot["ids"]]
+                self.add_many(ids, {kind: snapshot[kind] for kind in HASH_KINDS})
+        # Replay inserts made since the last snapshot; a torn last line is dropped
+        if os.path.exists(self._journal_path()):
+            ids, hashes = [], {kind: [] for kind in HASH_KINDS}
+            with open(self._journal_path(), encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    ids.append(entry["id"])
+                    for kind in HASH_KINDS:
+                        hashes[kind].append(entry[kind])
+            if ids:
+                self.add_many(ids, {kind: np.array(hashes[kind], dtype=np.uint64) for kind in HASH_KINDS})
+
+    def save(self):
+        """Write a snapshot and truncate the journal."""
+        if self._journal is None:
+            raise ValueError("Index has no path or was opened read-only")
+        with self._lock:
+            temp = self.path + ".tmp.npz"
+            np.savez(temp, ids=np.array(self.ids, dtype=str), **{kind: self.hashes(kind) for kind in HASH_KINDS})
+            os.replace(temp, self.path)
+            self._journal.truncate(0)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+def _iter_images(folder):
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, folder), path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Hash every image in a folder into the index")
+    add.add_argument("index")
+    add.add_argument("folder")
+    query = commands.add_parser("query", help="Nearest originals for an image")
+    query.add_argument("index")
+    query.add_argument("image")
+    query.add_argument("-k", type=int, default=DEFAULT_DISTANCE, help="Maximum Hamming distance")
+    query.add_argument("--kind", choices=HASH_KINDS, default=DEFAULT_KIND)
+    args = parser.parse_args()
+
+    index = HashIndex(args.index)
+    if args.command == "add":
+        known = set(index.ids)
+        added = 0
+        for doc_id, path in _iter_images(args.folder):
+            if doc_id in known:
+                continue
+            try:
+                index.add(doc_id, path)
+                added += 1
+            except OSError as e:
+                print(f"Skipping {path}: {e}", file=sys.stderr)
+        index.save()
+        print(f"Added {added} images ({len(index)} in index)")
+    else:
+        print(json.dumps(index.lookup(args.image, k=args.k, kind=args.kind), indent=2))
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Stage timing and profiling: `with stage("tables.edges"):` (or @timed) feeds a latency
+# histogram for /metrics, the current trace() and, with IDP_TIMING_LOG, the "idp.timing" logger.
+
+LOG_TIMINGS = bool(os.environ.get("IDP_TIMING_LOG"))
+ALLOW_PROFILE = bool(os.environ.get("IDP_ALLOW_PROFILE"))
+PROFILE_HEADER = "X-Profile"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("idp.timing")
+
+_trace = contextvars.ContextVar("idp_trace", default=None)
+_lock = threading.Lock()
+_histograms = {}  # (metric, label name, label value) -> [bucket counts..., +Inf count, sum]
+
+
+def observe(metric, label, value, seconds):
+    """Add one observation to the histogram `metric{label="value"}`."""
+    key = (metric, label, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[index] += 1
+        histogram[len(BUCKETS)] += 1
+        histogram[-1] += seconds
+
+
+def record(records):
+    """Feed stage records produced elsewhere (e.g. by a worker process) into the histograms."""
+    for entry in records:
+        observe("idp_stage_seconds", "stage", entry["stage"], entry["seconds"])
+    current = _trace.get()
+    if current is not None:
+        current.extend(records)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        observe("idp_stage_seconds", "stage", name, seconds)
+        current = _trace.get()
+        if current is not None:
+            current.append({"stage": name, "seconds": round(seconds, 6)})
+        if LOG_TIMINGS:
+            logger.info(json.dumps({"stage": name, "seconds": round(seconds, 6), "pid": os.getpid()}))
+
+
+def timed(name):
+    """Decorator form of stage()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace():
+    """Collect the stage records of everything run inside the block into the yielded list."""
+    records = []
+    token = _trace.set(records)
+    try:
+        yield records
+    finally:
+        _trace.reset(token)
+
+
+@contextmanager
+def profile(kind="cprofile", limit=40):
+    """
+    Profile the block; the yielded dict gets a "report" (text) on exit.
+    kind is "cprofile" or "pyinstrument" (falls back to cProfile if missing).
+    """
+    output = {}
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            kind = "cprofile"
+    if kind == "pyinstrument":
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield output
+        finally:
+            profiler.stop()
+            output["report"] = profiler.output_text(unicode=False, color=False)
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield output
+    finally:
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+        output["report"] = stream.getvalue()
+
+
+def render_metrics():
+    """All histograms in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = sorted((key, list(values)) for key, values in _histograms.items())
+
+    lines = []
+    previous_metric = None
+    for (metric, label, value), histogram in snapshot:
+        if metric != previous_metric:
+            lines.append(f"# TYPE {metric} histogram")
+            previous_metric = metric
+        value = value.replace("\\", "\\\\").replace('"', '\\"')
+        for bound, count in zip(BUCKETS, histogram):
+            lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{label}="{value}",le="+Inf"}} {histogram[len(BUCKETS)]}')
+        lines.append(f'{metric}_sum{{{label}="{value}"}} {histogram[-1]:.6f}')
+        lines.append(f'{metric}_count{{{label}="{value}"}} {histogram[len(BUCKETS)]}')
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
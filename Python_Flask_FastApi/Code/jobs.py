@@ -0,0 +1,407 @@
+"""
+Persistent job queue for long-running analyses, leased to workers and retried.
+
+    python jobs.py --workers 4          # run a supervised worker pool
+    python jobs.py --db other.sqlite3   # use another queue database
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+from document import Document
+
+# The dark-background detector lives next to the sample images
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "images"))
+
+DB_PATH = os.environ.get("IDP_JOBS_DB", "jobs/jobs.sqlite3")
+LEASE_SECONDS = 60  # A job whose worker has not reported for this long is retried
+MAX_ATTEMPTS = 3
+# Errors a retry would only repeat: an undecodable upload, an unknown analyzer
+PERMANENT_ERRORS = (ValueError, KeyError)
+POLL_INTERVAL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    analyzer TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (content_hash, analyzer)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, created);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    time REAL NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL
+);
+CREATE INDEX IF NOT EXISTS events_job ON events (job_id, seq);
+"""
+
+
+# Analyzers with progress reporting. Each takes the document bytes and a
+# report(stage, progress) callback and returns a JSON-ready dict.
+
+def _decode(data):
+    # A decoded Document: the analyzer's gray/HSV/threshold views are computed once on it
+    document = Document(data)
+    document.bgr  # Raises ValueError for an undecodable upload
+    return document
+
+
+def tampered_words_analyzer(data, report):
+    import ocr
+    import unilm_idp_detection
+
+    report("decode", 0.05)
+    image = _decode(data)
+    report("ocr", 0.1)
+    words, coords = ocr.word_boxes(image, config=unilm_idp_detection.OCR_CONFIG,
+                                   preprocess=unilm_idp_detection.OCR_PREPROCESS)
+    report("classify", 0.4)
+    tampered_coords, classification = unilm_idp_detection.detect_tampered_words(
+        "", words, coords, return_report=True)
+    tampered = set(tampered_coords)
+    return {
+        "tampered_words": [{"word": word, "bbox": box} for word, box in zip(words, coords) if box in tampered],
+        "report": classification,
+    }
+
+
+def tamper_analyzer(data, report, scale=None):
+    import pyramid
+    import tempered
+
+    report("decode", 0.05)
+    image = _decode(data)
+    report("regions", 0.2)
+    # Tiled on very large pages, coarse-to-fine otherwise, then OCR of the regions
+    regions = tempered.detect_tampered_regions(image, scale=pyramid.DEFAULT_SCALE if scale is None else scale)
+    return {"tampered": bool(regions), "regions": regions}
+
+
+def ela_analyzer(data, report):
+    import ela
+
+    report("ela", 0.1)
+    result = ela.analyze_source(data)
+    return {"tampered_box": result["tampered_box"], "tampered_regions": result["tampered_regions"]}
+
+
+def jpeg_dq_analyzer(data, report):
+    import jpeg_forensics
+
+    report("dct", 0.1)
+    result = jpeg_forensics.analyze_source(data)
+    return {key: result[key] for key in ("tampered_box", "tampered_regions", "tampered_ratio", "quality",
+                                         "double_compressed", "frequencies")}
+
+
+def barcode_analyzer(data, report):
+    import text_extraction
+
+    report("decode", 0.1)
+    return text_extraction.detect_and_verify_barcode(data, {})
+
+
+def tables_analyzer(data, report):
+    import bank_statement
+
+    report("decode", 0.1)
+    image = _decode(data)
+    report("tables", 0.3)
+    return {"detected_tables": [{"bbox": box} for box in bank_statement.detect_table_boxes(image)]}
+
+
+def table_structure_analyzer(data, report):
+    import table_structure
+
+    report("decode", 0.1)
+    image = _decode(data)
+    report("structure", 0.2)
+    return {"tables": table_structure.extract_tables(image)}
+
+
+def triage_analyzer(data, report, doc_type=None):
+    import triage
+
+    report("triage", 0.05)
+    return triage.triage(_decode(data), doc_type=doc_type)
+
+
+ANALYZERS = {
+    "tampered-words": tampered_words_analyzer,
+    "tamper": tamper_analyzer,
+    "ela": ela_analyzer,
+    "jpeg-dq": jpeg_dq_analyzer,
+    "barcode": barcode_analyzer,
+    "tables": tables_analyzer,
+    "table-structure": table_structure_analyzer,
+    "triage": triage_analyzer,
+}
+
+
+class JobStore:
+    """SQLite-backed job queue. Safe to use from several processes at once."""
+
+    def __init__(self, db_path=DB_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.blob_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), "blobs")
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database lock up front (no upgrade deadlocks)."""
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _event(self, db, job_id, status, stage=None, progress=None):
+        db.execute("INSERT INTO events (job_id, time, status, stage, progress) VALUES (?, ?, ?, ?, ?)",
+                   (job_id, time.time(), status, stage, progress))
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.blob_dir, content_hash)
+
+    def submit(self, data, analyzer, priority=0):
+        """
+        Queue `data` for `analyzer`. Returns (job_id, deduplicated); an
+        identical earlier submission is reused unless it failed, in which
+        case it is queued again.
+        """
+        if analyzer not in ANALYZERS:
+            raise ValueError(f"Unknown analyzer: {analyzer}")
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        path = self.blob_path(content_hash)
+        if not os.path.exists(path):
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as blob:
+                blob.write(data)
+            os.replace(temp_path, path)
+
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT id, status FROM jobs WHERE content_hash = ? AND analyzer = ?",
+                             (content_hash, analyzer)).fetchone()
+            if row is not None:
+                if row["status"] == "failed":
+                    db.execute("UPDATE jobs SET status = 'queued', attempts = 0, error = NULL, stage = NULL, "
+                               "progress = 0, priority = ?, updated = ? WHERE id = ?", (priority, now, row["id"]))
+                    self._event(db, row["id"], "queued")
+                return row["id"], True
+
+            job_id = uuid.uuid4().hex
+            db.execute("INSERT INTO jobs (id, analyzer, content_hash, priority, status, created, updated) "
+                       "VALUES (?, ?, ?, ?, 'queued', ?, ?)", (job_id, analyzer, content_hash, priority, now, now))
+            self._event(db, job_id, "queued")
+            return job_id, False
+
+    def claim(self, worker):
+        """Lease the next job (highest priority, then oldest), or return None."""
+        now = time.time()
+        with self._transaction() as db:
+            # Jobs whose worker vanished: retry, or give up after max_attempts
+            expired = db.execute("SELECT id, attempts FROM jobs WHERE status = 'running' AND lease_until < ?",
+                                 (now,)).fetchall()
+            for row in expired:
+                if row["attempts"] >= self.max_attempts:
+                    db.execute("UPDATE jobs SET status = 'failed', error = 'Worker crashed or timed out', "
+                               "updated = ? WHERE id = ?", (now, row["id"]))
+                    self._event(db, row["id"], "failed")
+                else:
+                    db.execute("UPDATE jobs SET status = 'queued', updated = ? WHERE id = ?", (now, row["id"]))
+                    self._event(db, row["id"], "queued", "retry")
+
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' "
+                             "ORDER BY priority DESC, created LIMIT 1").fetchone()
+            if row is None:
+                return None
+
+            db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                       "lease_until = ?, stage = 'started', updated = ? WHERE id = ?",
+                       (worker, now + self.lease_seconds, now, row["id"]))
+            self._event(db, row["id"], "running", "started", row["progress"])
+            return dict(row)
+
+    def progress(self, job_id, stage, progress):
+        """Record a stage change; also renews the job's lease."""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET stage = ?, progress = ?, lease_until = ?, updated = ? WHERE id = ?",
+                       (stage, progress, now + self.lease_seconds, now, job_id))
+            self._event(db, job_id, "running", stage, progress)
+
+    def heartbeat(self, job_id, worker):
+        """Renew the lease of a job this worker is still running."""
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                       (time.time() + self.lease_seconds, job_id, worker))
+
+    def complete(self, job_id, worker, result):
+        """
+        Store the result of a job this worker is still running. Returns False,
+        changing nothing, when its lease lapsed and the job moved on.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            updated = db.execute("UPDATE jobs SET status = 'done', stage = 'done', progress = 1, result = ?, "
+                                 "lease_until = NULL, updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                 (json.dumps(result, default=str), now, job_id, worker)).rowcount
+            if updated:
+                self._event(db, job_id, "done", "done", 1.0)
+        return bool(updated)
+
+    def fail(self, job_id, worker, error, retry=True):
+        """
+        Record a failed attempt of a job this worker is still running; it is
+        queued again until it runs out of attempts, or never with retry=False.
+        Returns False, changing nothing, when the job is no longer this worker's.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND status = 'running'",
+                             (job_id, worker)).fetchone()
+            if row is None:
+                return False
+            status = "queued" if retry and row["attempts"] < self.max_attempts else "failed"
+            db.execute("UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated = ? WHERE id = ?",
+                       (status, error, now, job_id))
+            self._event(db, job_id, status, "error")
+        return True
+
+    def get(self, job_id):
+        """Job state as a dict (result decoded), or None."""
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def events(self, job_id, after=0):
+        """Progress events for a job with seq greater than `after`."""
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT * FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                              (job_id, after)).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+def run_worker(db_path=DB_PATH, worker=None, stop_when_idle=False):
+    """Claim and run jobs until stopped (or until the queue is empty with stop_when_idle)."""
+    store = JobStore(db_path)
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        job = store.claim(worker)
+        if job is None:
+            if stop_when_idle:
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        # Keep the lease alive while a long stage runs; if this process dies the lease lapses
+        finished = threading.Event()
+
+        def keep_alive(job_id=job["id"]):
+            while not finished.wait(store.lease_seconds / 3):
+                store.heartbeat(job_id, worker)
+
+        threading.Thread(target=keep_alive, daemon=True).start()
+        try:
+            with open(store.blob_path(job["content_hash"]), "rb") as blob:
+                data = blob.read()
+            report = lambda stage, progress: store.progress(job["id"], stage, progress)
+            store.complete(job["id"], worker, ANALYZERS[job["analyzer"]](data, report))
+        except Exception as e:
+            store.fail(job["id"], worker, f"{type(e).__name__}: {e}", retry=not isinstance(e, PERMANENT_ERRORS))
+        finally:
+            finished.set()
+
+
+def _worker_process(db_path):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # Forked after supervise() took SIGTERM over
+    run_worker(db_path)
+
+
+def supervise(workers, db_path=DB_PATH, stop=None):
+    """
+    Keep `workers` worker processes alive, restarting any that die, until
+    `stop` is set or the process gets SIGTERM; then stop and join them.
+    """
+    JobStore(db_path)  # Create the schema once before the workers race for it
+    stop = stop or threading.Event()
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    except ValueError:  # Not the main thread: only `stop` ends the loop
+        pass
+    processes = {}
+    try:
+        while not stop.is_set():
+            for slot in range(workers):
+                process = processes.get(slot)
+                if process is None or not process.is_alive():
+                    process = multiprocessing.Process(target=_worker_process, args=(db_path,), daemon=True)
+                    process.start()
+                    processes[slot] = process
+            stop.wait(1)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+    supervise(args.workers, args.db)
+
+
+if __name__ == "__main__":
+    main()
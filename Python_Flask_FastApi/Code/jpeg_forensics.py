@@ -0,0 +1,255 @@
+import cv2
+import numpy as np
+
+import ela
+from document import Document
+from instrument import stage
+
+# Double-quantization (DQ) analysis on 8x8 DCT blocks: content pasted into a JPEG that was
+# saved twice is quantized only once, so its coefficients miss the periodic histogram peaks
+# of the rest of the page. Results have the shape of ela.analyze_source's.
+
+BLOCK = 8
+DEFAULT_FREQUENCIES = 15  # Low-frequency AC coefficients (zigzag order) analyzed; higher ones are mostly zero
+DEFAULT_THRESHOLD = 0.8  # Block score above which a block counts as tampered
+DEFAULT_MIN_BLOCKS = 8  # Ignore regions smaller than this many blocks
+DEFAULT_LINK_BLOCKS = 3  # Flagged blocks this close are joined into one region...
+LINK_FRACTION = 1 / 48  # ...or this fraction of the page width, if more: re-typed strokes spread out at high dpi
+HISTOGRAM_RANGE = 64  # Coefficients are histogrammed over [-range, range]
+MAX_FIRST_STEP = 40  # Largest first-save quantization step tried
+MIN_EVIDENCE = 0.4  # A frequency counts as double-quantized from this much evidence (see estimate_first_step)
+ROUNDING_SLACK = 0.6  # Coefficient drift allowed for pixel rounding between the two saves
+MIN_COUNT = 5  # Bins with fewer coefficients than this count as gaps
+BAND_BLOCKS = 256  # Block rows transformed at a time, bounding the float working memory
+
+# Zigzag scan order of an 8x8 block, as (row, column) flat indices
+ZIGZAG = np.array([
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5, 12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14,
+    21, 28, 35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51, 58, 59, 52, 45, 38, 31, 39, 46, 53, 60,
+    61, 54, 47, 55, 62, 63])
+
+# IJG (libjpeg) standard luminance table, scaled by quality to estimate the quality of a file
+STANDARD_LUMA = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55, 14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62, 18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99]).reshape(8, 8)
+
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def parse_jpeg(data):
+    """
+    Quantization tables and frame header of a JPEG, read from its DQT and
+    SOF segments: {"tables": {id: 8x8 array (natural order)}, "width",
+    "height", "progressive", "components": [{"id", "h", "v", "table"}]}.
+    Raises ValueError for anything that is not a JPEG.
+    """
+    data = bytes(data)
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Not a JPEG file")
+    tables, frame = {}, None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Corrupt JPEG: expected a marker")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # Standalone markers
+            pos += 2
+            continue
+        if marker in (0xDA, 0xD9):  # Start of scan / end of image: all tables seen
+            break
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xDB:
+            offset = 0
+            while offset < len(segment):
+                precision, table_id = segment[offset] >> 4, segment[offset] & 0x0F
+                size = 128 if precision else 64
+                values = np.frombuffer(segment[offset + 1:offset + 1 + size], ">u2" if precision else np.uint8)
+                table = np.empty(64, np.int32)
+                table[ZIGZAG] = values
+                tables[table_id] = table.reshape(8, 8)
+                offset += 1 + size
+        elif marker in _SOF_MARKERS:
+            height, width, count = int.from_bytes(segment[1:3], "big"), int.from_bytes(segment[3:5], "big"), segment[5]
+            components = [{"id": segment[6 + 3 * i], "h": segment[7 + 3 * i] >> 4, "v": segment[7 + 3 * i] & 0x0F,
+                           "table": segment[8 + 3 * i]} for i in range(count)]
+            frame = {"width": width, "height": height, "progressive": marker == 0xC2, "components": components}
+        pos += 2 + length
+    if frame is None or not tables:
+        raise ValueError("Corrupt JPEG: no frame header or quantization table")
+    return dict(frame, tables=tables)
+
+
+def estimate_quality(table):
+    """The IJG quality (1-100) whose scaled standard luminance table is closest to `table`."""
+    best, best_error = None, None
+    for quality in range(1, 101):
+        scale = 5000 / quality if quality < 50 else 200 - 2 * quality
+        scaled = np.clip((STANDARD_LUMA * scale + 50) // 100, 1, 255)
+        error = np.abs(scaled - table).sum()
+        if best_error is None or error < best_error:
+            best, best_error = quality, error
+    return best
+
+
+def _dct_matrix():
+    k = np.arange(BLOCK)
+    matrix = np.cos((2 * k[None, :] + 1) * k[:, None] * np.pi / (2 * BLOCK)) * np.sqrt(2.0 / BLOCK)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+DCT = _dct_matrix()
+
+
+def quantized_coefficients(luma, table, frequencies):
+    """
+    Rounded DCT coefficients / quantization step of every 8x8 block of a
+    uint8 luma plane, for the zigzag `frequencies`: int32 array of shape
+    (block rows, block columns, len(frequencies)).
+    """
+    rows, columns = luma.shape[0] // BLOCK, luma.shape[1] // BLOCK
+    flat = ZIGZAG[frequencies]
+    steps = table.reshape(64)[flat].astype(np.float32)
+    result = np.empty((rows, columns, len(flat)), np.int32)
+    for start in range(0, rows, BAND_BLOCKS):
+        stop = min(start + BAND_BLOCKS, rows)
+        band = luma[start * BLOCK:stop * BLOCK, :columns * BLOCK].astype(np.float32) - 128
+        blocks = band.reshape(stop - start, BLOCK, columns, BLOCK).transpose(0, 2, 1, 3)
+        coefficients = DCT @ blocks @ DCT.T  # Batched 8x8 DCT-II over every block
+        picked = coefficients.reshape(stop - start, columns, 64)[:, :, flat]
+        result[start:stop] = np.rint(picked / steps)
+    return result
+
+
+def _reachable_bins(first_step, step):
+    """Bins a coefficient quantized with `first_step` can land in when requantized with `step`."""
+    multiples = np.arange(-(HISTOGRAM_RANGE * step) // first_step - 2, (HISTOGRAM_RANGE * step) // first_step + 3)
+    # +-ROUNDING_SLACK: the first decode rounded pixels to integers, which moves coefficients slightly
+    values = multiples[:, None] * first_step + np.array([-ROUNDING_SLACK, 0, ROUNDING_SLACK])
+    bins = np.rint(values / step).astype(np.int64).ravel()
+    reachable = np.zeros(2 * HISTOGRAM_RANGE + 1, bool)
+    reachable[bins[np.abs(bins) <= HISTOGRAM_RANGE] + HISTOGRAM_RANGE] = True
+    return reachable
+
+
+def estimate_first_step(histogram, step):
+    """
+    (evidence, first step) for one frequency's coefficient histogram: the
+    first-save step whose reachable bins hold the most coefficients beyond
+    what a smooth (single-compressed) histogram would put there. Evidence
+    is that excess, from 0 (no sign of a first compression) to 1.
+    """
+    values = histogram.astype(np.float64)
+    smooth = np.convolve(values, np.ones(7) / 7, mode="same")
+    nonzero = np.ones(len(values), bool)
+    nonzero[HISTOGRAM_RANGE] = False  # The zero bin is reachable from any step
+    total, smooth_total = values[nonzero].sum(), smooth[nonzero].sum()
+    if not total:
+        return 0.0, None
+    best = (0.0, None)
+    for first_step in range(step + 1, MAX_FIRST_STEP + 1):
+        reachable = _reachable_bins(first_step, step) & nonzero
+        evidence = values[reachable].sum() / total - smooth[reachable].sum() / smooth_total
+        if evidence > best[0]:
+            best = (float(evidence), first_step)
+    return best
+
+
+def tamper_probabilities(histogram, first_step, step):
+    """
+    P(tampered) per histogram bin: the mean count over one period
+    (first_step / step bins) around the bin, over the count in the bin. Low
+    on the double-quantization peaks, 1 in the gaps between them.
+    """
+    values = histogram.astype(np.float64)
+    width = max(3, 2 * int(first_step / step / 2) + 1)
+    window = np.convolve(values, np.ones(width) / width, mode="same")
+    return np.where(values >= MIN_COUNT, np.clip(window / np.maximum(values, 1), 0, 1), 1.0)
+
+
+def block_scores(coefficients, steps):
+    """
+    Per-block tamper score in [0, 1] (NaN where no double-quantized
+    frequency had a non-zero coefficient), averaged over frequencies
+    weighted by their evidence, and what was found per frequency.
+    """
+    rows, columns, count = coefficients.shape
+    total = np.zeros((rows, columns))
+    weight = np.zeros((rows, columns))
+    found = []
+    for index in range(count):
+        values, step = coefficients[:, :, index], int(steps[index])
+        bins = np.clip(values, -HISTOGRAM_RANGE, HISTOGRAM_RANGE) + HISTOGRAM_RANGE
+        histogram = np.bincount(bins.ravel(), minlength=2 * HISTOGRAM_RANGE + 1)
+        evidence, first_step = estimate_first_step(histogram, step)
+        double = evidence >= MIN_EVIDENCE
+        found.append({"step": step, "first_step": first_step if double else None, "evidence": round(evidence, 3)})
+        if not double:
+            continue
+        informative = (values != 0) & (np.abs(values) < HISTOGRAM_RANGE)
+        total += evidence * np.where(informative, tamper_probabilities(histogram, first_step, step)[bins], 0)
+        weight += evidence * informative
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / weight, found
+
+
+def analyze_source(source, frequencies=DEFAULT_FREQUENCIES, threshold=DEFAULT_THRESHOLD,
+                   min_blocks=DEFAULT_MIN_BLOCKS, link_blocks=None):
+    """
+    Double-quantization analysis of a JPEG (path, bytes or Document), with
+    the same result keys as ela.analyze_source: "error_map" (block scores
+    as 0-255, repeated over each block's pixels), "mask" (one value per
+    block), "tampered_box", "tampered_regions" (pixel coordinates and area)
+    and "tampered_ratio" (share of blocks flagged). Also returns "quality"
+    (estimated from the luma table), "quantization_table", "frequencies"
+    (step, estimated first step and evidence per analyzed frequency) and
+    "double_compressed". Raises ValueError for anything but a JPEG.
+    """
+    if isinstance(source, str):
+        source = Document.open(source)
+    elif not isinstance(source, Document):
+        source = Document(source)
+    if source.data is None:
+        raise ValueError("JPEG forensics needs the uploaded file, not decoded pixels")
+
+    with stage("dq.parse"):
+        header = parse_jpeg(source.data)
+        table = header["tables"][header["components"][0]["table"]]
+    luma = source.luma
+    with stage("dq.dct"):
+        zigzag = np.arange(1, frequencies + 1)
+        coefficients = quantized_coefficients(luma, table, zigzag)
+    with stage("dq.histograms"):
+        scores, found = block_scores(coefficients, table.reshape(64)[ZIGZAG[zigzag]])
+
+    with stage("dq.regions"):
+        scores = np.nan_to_num(scores, nan=0.0)
+        flagged = scores > threshold
+        # A lone block is noise: keep flagged blocks with at least one flagged neighbour
+        neighbours = cv2.filter2D(flagged.astype(np.uint8), -1, np.ones((3, 3), np.float32),
+                                  borderType=cv2.BORDER_CONSTANT)
+        flagged &= neighbours >= 2
+        block_map = np.rint(scores * 255).astype(np.uint8)
+        if link_blocks is None:
+            link_blocks = max(DEFAULT_LINK_BLOCKS, int(block_map.shape[1] * LINK_FRACTION))
+        regions = [{"x1": region["x1"] * BLOCK, "y1": region["y1"] * BLOCK, "x2": region["x2"] * BLOCK,
+                    "y2": region["y2"] * BLOCK, "area": region["area"] * BLOCK * BLOCK,
+                    "mean_error": region["mean_error"]}
+                   for region in ela.find_regions(flagged, block_map, min_area=min_blocks, link_distance=link_blocks)]
+
+    error_map = np.zeros(luma.shape[:2], np.uint8)
+    rows, columns = block_map.shape
+    error_map[:rows * BLOCK, :columns * BLOCK] = np.repeat(np.repeat(block_map, BLOCK, axis=0), BLOCK, axis=1)
+    result = ela._summarize(error_map, flagged, regions)
+    result.update(
+        quality=estimate_quality(table),
+        quantization_table=table.tolist(),
+        frequencies=found,
+        double_compressed=any(entry["first_step"] for entry in found),
+    )
+    return result
@@ -0,0 +1,241 @@
+import gc
+import os
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+
+# Registry of Hugging Face pipelines, loaded on first use and kept warm for the process.
+# Workers share one copy through preload() before forking, or serve() + IDP_INFERENCE_ADDRESS.
+# IDP_CLASSIFIER_BACKEND: fp32 (the checkpoint), int8 (dynamic quantization of the Linear
+# layers) or onnx (exported once under IDP_ONNX_DIR; needs onnx and onnxruntime).
+
+DEFAULT_CLASSIFIER_MODEL = os.environ.get("IDP_CLASSIFIER_MODEL", "facebook/bart-large-mnli")
+INFERENCE_ADDRESS = os.environ.get("IDP_INFERENCE_ADDRESS")  # e.g. "127.0.0.1:6001"
+INFERENCE_AUTHKEY = os.environ.get("IDP_INFERENCE_AUTHKEY", "idp-inference").encode()
+CLASSIFIER_BACKEND = os.environ.get("IDP_CLASSIFIER_BACKEND", "fp32")
+CLASSIFIER_THREADS = int(os.environ.get("IDP_CLASSIFIER_THREADS", 0))  # 0: torch's default
+CLASSIFIER_MAX_LENGTH = int(os.environ.get("IDP_CLASSIFIER_MAX_LENGTH", 32))  # Tokens: a word + "This example is tampered."
+ONNX_DIR = os.environ.get("IDP_ONNX_DIR", "cache/onnx")
+BACKENDS = ("fp32", "int8", "onnx")
+
+_pipelines = {}
+_remote_pipelines = {}
+_lock = threading.Lock()
+_inference_lock = threading.Lock()  # Pipelines are not thread-safe; the server runs one call at a time
+
+
+def get_pipeline(task, model, backend="fp32", **kwargs):
+    """Return the pipeline for (task, model, backend), loading it on first use."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of: {', '.join(BACKENDS)}")
+    key = (task, model, backend, tuple(sorted(kwargs.items())))
+    loaded = _pipelines.get(key)
+    if loaded is not None:
+        return loaded
+
+    with _lock:
+        # Another thread may have finished loading while we waited
+        loaded = _pipelines.get(key)
+        if loaded is None:
+            from transformers import pipeline  # Imported lazily: costs seconds on its own
+
+            if backend == "onnx":
+                _onnxruntime()  # Fail before loading any weights
+            if CLASSIFIER_THREADS:
+                import torch
+
+                torch.set_num_threads(CLASSIFIER_THREADS)
+            loaded = pipeline(task, model=model, **kwargs)
+            if backend != "fp32":  # fp32 keeps the checkpoint's window and its exact outputs
+                loaded.tokenizer.model_max_length = min(loaded.tokenizer.model_max_length, CLASSIFIER_MAX_LENGTH)
+            if backend == "int8":
+                loaded.model = quantize_int8(loaded.model)
+            elif backend == "onnx":
+                loaded.model = OnnxClassifier.export(loaded.model, loaded.tokenizer, model)
+            _pipelines[key] = loaded
+    return loaded
+
+
+def quantize_int8(model):
+    """The model with every Linear layer dynamically quantized to int8 (weights int8, activations per batch)."""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _onnxruntime():
+    try:
+        import onnx  # noqa: F401  torch.onnx.export writes the graph through it
+        import onnxruntime
+    except ImportError:
+        raise ImportError("The onnx backend needs the onnx and onnxruntime packages "
+                          "(pip install onnx onnxruntime), or use IDP_CLASSIFIER_BACKEND=int8") from None
+    return onnxruntime
+
+
+class OnnxClassifier:
+    """
+    A sequence classification model run by onnxruntime, standing in for the
+    PyTorch model inside a transformers pipeline (same call, same "logits").
+    """
+
+    def __init__(self, path, config):
+        import torch
+
+        onnxruntime = _onnxruntime()
+        options = onnxruntime.SessionOptions()
+        if CLASSIFIER_THREADS:
+            options.intra_op_num_threads = CLASSIFIER_THREADS
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.config = config
+        self.device = torch.device("cpu")
+        self.path = path
+
+    @classmethod
+    def export(cls, model, tokenizer, name):
+        """Export `model` to ONNX_DIR once (reused on later loads) and open it."""
+        import torch
+
+        path = os.path.join(ONNX_DIR, name.strip("/").replace("/", "--") + ".onnx")
+        if not os.path.exists(path):
+            os.makedirs(ONNX_DIR, exist_ok=True)
+            sample = tokenizer(["word"], ["This example is original."], return_tensors="pt")
+
+            class Logits(torch.nn.Module):
+                def __init__(self, model):
+                    super().__init__()
+                    self.model = model
+
+                def forward(self, input_ids, attention_mask):
+                    return self.model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).logits
+
+            dynamic = {0: "batch", 1: "sequence"}
+            temp = path + ".tmp"
+            torch.onnx.export(Logits(model.eval()), (sample["input_ids"], sample["attention_mask"]), temp,
+                              input_names=["input_ids", "attention_mask"], output_names=["logits"],
+                              dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "logits": {0: "batch"}},
+                              opset_version=17, dynamo=False)
+            os.replace(temp, path)
+        return cls(path, model.config)
+
+    def forward(self, input_ids, attention_mask, **unused):
+        import torch
+
+        logits, = self.session.run(["logits"], {"input_ids": input_ids.numpy(),
+                                                "attention_mask": attention_mask.numpy()})
+        return {"logits": torch.from_numpy(logits)}
+
+    __call__ = forward
+
+
+def get_classifier(model=None, backend=None):
+    """
+    Zero-shot classifier used by the tamper word detector.
+    Returns a client for the shared inference process when
+    IDP_INFERENCE_ADDRESS is set (the server picks the backend), otherwise
+    an in-process pipeline on `backend` (default IDP_CLASSIFIER_BACKEND).
+    """
+    model = model or DEFAULT_CLASSIFIER_MODEL
+    if INFERENCE_ADDRESS:
+        remote = _remote_pipelines.get(model)
+        if remote is None:
+            remote = _remote_pipelines.setdefault(
+                model, RemotePipeline("zero-shot-classification", model, INFERENCE_ADDRESS))
+        return remote
+    return get_pipeline("zero-shot-classification", model, backend=backend or CLASSIFIER_BACKEND)
+
+
+def preload(models=None):
+    """
+    Load classifiers now, before worker processes are forked, so they share
+    the weights copy-on-write. gc.freeze() moves everything loaded so far out
+    of the collector's reach; otherwise the first collection in each child
+    touches every object header and un-shares the pages.
+    """
+    for model in models or [DEFAULT_CLASSIFIER_MODEL]:
+        get_pipeline("zero-shot-classification", model, backend=CLASSIFIER_BACKEND)
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+
+def loaded_models():
+    """(task, model, backend) triples currently held warm in this process."""
+    return [(task, model, backend) for task, model, backend, _ in _pipelines]
+
+
+def clear():
+    """Drop every loaded pipeline (mainly for tests and benchmarks)."""
+    with _lock:
+        _pipelines.clear()
+
+
+def _parse_address(address):
+    if isinstance(address, tuple):
+        return address
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address  # Unix socket path
+
+
+class RemotePipeline:
+    """Callable with the pipeline signature that forwards to serve()."""
+
+    def __init__(self, task, model, address, authkey=INFERENCE_AUTHKEY):
+        self.task = task
+        self.model = model
+        self.address = _parse_address(address)
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or connection.closed:
+            connection = Client(self.address, authkey=self.authkey)
+            self._local.connection = connection
+        return connection
+
+    def __call__(self, inputs, **kwargs):
+        connection = self._connection()
+        try:
+            connection.send((self.task, self.model, inputs, kwargs))
+            ok, payload = connection.recv()
+        except (EOFError, OSError):
+            connection.close()
+            raise
+        if not ok:
+            raise RuntimeError(f"Inference server error: {payload}")
+        return payload
+
+
+def _handle(connection):
+    with connection:
+        while True:
+            try:
+                task, model, inputs, kwargs = connection.recv()
+            except EOFError:
+                return
+            try:
+                with _inference_lock:
+                    result = get_pipeline(task, model, backend=CLASSIFIER_BACKEND)(inputs, **kwargs)
+                connection.send((True, result))
+            except Exception as e:
+                connection.send((False, str(e)))
+
+
+def serve(address, authkey=INFERENCE_AUTHKEY, models=None):
+    """Run a local inference process holding the only copy of the weights."""
+    for model in models or [DEFAULT_CLASSIFIER_MODEL]:
+        get_pipeline("zero-shot-classification", model, backend=CLASSIFIER_BACKEND)
+
+    with Listener(_parse_address(address), authkey=authkey) as listener:
+        print(f"Inference server listening on {address} with {loaded_models()}")
+        while True:
+            connection = listener.accept()
+            threading.Thread(target=_handle, args=(connection,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    # python model_registry.py 127.0.0.1:6001 [model ...]
+    serve(sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1:6001", models=sys.argv[2:] or None)
@@ -0,0 +1,192 @@
+import hashlib
+import threading
+
+import cachetools
+import cv2
+import numpy as np
+from PIL import Image
+
+import tesseract_pool
+from document import Document
+from instrument import stage
+
+# Shared OCR layer: one image_to_data pass gives words, boxes, confidences and the text,
+# memoized by image content, preprocessing and config so analyzers share one Tesseract run.
+
+CACHE_SIZE = 128  # Number of OCR results kept
+
+
+def _to_gray(image):
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def _to_binary(image):
+    # Same threshold unilm_idp_detection.extract_text has always used
+    _, thresh = cv2.threshold(_to_gray(image), 150, 255, cv2.THRESH_BINARY)
+    return thresh
+
+
+PREPROCESSORS = {
+    None: lambda image: image,
+    "gray": _to_gray,
+    "binary": _to_binary,
+}
+
+# The same preprocessing as a Document view, memoized with the document
+DOCUMENT_VIEWS = {None: "bgr", "gray": "gray", "binary": "binary"}
+
+_cache = cachetools.LRUCache(maxsize=CACHE_SIZE)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def as_array(image):
+    """Return a NumPy array for a PIL image, an array, a Document or a path (BGR for paths and documents)."""
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, Document):
+        return image.bgr
+    if isinstance(image, Image.Image):
+        return np.asarray(image)
+    array = cv2.imread(image)
+    if array is None:
+        raise FileNotFoundError(f"Error: The image at {image} could not be loaded. Please check the path.")
+    return array
+
+
+def image_hash(image):
+    """SHA-256 of the pixel data, shape and dtype of an array."""
+    array = np.ascontiguousarray(image)
+    digest = hashlib.sha256(f"{array.shape}{array.dtype}".encode())
+    digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
+def _text_from_data(words, lines):
+    """Rebuild plain text from word data: words joined per line, blank line between paragraphs."""
+    text_lines = []
+    previous_line = previous_par = None
+    for word, (block, par, line) in zip(words, lines):
+        if (block, par, line) != previous_line:
+            if previous_par is not None and (block, par) != previous_par:
+                text_lines.append("")
+            text_lines.append(word)
+            previous_line, previous_par = (block, par, line), (block, par)
+        else:
+            text_lines[-1] += " " + word
+    return "\n".join(text_lines)
+
+
+def _run_tesseract(image, config, lang):
+    with stage("ocr.tesseract"):
+        data = tesseract_pool.image_to_data(image, lang=lang, config=config)
+
+    words, boxes, confs, lines = [], [], [], []
+    for i in range(len(data["text"])):
+        conf = float(data["conf"][i])
+        word = data["text"][i].strip()
+        if conf < 0 or not word:  # -1 marks page/block/line rows, not words
+            continue
+        words.append(word)
+        boxes.append((data["left"][i], data["top"][i], data["width"][i], data["height"][i]))
+        confs.append(conf)
+        lines.append((data["block_num"][i], data["par_num"][i], data["line_num"][i]))
+
+    return {
+        "text": _text_from_data(words, lines),
+        "words": words,
+        "boxes": boxes,
+        "confs": confs,
+        "lines": lines,
+    }
+
+
+def run_ocr(image, config="", preprocess=None, lang=None):
+    """
+    OCR an image (array, PIL image, Document or path) once and return
+    {"text", "words", "boxes" (x, y, w, h), "confs", "lines" (block, par, line)}.
+    `preprocess` is one of PREPROCESSORS ("gray", "binary" or None).
+    The result is cached and shared: treat it as read-only.
+    """
+    if isinstance(image, Document):
+        # The document already holds the pixel hash and, once computed, the preprocessed view
+        key = (image.pixel_hash, preprocess, config, lang)
+    else:
+        array = as_array(image)
+        key = (image_hash(array), preprocess, config, lang)
+
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _stats["hits"] += 1
+            return cached
+        _stats["misses"] += 1
+
+    if isinstance(image, Document):
+        prepared = image.view(DOCUMENT_VIEWS[preprocess])
+    else:
+        with stage("ocr.preprocess"):
+            prepared = PREPROCESSORS[preprocess](array)
+    result = _run_tesseract(prepared, config, lang)
+    with _lock:
+        _cache[key] = result
+    return result
+
+
+def image_to_text(image, config="", preprocess=None, lang=None):
+    """Plain text of an image, derived from the cached word data."""
+    return run_ocr(image, config=config, preprocess=preprocess, lang=lang)["text"]
+
+
+def word_boxes(image, config="", preprocess=None, lang=None, min_conf=0):
+    """(words, boxes) for words with confidence above `min_conf`."""
+    result = run_ocr(image, config=config, preprocess=preprocess, lang=lang)
+    words, boxes = [], []
+    for word, box, conf in zip(result["words"], result["boxes"], result["confs"]):
+        if conf > min_conf:
+            words.append(word)
+            boxes.append(box)
+    return words, boxes
+
+
+def ocr_crops(crops, config="--psm 6", gap=20, lang=None):
+    """
+    OCR a batch of crops with one Tesseract call: the crops are stacked on a
+    white canvas `gap` pixels apart and each recognised word is assigned
+    back to its crop by its vertical centre. Returns one text per crop.
+    """
+    if not crops:
+        return []
+    width = max(crop.shape[1] for crop in crops) + 2 * gap
+    height = sum(crop.shape[0] + gap for crop in crops) + gap
+    canvas = np.full((height, width), 255, np.uint8)
+
+    offsets = []
+    y = gap
+    for crop in crops:
+        gray = _to_gray(crop)
+        canvas[y:y + gray.shape[0], gap:gap + gray.shape[1]] = gray
+        offsets.append((y, y + gray.shape[0]))
+        y += gray.shape[0] + gap
+
+    result = run_ocr(canvas, config=config, lang=lang)
+    texts = [[] for _ in crops]
+    for word, (wx, wy, ww, wh) in zip(result["words"], result["boxes"]):
+        center = wy + wh / 2
+        for index, (top, bottom) in enumerate(offsets):
+            if top <= center < bottom:
+                texts[index].append(word)
+                break
+    return [" ".join(words) for words in texts]
+
+
+def cache_info():
+    """Hit/miss counters and current size of the OCR cache."""
+    with _lock:
+        return dict(_stats, size=len(_cache), maxsize=_cache.maxsize)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        _stats.update(hits=0, misses=0)
@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import suppress
+
+import cachetools
+
+# In-memory store for annotated result images, served from /outputs/<id>: bounded by total
+# bytes with a TTL, and written to an optional persist folder by a background thread.
+
+MAX_BYTES = int(float(os.environ.get("IDP_OUTPUT_CACHE_MB", 256)) * 1024 * 1024)
+TTL_SECONDS = float(os.environ.get("IDP_OUTPUT_TTL", 15 * 60))
+PERSIST_FOLDER = os.environ.get("IDP_PERSIST_OUTPUTS")  # Unset: keep results in memory only
+RETENTION_SECONDS = float(os.environ.get("IDP_OUTPUT_RETENTION", 7 * 24 * 3600))
+RETENTION_FILES = int(os.environ.get("IDP_OUTPUT_MAX_FILES", 10000))
+
+MEDIA_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".txt": "text/plain; charset=utf-8"}
+
+
+class PersistenceWriter:
+    """Background thread that writes outputs to a folder and applies the retention policy."""
+
+    def __init__(self, folder, retention_seconds=RETENTION_SECONDS, max_files=RETENTION_FILES):
+        self.folder = folder
+        self.retention_seconds = retention_seconds
+        self.max_files = max_files
+        self._queue = queue.Queue(maxsize=1000)
+        os.makedirs(folder, exist_ok=True)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, filename, data):
+        try:
+            self._queue.put_nowait((filename, data))
+        except queue.Full:
+            pass  # Persistence is best effort; never block a request on disk
+
+    def _run(self):
+        written = 0
+        while True:
+            filename, data = self._queue.get()
+            path = os.path.join(self.folder, filename)
+            try:
+                with open(path + ".tmp", "wb") as output:
+                    output.write(data)
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print(f"Could not persist {filename}: {e}")
+            written += 1
+            if written % 100 == 1:
+                try:
+                    self.prune()
+                except OSError as e:  # The folder itself went away: keep writing, prune next time
+                    print(f"Could not prune {self.folder}: {e}")
+
+    def prune(self):
+        """Delete files older than the retention period, then the oldest beyond max_files."""
+        now = time.time()
+        entries = []
+        # Another request or process may delete a file between the listing and each call
+        for entry in os.scandir(self.folder):
+            with suppress(FileNotFoundError):
+                if not entry.is_file():
+                    continue
+                modified = entry.stat().st_mtime
+                if now - modified > self.retention_seconds:
+                    os.remove(entry.path)
+                else:
+                    entries.append((modified, entry.path))
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_files, 0)]:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+    def read(self, filename):
+        path = os.path.join(self.folder, os.path.basename(filename))
+        try:
+            with open(path, "rb") as stored:
+                return stored.read()
+        except FileNotFoundError:  # Never written, or pruned
+            return None
+
+
+class OutputCache:
+    """Size-bounded, TTL-evicted cache of encoded result images."""
+
+    def __init__(self, max_bytes=MAX_BYTES, ttl_seconds=TTL_SECONDS, persist_folder=PERSIST_FOLDER):
+        self._cache = cachetools.TTLCache(maxsize=max_bytes, ttl=ttl_seconds, getsizeof=len)
+        self._lock = threading.Lock()
+        self.writer = PersistenceWriter(persist_folder) if persist_folder else None
+
+    def put(self, data, extension=".png"):
+        """Store encoded image bytes and return the filename to fetch them by."""
+        filename = f"{uuid.uuid4().hex}{extension}"
+        if len(data) <= self._cache.maxsize:
+            with self._lock:
+                self._cache[filename] = data
+        if self.writer is not None:
+            self.writer.submit(filename, data)
+        return filename
+
+    def get(self, filename):
+        """(bytes, media type) for a stored output, or None once it has expired."""
+        filename = os.path.basename(filename)
+        with self._lock:
+            data = self._cache.get(filename)
+        if data is None and self.writer is not None:
+            data = self.writer.read(filename)
+        if data is None:
+            return None
+        return data, MEDIA_TYPES.get(os.path.splitext(filename)[1], "application/octet-stream")
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "bytes": self._cache.currsize, "max_bytes": self._cache.maxsize}
+
+
+outputs = OutputCache()
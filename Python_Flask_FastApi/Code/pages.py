@@ -0,0 +1,218 @@
+"""
+Stream the pages of a PDF, multi-page TIFF or image through the detectors.
+
+    python pages.py statement.pdf --analyzers tables,ela --dpi 150
+"""
+import argparse
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence
+
+from document import Document
+
+# The dark-background detector lives next to the sample images
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "images"))
+
+DEFAULT_DPI = 150
+DEFAULT_PREFETCH = 2  # Pages rasterized ahead of the detectors
+DEFAULT_WORKERS = 2  # Pages analyzed concurrently (OpenCV/Tesseract release the GIL)
+
+
+def _read(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    with open(source, "rb") as file:
+        return file.read()
+
+
+def document_kind(data):
+    """'pdf', 'tiff' or 'image', from the file's magic bytes."""
+    if data[:5] == b"%PDF-":
+        return "pdf"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return "image"
+
+
+def _pdf_pages(data, dpi):
+    import pypdfium2 as pdfium  # Only needed for PDFs
+
+    document = pdfium.PdfDocument(data)
+    try:
+        for index in range(len(document)):
+            page = document[index]
+            try:
+                bitmap = page.render(scale=dpi / 72)
+                image = cv2.cvtColor(np.asarray(bitmap.to_pil().convert("RGB")), cv2.COLOR_RGB2BGR)
+                bitmap.close()
+            finally:
+                page.close()
+            yield index + 1, image
+    finally:
+        document.close()
+
+
+def _tiff_pages(data):
+    with Image.open(io.BytesIO(data)) as tiff:
+        for index, frame in enumerate(ImageSequence.Iterator(tiff)):
+            yield index + 1, cv2.cvtColor(np.asarray(frame.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+
+def iter_pages(source, dpi=DEFAULT_DPI):
+    """Yield (page_number, BGR array) for a path or bytes, one page at a time."""
+    data = _read(source)
+    kind = document_kind(data)
+    if kind == "pdf":
+        yield from _pdf_pages(data, dpi)
+    elif kind == "tiff":
+        yield from _tiff_pages(data)
+    else:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image")
+        yield 1, image
+
+
+# Page analyzers: each takes a page Document (decoded once, views shared
+# between analyzers) and returns a JSON-ready dict.
+
+def tables_page(image):
+    import bank_statement
+
+    return {"detected_tables": [{"bbox": box} for box in bank_statement.detect_table_boxes(image)]}
+
+
+def structure_page(image):
+    import table_structure
+
+    return {"tables": table_structure.extract_tables(image)}
+
+
+def tamper_page(image):
+    import tempered
+
+    regions = tempered.detect_tampered_regions(image)
+    return {"tampered": bool(regions), "regions": regions}
+
+
+def ela_page(image):
+    import ela
+
+    result = ela.analyze_source(image)
+    return {"tampered_box": result["tampered_box"], "tampered_regions": result["tampered_regions"]}
+
+
+PAGE_ANALYZERS = {
+    "tables": tables_page,
+    "structure": structure_page,
+    "tamper": tamper_page,
+    "ela": ela_page,
+}
+
+
+def analyze_page(page_number, image, analyzers):
+    """The result record of one page: per-analyzer results, errors and timings."""
+    record = {"page": page_number, "size": [int(image.shape[1]), int(image.shape[0])],
+              "results": {}, "errors": {}, "timings": {}}
+    page = Document(image=image)
+    for name in analyzers:
+        start = time.perf_counter()
+        try:
+            record["results"][name] = PAGE_ANALYZERS[name](page)
+        except Exception as e:
+            record["errors"][name] = f"{type(e).__name__}: {e}"
+        record["timings"][name] = round(time.perf_counter() - start, 4)
+    record["memory"] = page.memory_report()
+    return record
+
+
+def _put(buffer, item, stop):
+    """Put into the bounded queue, giving up once the consumer has gone away."""
+    while not stop.is_set():
+        try:
+            buffer.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(pages, buffer, stop):
+    """Rasterize into a bounded queue; blocks whenever the detectors fall behind."""
+    try:
+        for page in pages:
+            if not _put(buffer, page, stop):
+                return
+    except Exception as e:
+        _put(buffer, e, stop)
+        return
+    _put(buffer, None, stop)
+
+
+def analyze_pages(source, analyzers=("tables",), dpi=DEFAULT_DPI, workers=DEFAULT_WORKERS,
+                  prefetch=DEFAULT_PREFETCH):
+    """
+    Run page analyzers over every page of a document and yield one result
+    dict per page as it completes (not necessarily in page order).
+    """
+    unknown = [name for name in analyzers if name not in PAGE_ANALYZERS]
+    if unknown:
+        raise ValueError(f"Unknown page analyzers: {', '.join(unknown)}")
+
+    buffer = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce, args=(iter_pages(source, dpi), buffer, stop), daemon=True)
+    producer.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+            exhausted = False
+            while in_flight or not exhausted:
+                # Only take a new page when a worker is free
+                while not exhausted and len(in_flight) < workers:
+                    item = buffer.get()
+                    if item is None:
+                        exhausted = True
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        in_flight.add(pool.submit(analyze_page, *item, analyzers))
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+    finally:
+        stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("document", help="PDF, multi-page TIFF or image")
+    parser.add_argument("--analyzers", default="tables", help=f"Comma-separated subset of: {', '.join(PAGE_ANALYZERS)}")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    analyzers = [name.strip() for name in args.analyzers.split(",") if name.strip()]
+    start = time.perf_counter()
+    count = 0
+    for record in analyze_pages(args.document, analyzers, dpi=args.dpi, workers=args.workers):
+        print(json.dumps(record), flush=True)
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f"{count} pages in {elapsed:.2f}s ({count / elapsed:.2f} pages/sec)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
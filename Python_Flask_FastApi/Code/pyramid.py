@@ -0,0 +1,110 @@
+import os
+
+import cv2
+import numpy as np
+
+from document import Document
+
+# Coarse-to-fine helpers shared by the detectors: mask a copy downscaled by `scale`, then
+# re-mask only the padded candidate regions at full resolution. `scale` is snapped to a power
+# of two; 1.0 disables the fast path, smaller values can miss features under ~1/scale pixels.
+
+DEFAULT_SCALE = float(os.environ.get("IDP_PYRAMID_SCALE", 1.0))
+DEFAULT_MARGIN = 16  # Full-resolution pixels added around each candidate before refinement
+
+
+def snap_scale(scale):
+    """Nearest power-of-two fraction (1, 1/2, 1/4, ...) to `scale`."""
+    return 2.0 ** -max(int(round(-np.log2(scale))), 0)
+
+
+def downscale(image, scale):
+    """Area-averaged copy of an image at a power-of-two `scale`, halving one octave at a time."""
+    if isinstance(image, Document):
+        return image.downscaled(scale)  # Memoized per octave
+    while scale < 1:
+        image = cv2.resize(image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        scale *= 2
+    return image
+
+
+def to_full(boxes, scale, shape, margin=DEFAULT_MARGIN):
+    """Map coarse (x, y, w, h) boxes to padded, clamped full-resolution boxes."""
+    height, width = shape[:2]
+    mapped = []
+    for x, y, w, h in boxes:
+        x1 = max(int(x / scale) - margin, 0)
+        y1 = max(int(y / scale) - margin, 0)
+        x2 = min(int(np.ceil((x + w) / scale)) + margin, width)
+        y2 = min(int(np.ceil((y + h) / scale)) + margin, height)
+        mapped.append((x1, y1, x2 - x1, y2 - y1))
+    return mapped
+
+
+def merge_boxes(boxes, gap=0):
+    """Merge (x, y, w, h) boxes that overlap or lie within `gap` pixels of each other."""
+    merged = [list(box) for box in boxes]
+    changed = True
+    while changed:
+        changed = False
+        merged.sort(key=lambda b: b[0])
+        result = []
+        for box in merged:
+            for other in result:
+                if (box[0] <= other[0] + other[2] + gap and other[0] <= box[0] + box[2] + gap and
+                        box[1] <= other[1] + other[3] + gap and other[1] <= box[1] + box[3] + gap):
+                    x1, y1 = min(box[0], other[0]), min(box[1], other[1])
+                    x2 = max(box[0] + box[2], other[0] + other[2])
+                    y2 = max(box[1] + box[3], other[1] + other[3])
+                    other[:] = [x1, y1, x2 - x1, y2 - y1]
+                    changed = True
+                    break
+            else:
+                result.append(box)
+        merged = result
+    return [tuple(box) for box in merged]
+
+
+def _cut_edges(array, top, bottom, left, right):
+    edges = [(top, array[0]), (bottom, array[-1]), (left, array[:, 0]), (right, array[:, -1])]
+    return [edge for cut, edge in edges if cut]
+
+
+def _drop_clipped(mask, *cuts):
+    """
+    Clear blobs that touch a cut edge of a region of interest: they continue
+    outside it (usually page background), so the crop only sees a fragment.
+    `cuts` says which of the top/bottom/left/right edges are cut.
+    """
+    if not any(edge.any() for edge in _cut_edges(mask, *cuts)):
+        return mask
+    _, labels = cv2.connectedComponents(mask, connectivity=8)
+    clipped = np.unique(np.concatenate(_cut_edges(labels, *cuts)))
+    mask[np.isin(labels, clipped[clipped > 0])] = 0
+    return mask
+
+
+def refine_mask(image, rois, mask_fn):
+    """Full-size mask that is `mask_fn` of the image inside `rois` and zero elsewhere."""
+    height, width = image.shape[:2]
+    full = np.zeros((height, width), np.uint8)
+    for x, y, w, h in rois:
+        mask = mask_fn(image[y:y + h, x:x + w])
+        full[y:y + h, x:x + w] = _drop_clipped(mask, y > 0, y + h < height, x > 0, x + w < width)
+    return full
+
+
+def coarse_to_fine_mask(image, mask_fn, candidates_fn, scale=DEFAULT_SCALE, margin=DEFAULT_MARGIN):
+    """
+    `mask_fn(image)` computed coarse-to-fine. `candidates_fn(coarse_mask)`
+    returns the coarse (x, y, w, h) boxes worth refining. With scale >= 1
+    this is just `mask_fn(image)`. `image` may be a Document; the crops
+    refined at full resolution are cut from its BGR array.
+    """
+    scale = snap_scale(scale)
+    if scale >= 1:
+        return mask_fn(image)
+    coarse = mask_fn(downscale(image, scale))
+    array = image.bgr if isinstance(image, Document) else image
+    rois = merge_boxes(to_full(candidates_fn(coarse), scale, array.shape, margin))
+    return refine_mask(array, rois, mask_fn)
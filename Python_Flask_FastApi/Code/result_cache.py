@@ -0,0 +1,207 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import cachetools
+
+# Content-addressed cache of analysis results, keyed by the upload's SHA-256 plus the
+# analyzer, its version and parameters: an LRU in memory and SQLite on disk shared by
+# the host's processes. Bump VERSIONS when an analyzer's output changes. Results
+# that hit a transient failure are not stored (see failed).
+
+MEMORY_BYTES = int(float(os.environ.get("IDP_RESULT_CACHE_MB", 64)) * 1024 * 1024)
+DB_PATH = os.environ.get("IDP_RESULT_CACHE_DB", "cache/results.sqlite3")  # Empty: memory only
+DISK_BYTES = int(float(os.environ.get("IDP_RESULT_CACHE_DISK_MB", 1024)) * 1024 * 1024)  # Oldest-used evicted first
+EVICT_EVERY = 50  # Disk writes between size checks
+
+# Analyzer versions; part of every key. Rows of older versions are deleted when the disk tier opens
+VERSIONS = {
+    "barcode": 2,
+    "tables": 1,
+    "table-structure": 1,
+    "ela": 1,
+    "jpeg-dq": 1,
+    "tamper": 1,
+    "tampered-words": 1,
+    "triage": 2,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    analyzer TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+def _encode(value):
+    # bytes (e.g. an annotated PNG) survive the JSON round trip as base64
+    def default(obj):
+        if isinstance(obj, (bytes, bytearray)):
+            return {"__bytes__": base64.b64encode(obj).decode("ascii")}
+        return str(obj)
+
+    return json.dumps(value, default=default, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(data):
+    def object_hook(obj):
+        if len(obj) == 1 and "__bytes__" in obj:
+            return base64.b64decode(obj["__bytes__"])
+        return obj
+
+    return json.loads(data, object_hook=object_hook)
+
+
+def make_key(data, analyzer, params=None):
+    """Cache key for `data` analyzed by `analyzer` at its current version with `params`."""
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps([analyzer, VERSIONS.get(analyzer, 0), params or {}], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def failed(value):
+    """
+    True for a result that hit a transient failure: a non-empty "errors" (checks
+    or pages that raised) or an "error" in one of its dict values (a failed OCR
+    "verification"). A top-level "error" is the analyzer's answer for these
+    bytes, such as "No barcode detected", and is cached like any other result.
+    """
+    if not isinstance(value, dict):
+        return False
+    return bool(value.get("errors")) or any(isinstance(item, dict) and "error" in item for item in value.values())
+
+
+class ResultCache:
+    """Two-tier (memory LRU + SQLite) cache of JSON-ready analysis results."""
+
+    def __init__(self, db_path=DB_PATH, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES):
+        self.db_path = db_path or None
+        self.disk_bytes = disk_bytes
+        self._memory = cachetools.LRUCache(maxsize=memory_bytes, getsizeof=len)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._ready = False
+
+    def _setup(self, db):
+        # Created on first use, so importing a module that uses the cache has no side effects
+        db.executescript(SCHEMA)
+        for analyzer, version in VERSIONS.items():
+            db.execute("DELETE FROM results WHERE analyzer = ? AND version != ?", (analyzer, version))
+        self._ready = True
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        if not self._ready:
+            self._setup(db)
+        return db
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        """The cached result for a key, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+        if data is not None:
+            self._count("memory_hits")
+            return _decode(data)
+
+        if self.db_path:
+            with closing(self._connect()) as db:
+                row = db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+            if row is not None:
+                data = bytes(row[0])
+                self._remember(key, data)
+                self._count("disk_hits")
+                return _decode(data)
+
+        self._count("misses")
+        return None
+
+    def _remember(self, key, data):
+        if len(data) <= self._memory.maxsize:
+            with self._lock:
+                self._memory[key] = data
+
+    def put(self, key, analyzer, value):
+        if failed(value):
+            return
+        data = _encode(value)
+        self._remember(key, data)
+        self._count("stores")
+        if not self.db_path:
+            return
+        with closing(self._connect()) as db:
+            db.execute("INSERT OR REPLACE INTO results (key, analyzer, version, size, value, accessed) "
+                       "VALUES (?, ?, ?, ?, ?, ?)",
+                       (key, analyzer, VERSIONS.get(analyzer, 0), len(data), data, time.time()))
+            with self._lock:
+                self._writes += 1
+                check = self._writes % EVICT_EVERY == 0
+            if check:
+                self._evict(db)
+
+    def _evict(self, db):
+        """Delete least recently used rows until the disk tier fits in disk_bytes."""
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > self.disk_bytes:
+            rows = db.execute("SELECT key, size FROM results ORDER BY accessed LIMIT 100").fetchall()
+            if not rows:
+                break
+            db.executemany("DELETE FROM results WHERE key = ?", [(key,) for key, _ in rows])
+            total -= sum(size for _, size in rows)
+            self._count("evictions", len(rows))
+
+    def cached(self, analyzer, data, compute, params=None):
+        """
+        Result of `compute()` for upload `data`, from the cache when the same
+        bytes were analyzed before. Returns (result, hit). Exceptions are not cached.
+        """
+        key = make_key(data, analyzer, params)
+        result = self.get(key)
+        if result is not None:
+            return result, True
+        result = compute()
+        self.put(key, analyzer, result)
+        return result, False
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            with closing(self._connect()) as db:
+                db.execute("DELETE FROM results")
+
+    def stats(self):
+        """Hit/miss counters plus tier sizes."""
+        with self._lock:
+            stats = dict(self._stats, memory_entries=len(self._memory), memory_bytes=self._memory.currsize)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else None
+        if self.db_path:
+            with closing(self._connect()) as db:
+                entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            stats.update(disk_entries=entries, disk_bytes=size)
+        return stats
+
+
+results = ResultCache()
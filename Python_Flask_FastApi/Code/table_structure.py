@@ -0,0 +1,194 @@
+import re
+
+import cv2
+import numpy as np
+
+import document
+import ocr
+from instrument import stage
+
+# Table structure extraction for bank statements: ruling lines -> grid -> cells -> amounts.
+# Tables ruled only horizontally get their columns from whitespace gaps in the text;
+# inked cells are OCR'd in batches (ocr.ocr_crops) and amount columns parsed.
+
+MIN_TABLE_SIZE = 100  # Same limit as bank_statement: smaller line blocks are not tables
+LINE_FRACTION = 1 / 30.0  # Ruling kernels are this fraction of the page side long
+MIN_LINE = 20  # ... but never shorter than this many pixels
+ROW_GAP_FRACTION = 0.06  # Horizontal rules closer than this fraction of the page side belong to one table
+LINE_COVERAGE = 0.5  # A row/column line must span this fraction of its table
+CELL_INSET = 2  # Pixels trimmed inside each cell beyond the ruling line itself
+MIN_INK = 12  # Cells with fewer ink pixels than this are empty
+MIN_GAP_FRACTION = 0.02  # Whitespace gaps wider than this fraction of the table split columns
+AMOUNT_COLUMN_RATIO = 0.6  # Share of a column's filled cells that must be amounts
+CELL_OCR_CONFIG = "--psm 6"
+CELL_BATCH_SIZE = 64  # Cells OCR'd together in one Tesseract call
+CELL_GAP = 16  # White rows between stacked cells in a batch
+
+_AMOUNT = re.compile(
+    r"^(?P<open>\()?\s*(?P<sign>[-+])?\s*(?:rs\.?|inr|₹|\$)?\s*(?P<sign2>[-+])?"
+    r"(?P<number>\d{1,3}(?:,\d{2,3})+|\d+)(?P<fraction>\.\d{1,2})?\s*(?P<close>\))?\s*(?P<side>cr|dr)?\.?$",
+    re.IGNORECASE)
+
+
+def parse_amount(text):
+    """A statement amount as a float (debits negative), or None if `text` is not an amount."""
+    match = _AMOUNT.match(text.strip().replace(" ", "")) if text else None
+    if match is None or bool(match["open"]) != bool(match["close"]):
+        return None
+    value = float(match["number"].replace(",", "") + (match["fraction"] or ""))
+    negative = match["open"] or "-" in (match["sign"] or "", match["sign2"] or "")
+    if (match["side"] or "").lower() == "dr":
+        negative = True
+    return -value if negative else value
+
+
+def binarize(gray):
+    """Ink as 255 on 0, robust to uneven scan lighting."""
+    block = max(15, min(gray.shape[:2]) // 100 | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, block, 10)
+
+
+def ruling_lines(binary):
+    """(horizontal, vertical) masks of the ruling lines in a binarized page."""
+    height, width = binary.shape[:2]
+    length = max(int(min(height, width) * LINE_FRACTION), MIN_LINE)
+    horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (length, 1)))
+    vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, length)))
+    return horizontal, vertical
+
+
+def _line_positions(coverage, threshold):
+    """Centres and half-widths of the runs where `coverage` reaches `threshold`."""
+    on = np.concatenate([[False], coverage >= threshold, [False]])
+    changes = np.flatnonzero(on[1:] != on[:-1])
+    return [((start + end - 1) // 2, (end - start + 1) // 2) for start, end in zip(changes[::2], changes[1::2])]
+
+
+def _gap_columns(ink, min_gap, min_width=3):
+    """
+    Column separators at the centres of whitespace gaps at least `min_gap`
+    wide between runs of text; runs narrower than `min_width` (specks, the
+    ends of erased rules) do not count as text.
+    """
+    filled = np.concatenate([[False], ink.any(axis=0), [False]])
+    changes = np.flatnonzero(filled[1:] != filled[:-1])
+    runs = [(start, end) for start, end in zip(changes[::2], changes[1::2]) if end - start >= min_width]
+    return [((left_end + right_start) // 2, 0) for (_, left_end), (right_start, _) in zip(runs, runs[1:])
+            if right_start - left_end >= min_gap]
+
+
+def table_grids(binary, min_size=MIN_TABLE_SIZE):
+    """
+    Tables in a binarized page as dicts with "bbox" (x, y, w, h) and
+    "row_edges" / "column_edges": page coordinates of the lines between rows
+    and columns, outer edges included.
+    """
+    horizontal, vertical = ruling_lines(binary)
+    rulings = cv2.dilate(cv2.bitwise_or(horizontal, vertical), np.ones((3, 3), np.uint8))
+    # Bridge the gaps between stacked rules, so tables without vertical rules are still one block
+    gap = max(int(min(binary.shape[:2]) * ROW_GAP_FRACTION), MIN_LINE)
+    rulings = cv2.morphologyEx(rulings, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (1, gap)))
+    contours, _ = cv2.findContours(rulings, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    tables = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w <= min_size or h <= min_size:
+            continue
+        rows = _line_positions(np.count_nonzero(horizontal[y:y + h, x:x + w], axis=1), LINE_COVERAGE * w)
+        if len(rows) < 2:
+            continue  # A box or a lone rule, not a table
+        columns = _line_positions(np.count_nonzero(vertical[y:y + h, x:x + w], axis=0), LINE_COVERAGE * h)
+        if len(columns) < 3:
+            # Ruled only horizontally (or just boxed): split on whitespace between the text columns
+            top, bottom = rows[0][0] + rows[0][1] + 1, rows[-1][0] - rows[-1][1]
+            ink = cv2.subtract(binary[y + top:y + bottom, x:x + w], cv2.bitwise_or(
+                horizontal[y + top:y + bottom, x:x + w], vertical[y + top:y + bottom, x:x + w]))
+            inner = _gap_columns(ink, max(MIN_LINE, int(MIN_GAP_FRACTION * w)))
+            columns = [(0, 0)] + inner + [(w - 1, 0)]
+        tables.append({
+            "bbox": (x, y, w, h),
+            "row_edges": [y + int(center) for center, _ in rows],
+            "column_edges": [x + int(center) for center, _ in columns],
+            "line_widths": (max(half for _, half in rows), max(half for _, half in columns)),
+        })
+    tables.sort(key=lambda table: (table["bbox"][1], table["bbox"][0]))
+    return tables
+
+
+def cell_boxes(table):
+    """(row, column, (x, y, w, h)) for every cell of a grid, inside its ruling lines."""
+    row_edges, column_edges = table["row_edges"], table["column_edges"]
+    row_pad, column_pad = (half + CELL_INSET for half in table["line_widths"])
+    boxes = []
+    for row, (top, bottom) in enumerate(zip(row_edges, row_edges[1:])):
+        for column, (left, right) in enumerate(zip(column_edges, column_edges[1:])):
+            x1, y1, x2, y2 = left + column_pad, top + row_pad, right - column_pad, bottom - row_pad
+            if x2 > x1 and y2 > y1:
+                boxes.append((row, column, (x1, y1, x2 - x1, y2 - y1)))
+    return boxes
+
+
+def _amount_columns(cells):
+    columns = []
+    for column in range(len(cells[0]) if cells else 0):
+        filled = [row[column] for row in cells if row[column]]
+        parsed = [text for text in filled if parse_amount(text) is not None]
+        if filled and len(parsed) >= AMOUNT_COLUMN_RATIO * len(filled):
+            columns.append(column)
+    return columns
+
+
+def read_cells(image, binary, table, batch_size=CELL_BATCH_SIZE):
+    """OCR text of every cell of one table as a rows x columns list; empty cells are ""."""
+    rows, columns = len(table["row_edges"]) - 1, len(table["column_edges"]) - 1
+    cells = [[""] * columns for _ in range(rows)]
+    inked = [(row, column, box) for row, column, box in cell_boxes(table)
+             if np.count_nonzero(binary[box[1]:box[1] + box[3], box[0]:box[0] + box[2]]) >= MIN_INK]
+    for start in range(0, len(inked), batch_size):
+        batch = inked[start:start + batch_size]
+        texts = ocr.ocr_crops([image[y:y + h, x:x + w] for _, _, (x, y, w, h) in batch],
+                              config=CELL_OCR_CONFIG, gap=CELL_GAP)
+        for (row, column, _), text in zip(batch, texts):
+            cells[row][column] = text
+    return cells
+
+
+def extract_tables(image, read_text=True, batch_size=CELL_BATCH_SIZE):
+    """
+    Structured tables of one BGR page (or Document), top to bottom. Each table has
+    "bbox", "row_edges", "column_edges", "n_rows", "n_columns" and, with
+    read_text, "cells" (rows x columns of text), "header" (the first row
+    when it holds no amounts, else None), "amount_columns" and "amounts"
+    (rows x columns, a float in amount columns and None elsewhere).
+    """
+    with stage("structure.lines"):
+        gray = document.view(image, "gray")
+        binary = binarize(gray)
+        grids = table_grids(binary)
+
+    tables = []
+    for grid in grids:
+        table = {
+            "bbox": [int(v) for v in grid["bbox"]],
+            "row_edges": grid["row_edges"],
+            "column_edges": grid["column_edges"],
+            "n_rows": len(grid["row_edges"]) - 1,
+            "n_columns": len(grid["column_edges"]) - 1,
+        }
+        if read_text:
+            with stage("structure.ocr"):
+                cells = read_cells(gray, binary, grid, batch_size=batch_size)
+            amount_columns = _amount_columns(cells[1:] if len(cells) > 1 else cells)
+            header = None
+            if cells and amount_columns and all(parse_amount(cells[0][column]) is None for column in amount_columns):
+                header = cells[0]
+            table.update(
+                cells=cells,
+                header=header,
+                amount_columns=amount_columns,
+                amounts=[[parse_amount(text) if column in amount_columns else None
+                          for column, text in enumerate(row)] for row in cells],
+            )
+        tables.append(table)
+    return tables
@@ -0,0 +1,259 @@
+import os
+import shlex
+import threading
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+# Long-lived Tesseract engines (tesserocr) behind pytesseract-shaped calls: no process,
+# temporary file or language load per call. Falls back to pytesseract without tesserocr
+# (pip install tesserocr) or for configs the pool cannot set; see OCR_BACKEND.
+
+OCR_BACKEND = os.environ.get("IDP_OCR_BACKEND", "auto")  # auto | pool | subprocess
+POOL_SIZE = int(os.environ.get("IDP_OCR_WORKERS", 0)) or os.cpu_count() or 1
+BACKENDS = ("auto", "pool", "subprocess")
+DEFAULT_LANG = "eng"  # What the tesseract command uses without -l
+DEFAULT_OEM = 3  # Whatever engine the traineddata has, as the command line
+DEFAULT_PSM = 3  # Fully automatic page segmentation, as the command line
+
+# Columns of Tesseract's TSV output, i.e. the keys of image_to_data's dict
+TSV_COLUMNS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+               "left", "top", "width", "height", "conf", "text")
+
+_tesserocr_module = None
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _tesserocr():
+    global _tesserocr_module
+    if _tesserocr_module is None:
+        # Tesseract's OpenMP threads fight each other when several engines run at once.
+        # Set before the library loads, which is when OpenMP reads it.
+        limit = os.environ.get("OMP_THREAD_LIMIT")
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+        try:
+            import tesserocr
+        except ImportError:
+            if limit is None:  # Leave tesseract subprocesses their threads
+                del os.environ["OMP_THREAD_LIMIT"]
+            raise ImportError("The Tesseract pool needs tesserocr (pip install tesserocr), "
+                              "or use IDP_OCR_BACKEND=subprocess") from None
+        _tesserocr_module = tesserocr
+    return _tesserocr_module
+
+
+def available():
+    """True when the pool can run (tesserocr importable)."""
+    try:
+        _tesserocr()
+    except ImportError:
+        return False
+    return True
+
+
+def parse_config(config):
+    """
+    {"oem", "psm", "variables", "tessdata"} from a pytesseract config string
+    such as "--oem 3 --psm 6 -c preserve_interword_spaces=1", or None when
+    it holds anything else.
+    """
+    options = {"oem": None, "psm": None, "variables": {}, "tessdata": None}
+    tokens = shlex.split(config or "")
+    try:
+        while tokens:
+            token = tokens.pop(0)
+            if token in ("--oem", "--psm"):
+                options[token[2:]] = int(tokens.pop(0))
+            elif token == "--dpi":
+                options["variables"]["user_defined_dpi"] = tokens.pop(0)
+            elif token == "--tessdata-dir":
+                options["tessdata"] = tokens.pop(0)
+            elif token == "-c":
+                name, value = tokens.pop(0).split("=", 1)
+                options["variables"][name] = value
+            else:
+                return None
+    except (IndexError, ValueError):
+        return None
+    return options
+
+
+def _pixels(image):
+    """A C-contiguous uint8 array (gray, RGB or RGBA) from an array or PIL image, or None."""
+    if isinstance(image, Image.Image):
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("RGB")
+        image = np.asarray(image)
+    if not isinstance(image, np.ndarray) or image.dtype != np.uint8:
+        return None
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+    if image.ndim == 3 and image.shape[2] not in (3, 4):
+        return None
+    # Same channel order pytesseract sends: it saves the array as it is
+    return np.ascontiguousarray(image)
+
+
+def _parse_tsv(tsv):
+    data = {column: [] for column in TSV_COLUMNS}
+    for row in tsv.splitlines():
+        values = row.split("\t")
+        if len(values) < len(TSV_COLUMNS) - 1:
+            continue
+        values += [""] * (len(TSV_COLUMNS) - len(values))  # Rows above word level have no text
+        for column, value in zip(TSV_COLUMNS, values):
+            if column == "text":
+                data[column].append(value)
+            elif column == "conf":
+                data[column].append(float(value))
+            else:
+                data[column].append(int(value))
+    return data
+
+
+class Engine:
+    """One initialized Tesseract instance. Not thread-safe: the pool lends it to one caller at a time."""
+
+    def __init__(self, lang, oem, variables, tessdata):
+        tesserocr = _tesserocr()
+        kwargs = {"lang": lang, "oem": oem, "init": True, "variables": dict(variables)}
+        if tessdata:
+            kwargs["path"] = tessdata
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+
+    def recognize(self, pixels, psm, output):
+        api = self.api
+        api.SetPageSegMode(DEFAULT_PSM if psm is None else psm)
+        height, width = pixels.shape[:2]
+        channels = 1 if pixels.ndim == 2 else pixels.shape[2]
+        api.SetImageBytes(pixels.tobytes(), width, height, channels, width * channels)
+        try:
+            api.Recognize()
+            if output == "data":
+                return _parse_tsv(api.GetTSVText(0))
+            if output == "boxes":
+                return api.GetBoxText(0)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()  # Drops the image and results, keeps the loaded language data
+
+    def close(self):
+        self.api.End()
+
+
+class TesseractPool:
+    """
+    Up to `size` engines recognizing at once. A call takes an idle engine
+    initialized for its language and options, or initializes one when there
+    is none, and gives it back when done.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = {}  # (lang, oem, variables, tessdata) -> [Engine]
+        self._stats = {"calls": 0, "engines": 0}
+
+    @staticmethod
+    def _key(lang, options):
+        oem = DEFAULT_OEM if options["oem"] is None else options["oem"]
+        return (lang or DEFAULT_LANG, oem, tuple(sorted(options["variables"].items())),
+                options["tessdata"])
+
+    def _acquire(self, key):
+        with self._lock:
+            self._stats["calls"] += 1
+            idle = self._idle.setdefault(key, [])
+            if idle:
+                return idle.pop()
+            self._stats["engines"] += 1
+        # Initialized outside the lock: loading the traineddata takes a while
+        lang, oem, variables, tessdata = key
+        return Engine(lang, oem, variables, tessdata)
+
+    def _release(self, key, engine):
+        with self._lock:
+            self._idle[key].append(engine)
+
+    def run(self, image, lang=None, config="", output="data"):
+        """Recognize `image` (uint8 array or PIL image); `output` is "data", "string" or "boxes"."""
+        options = parse_config(config)
+        pixels = _pixels(image)
+        if options is None or pixels is None:
+            raise ValueError(f"The Tesseract pool cannot run config {config!r} on this image")
+        key = self._key(lang, options)
+        with self._slots:
+            engine = self._acquire(key)
+            try:
+                return engine.recognize(pixels, options["psm"], output)
+            finally:
+                self._release(key, engine)
+
+    def warm(self, lang=None, config="", count=None):
+        """Initialize `count` engines (default: the pool size) for `lang` and `config` now."""
+        options = parse_config(config)
+        if options is None:
+            raise ValueError(f"The Tesseract pool cannot run config {config!r}")
+        key = self._key(lang, options)
+        with self._lock:
+            missing = (count or self.size) - len(self._idle.get(key, []))
+            self._stats["engines"] += max(missing, 0)
+        engines = [Engine(*key) for _ in range(missing)]
+        with self._lock:
+            self._idle.setdefault(key, []).extend(engines)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=self.size, idle=sum(len(engines) for engines in self._idle.values()))
+
+    def close(self):
+        with self._lock:
+            for engines in self._idle.values():
+                for engine in engines:
+                    engine.close()
+            self._idle.clear()
+
+
+def get_pool():
+    """The process-wide pool, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = TesseractPool()
+    return _pool
+
+
+def _use_pool(image, config):
+    if OCR_BACKEND not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend {OCR_BACKEND!r}, expected one of: {', '.join(BACKENDS)}")
+    if OCR_BACKEND == "subprocess":
+        return False
+    if OCR_BACKEND == "pool":
+        _tesserocr()  # Raises with an install hint
+        return True
+    return available() and parse_config(config) is not None and _pixels(image) is not None
+
+
+def image_to_data(image, lang=None, config=""):
+    """pytesseract.image_to_data(image, lang, config, output_type=Output.DICT), through the pool when possible."""
+    if _use_pool(image, config):
+        return get_pool().run(image, lang=lang, config=config, output="data")
+    return pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+
+
+def image_to_string(image, lang=None, config=""):
+    """pytesseract.image_to_string, through the pool when possible."""
+    if _use_pool(image, config):
+        return get_pool().run(image, lang=lang, config=config, output="string")
+    return pytesseract.image_to_string(image, lang=lang, config=config)
+
+
+def image_to_boxes(image, lang=None, config=""):
+    """pytesseract.image_to_boxes, through the pool when possible."""
+    if _use_pool(image, config):
+        return get_pool().run(image, lang=lang, config=config, output="boxes")
+    return pytesseract.image_to_boxes(image, lang=lang, config=config)
@@ -1,26 +1,52 @@
-import cv2
-import numpy as np
-from pyzbar.pyzbar import decode
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
+import aadhaar
+import instrument
+import ocr
+from barcodes import read_barcodes
+from document import Document
+from instrument import stage
+from result_cache import results
+
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:5173"])  # Enable CORS for frontend at localhost:5173
 
 def detect_and_verify_barcode(image_bytes, document_data):
-    # Convert image bytes to a numpy array for OpenCV
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    
-    # Use pyzbar to decode barcode data
-    barcodes = decode(img)  # Decode barcodes (including QR codes)
-    
-    if barcodes:
-        barcode_data = [barcode.data.decode('utf-8') for barcode in barcodes]  # Get barcode data as a list of strings
-        return {'barcode_data': barcode_data, 'status': 'success'}
-    else:
+    # Decode the upload once (a Document passed in is already shared with other analyzers)
+    with stage('barcode.decode_image'):
+        document = image_bytes if isinstance(image_bytes, Document) else Document(image_bytes)
+        gray = document.gray
+
+    # Candidate regions first, then every available decoder; whole-page retries only if nothing decodes
+    with stage('barcode.read'):
+        barcodes = read_barcodes(gray)
+
+    if not barcodes:
         return {'error': 'No barcode detected', 'status': 'failure'}
 
+    barcode_data = [barcode['data'] for barcode in barcodes]  # Get barcode data as a list of strings
+    result = {
+        'barcode_data': barcode_data,
+        'barcodes': [{key: barcode[key] for key in ('type', 'data', 'box', 'decoder', 'method')} for barcode in barcodes],
+        'status': 'success',
+    }
+
+    # An Aadhaar QR carries the holder's details; check them against what is printed on the card
+    with stage('barcode.aadhaar'):
+        parsed = next(filter(None, (aadhaar.parse(barcode['data']) for barcode in barcodes)), None)
+    if parsed is not None:
+        result['aadhaar'] = aadhaar.summary(parsed)
+        text = document_data.get('text')
+        if text is None:
+            try:
+                text = ocr.image_to_text(document)
+            except Exception as e:
+                result['verification'] = {'error': f'OCR failed: {e}'}
+        if text is not None:
+            result['verification'] = aadhaar.verify_against_text(parsed, text)
+    return result
+
 @app.route('/verify-code', methods=['POST'])  # Ensure the route matches the frontend request
 def verify_barcode():
     try:
@@ -31,8 +57,8 @@ def verify_barcode():
         # You can add any additional document data here if needed
         document_data = {}
 
-        # Call the barcode detection function
-        result = detect_and_verify_barcode(image_bytes, document_data)
+        # Call the barcode detection function; a re-upload of the same bytes is served from the cache
+        result, _ = results.cached('barcode', image_bytes, lambda: detect_and_verify_barcode(image_bytes, document_data))
 
         # Return the result as JSON
         return jsonify(result)
@@ -41,5 +67,10 @@ def verify_barcode():
         # Return error message in case of exception
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text format: per-stage latency histograms
+    return Response(instrument.render_metrics(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=5000)  # Ensure it runs on all network interfaces and port 5000
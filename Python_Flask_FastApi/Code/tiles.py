@@ -0,0 +1,257 @@
+import io
+import mmap
+import os
+import tempfile
+import weakref
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Tiled, bounded-memory execution for the pixel-level analyzers: a large page is spilled to a
+# memory-mapped file and processed one overlapping window at a time. Components are counted in
+# each tile's core only and SeamMerger joins the ones crossing a core edge, so with enough
+# overlap the result equals the full-page one.
+
+TILE_BUDGET_MB = float(os.environ.get("IDP_TILE_BUDGET_MB", 64))  # Working memory per tile
+TILE_THRESHOLD_MP = float(os.environ.get("IDP_TILE_THRESHOLD_MP", 32))  # Larger pages are processed tiled
+SPILL_DIR = os.environ.get("IDP_TILE_SPILL_DIR") or None  # Default: the system temp folder
+DEFAULT_OVERLAP = 64
+SPILL_BAND = 512  # Rows converted and written at a time when spilling a decoded page
+
+
+def tile_size(bytes_per_pixel, overlap=DEFAULT_OVERLAP, budget_mb=TILE_BUDGET_MB, align=1):
+    """Core side length whose window (core plus overlap) fits in the budget, a multiple of `align`."""
+    side = int(np.sqrt(budget_mb * 1024 * 1024 / float(bytes_per_pixel))) - 2 * overlap
+    return max(side // align * align, align, 2 * overlap)
+
+
+def grid(height, width, tile, overlap=DEFAULT_OVERLAP):
+    """(core, window) boxes as (x1, y1, x2, y2) covering the page row by row."""
+    for y in range(0, height, tile):
+        for x in range(0, width, tile):
+            core = (x, y, min(x + tile, width), min(y + tile, height))
+            window = (max(x - overlap, 0), max(y - overlap, 0),
+                      min(core[2] + overlap, width), min(core[3] + overlap, height))
+            yield core, window
+
+
+def should_tile(height, width, threshold_mp=TILE_THRESHOLD_MP):
+    return threshold_mp > 0 and height * width > threshold_mp * 1e6
+
+
+def image_size(source):
+    """(height, width) of an image source, reading only the header of encoded data."""
+    if isinstance(source, np.ndarray):
+        return source.shape[:2]
+    if isinstance(source, Image.Image):
+        return source.size[1], source.size[0]
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        return image.size[1], image.size[0]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _temp_path():
+    handle, path = tempfile.mkstemp(prefix="idp-tile-", suffix=".raw", dir=SPILL_DIR)
+    os.close(handle)
+    return path
+
+
+def _map(path, dtype, shape, copy):
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, "r+b") as handle:
+        if os.path.getsize(path) < size:
+            handle.truncate(size)
+        mapping = mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_COPY if copy else mmap.ACCESS_WRITE)
+    array = np.frombuffer(mapping, dtype=dtype).reshape(shape)
+    if os.name == "posix":
+        _remove(path)  # The mapping keeps the data alive
+    else:
+        weakref.finalize(mapping, _remove, path)
+    return array
+
+
+def release(array, rows):
+    """
+    Let the kernel drop the first `rows` rows of a spilled array from this
+    process; they are read back from the file if touched again. A no-op
+    for other arrays and where madvise is not available.
+    """
+    mapping = array
+    while mapping is not None and not isinstance(mapping, mmap.mmap):
+        mapping = getattr(mapping, "base", None)
+    if mapping is None or not hasattr(mapping, "madvise") or not array.flags.c_contiguous:
+        return
+    length = rows * array.strides[0] // mmap.PAGESIZE * mmap.PAGESIZE
+    if length > 0:
+        mapping.madvise(mmap.MADV_DONTNEED, 0, length)
+
+
+def spill(shape, dtype=np.uint8):
+    """
+    A zero-filled array backed by a temporary file. The file is removed as
+    soon as the mapping no longer needs it (at once on POSIX systems).
+    """
+    return _map(_temp_path(), dtype, tuple(shape), copy=False)
+
+
+def _pil_bands(image, rgb):
+    width, height = image.size
+    for y in range(0, height, SPILL_BAND):
+        band = np.asarray(image.crop((0, y, width, min(y + SPILL_BAND, height))).convert("RGB"))
+        yield band if rgb else band[..., ::-1]
+
+
+def decode_to_spill(source, rgb=True):
+    """
+    Decode an image source (path, bytes, PIL image or array) into a
+    file-backed HxWx3 uint8 array, RGB (or BGR with rgb=False). The page is
+    written out band by band and read back on demand, so only the decoder's
+    own buffer (PIL's, 4 bytes per pixel; cv2.imdecode would briefly need
+    two copies) is ever held in full. The result is a private copy-on-write
+    mapping that can be drawn on. Arrays are taken to be in the requested
+    channel order.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if isinstance(source, np.ndarray):
+        height, width = source.shape[:2]
+        bands = (source[y:y + SPILL_BAND] for y in range(0, height, SPILL_BAND))
+    else:
+        image = source if isinstance(source, Image.Image) else Image.open(source)
+        width, height = image.size
+        bands = _pil_bands(image, rgb)
+
+    path = _temp_path()
+    # Plain writes go through the page cache without being mapped into this process
+    with open(path, "wb") as output:
+        for band in bands:
+            output.write(np.ascontiguousarray(band).tobytes())
+    return _map(path, np.uint8, (height, width, 3), copy=True)
+
+
+class SeamMerger:
+    """
+    Joins connected components labelled window by window into whole-page
+    components. Feed it every tile with add(), then read components().
+    """
+
+    def __init__(self, height, width):
+        self.height, self.width = height, width
+        self._stats = []  # Per tile: (global ids, x1, y1, x2, y2, area, weight) arrays
+        self._next_id = 1
+        self._core_left = {}  # x -> global ids down a core's first column, page height
+        self._core_top = {}  # y -> global ids along a core's first row, page width
+        self._rings = []  # ("right" | "bottom", position, start, global ids) just outside each core
+
+    def add(self, core, window, mask, linked=None, weights=None):
+        """
+        `mask` (bool, window-sized) marks the counted pixels; components are
+        labelled on `linked` when given (e.g. the mask after closing).
+        `weights` are summed over counted pixels (e.g. error levels).
+        """
+        wx1, wy1 = window[:2]
+        cx1, cy1, cx2, cy2 = core[0] - wx1, core[1] - wy1, core[2] - wx1, core[3] - wy1
+        source = (linked if linked is not None else mask).astype(np.uint8)
+        count, labels = cv2.connectedComponents(source, connectivity=8)
+        if count <= 1:
+            return
+
+        offset = self._next_id - 1
+        self._next_id += count - 1
+
+        def global_ids(line):
+            line = line.astype(np.int64)
+            return np.where(line > 0, line + offset, 0)
+
+        core_labels = labels[cy1:cy2, cx1:cx2]
+        core_mask = mask[cy1:cy2, cx1:cx2]
+        ys, xs = np.nonzero(core_labels)
+        if len(ys):
+            values = core_labels[ys, xs]
+            present = np.flatnonzero(np.bincount(values, minlength=count))
+            # Bounding boxes of each component's pixels inside the core; their union over tiles is the page box
+            box_x1, box_y1 = np.full(count, cx2), np.full(count, cy2)
+            box_x2, box_y2 = np.zeros(count, np.int64), np.zeros(count, np.int64)
+            np.minimum.at(box_x1, values, xs)
+            np.minimum.at(box_y1, values, ys)
+            np.maximum.at(box_x2, values, xs + 1)
+            np.maximum.at(box_y2, values, ys + 1)
+            flagged = core_labels[core_mask]
+            area = np.bincount(flagged, minlength=count)[present]
+            if weights is not None:
+                weight = np.bincount(flagged, weights=weights[cy1:cy2, cx1:cx2][core_mask], minlength=count)[present]
+            else:
+                weight = np.zeros(len(present))
+            self._stats.append((present + offset,
+                                box_x1[present] + core[0], box_y1[present] + core[1],
+                                box_x2[present] + core[0], box_y2[present] + core[1], area, weight))
+
+        # Seams: this core's first column/row, and the column/row just past its far edges
+        x1, y1, x2, y2 = core
+        self._core_left.setdefault(x1, np.zeros(self.height, np.int64))[y1:y2] = global_ids(labels[cy1:cy2, cx1])
+        self._core_top.setdefault(y1, np.zeros(self.width, np.int64))[x1:x2] = global_ids(labels[cy1, cx1:cx2])
+        if cx2 < labels.shape[1]:
+            self._rings.append(("right", x2, wy1, global_ids(labels[:, cx2])))
+        if cy2 < labels.shape[0]:
+            self._rings.append(("bottom", y2, wx1, global_ids(labels[cy2, :])))
+
+    def _pairs(self):
+        pairs = []
+        for side, position, start, ring in self._rings:
+            lines = self._core_left if side == "right" else self._core_top
+            owner = lines.get(position)
+            if owner is None:
+                continue
+            other = owner[start:start + len(ring)]
+            both = (ring > 0) & (other > 0)
+            pairs.append(np.stack([ring[both], other[both]], axis=1))
+        if not pairs:
+            return np.empty((0, 2), np.int64)
+        return np.unique(np.concatenate(pairs), axis=0)
+
+    def components(self):
+        """Whole-page components as dicts with x1, y1, x2, y2 (exclusive), area and weight."""
+        if not self._stats:
+            return []
+        ids, x1, y1, x2, y2, area, weight = (np.concatenate(column) for column in zip(*self._stats))
+
+        # Union-find over the few ids that meet at a seam
+        parent = {}
+
+        def find(node):
+            root = node
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while parent.get(node, node) != root:
+                parent[node], node = root, parent[node]
+            return root
+
+        for a, b in self._pairs():
+            ra, rb = find(int(a)), find(int(b))
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+        roots = np.array([find(int(i)) for i in ids], np.int64) if parent else ids
+
+        unique, group = np.unique(roots, return_inverse=True)
+        n = len(unique)
+        box_x1 = np.full(n, self.width, np.int64)
+        box_y1 = np.full(n, self.height, np.int64)
+        box_x2 = np.zeros(n, np.int64)
+        box_y2 = np.zeros(n, np.int64)
+        np.minimum.at(box_x1, group, x1)
+        np.minimum.at(box_y1, group, y1)
+        np.maximum.at(box_x2, group, x2)
+        np.maximum.at(box_y2, group, y2)
+        areas = np.bincount(group, weights=area, minlength=n)
+        weights = np.bincount(group, weights=weight, minlength=n)
+        return [{"x1": int(box_x1[i]), "y1": int(box_y1[i]), "x2": int(box_x2[i]), "y2": int(box_y2[i]),
+                 "area": int(areas[i]), "weight": float(weights[i])} for i in range(n)]
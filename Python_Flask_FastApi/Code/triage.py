@@ -0,0 +1,277 @@
+"""
+Cheap-first triage: run the forgery checks in order of cost and stop once one is sure.
+
+    python triage.py scans/*.jpg --doc-type id_card
+"""
+import argparse
+import collections
+import functools
+import hashlib
+import json
+import os
+import sys
+import time
+
+import detect_based_on_pixel
+import hash_index
+import pyramid
+from document import Document
+from instrument import stage
+
+# The dark-background detector lives next to the sample images
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "images"))
+
+ORIGINALS_INDEX = os.environ.get("IDP_ORIGINALS_INDEX")  # Same index images.py looks originals up in
+POLICY_FILE = os.environ.get("IDP_TRIAGE_POLICIES")  # JSON policies replacing or adding to POLICIES
+DEFAULT_DOC_TYPE = os.environ.get("IDP_TRIAGE_DOC_TYPE", "default")  # Used when a caller gives no type
+
+# Software tags written by editors rather than by cameras and scanners (lower case)
+EDITOR_SIGNATURES = (
+    "photoshop", "gimp", "paint.net", "pixelmator", "affinity", "lightroom", "illustrator", "inkscape",
+    "photopea", "canva", "snapseed", "picsart", "fotor", "befunky", "krita", "corel",
+)
+NEAR_DISTANCE = 4  # pHash bits: as images.HASH_DISTANCE, recompression and resizing flip a few bits
+
+# How much one finding is worth on its own
+CONFIDENCE = {
+    "editor_software": 0.9,  # The header names an editor
+    "identical_original": 0.98,  # All three hashes equal a verified original's
+    "near_original": 0.8,  # pHash within NEAR_DISTANCE: a small edit would look the same
+    "dq_regions": 0.85,  # Blocks quantized once on a twice-quantized page
+    "dq_consistent": 0.6,  # Twice quantized, every block alike
+    "ocr_regions": 0.7,
+    "ocr_clean": 0.5,
+    "model_words": 0.8,
+    "model_clean": 0.8,
+}
+
+# Rough seconds per A4 page at 150 dpi, used to price checks that have not run yet in a batch
+ESTIMATED_SECONDS = {"exif": 0.0005, "hash": 0.02, "dq": 0.06, "ocr": 1.5, "model": 6.0}
+
+# Per document type: the checks in order, and the noisy-OR confidence each verdict needs
+POLICIES = {
+    "default": {"stages": ["exif", "hash", "dq", "ocr", "model"], "tampered": 0.85, "original": 0.95},
+    # A near-duplicate of a card on file is not enough: a changed name moves few hash bits
+    "id_card": {"stages": ["exif", "hash", "dq", "ocr", "model"], "tampered": 0.85, "original": 0.97},
+    # Statements arrive as PDF renders and scans: no camera EXIF or JPEG history worth reading
+    "bank_statement": {"stages": ["hash", "ocr", "model"], "tampered": 0.8, "original": 0.95},
+    # Photos have no text to OCR
+    "photo": {"stages": ["exif", "hash", "dq"], "tampered": 0.85, "original": 0.9},
+}
+
+
+def load_policies(path=POLICY_FILE):
+    """POLICIES, with the ones in the JSON file at `path` (if any) replacing or adding to them."""
+    policies = dict(POLICIES)
+    if path:
+        with open(path, encoding="utf-8") as file:
+            policies.update(json.load(file))
+    for name, policy in policies.items():
+        unknown = [check for check in policy["stages"] if check not in STAGES]
+        if unknown:
+            raise ValueError(f"Policy {name!r} has unknown stages: {', '.join(unknown)}")
+    return policies
+
+
+def cache_params(doc_type=None, originals_index=ORIGINALS_INDEX, policy_file=POLICY_FILE):
+    """Everything besides the bytes a verdict depends on, for the result cache key."""
+    params = {"doc_type": doc_type or DEFAULT_DOC_TYPE, "scale": pyramid.snap_scale(pyramid.DEFAULT_SCALE)}
+    # A re-saved index or an edited policy file changes the key, so stale verdicts are never served
+    if originals_index and os.path.exists(originals_index):
+        stat = os.stat(originals_index)
+        params["originals"] = [stat.st_mtime_ns, stat.st_size]
+    if policy_file:
+        with open(policy_file, "rb") as file:
+            params["policies"] = hashlib.sha256(file.read()).hexdigest()
+    return params
+
+
+@functools.lru_cache(maxsize=1)
+def _originals(path):
+    # Opened once per process: workers keep it between documents
+    return hash_index.HashIndex(path, readonly=True)
+
+
+def _finding(verdict=None, reason=None, **detail):
+    return dict(detail, verdict=verdict, confidence=CONFIDENCE[reason] if reason else 0.0, reason=reason)
+
+
+# Checks, cheapest first. Each takes the Document and the options and returns a finding.
+
+def exif_check(document, options):
+    software = detect_based_on_pixel.exif_software(document.data)
+    if not software:
+        return _finding(software=software)
+    if any(signature in software.lower() for signature in EDITOR_SIGNATURES):
+        return _finding("tampered", "editor_software", software=software)
+    return _finding(software=software)
+
+
+def hash_check(document, options):
+    index_path = options.get("originals_index", ORIGINALS_INDEX)
+    if not index_path or not os.path.exists(index_path):
+        return _finding(skipped="no originals index")
+    index = _originals(index_path)
+    hashes = hash_index.compute_hashes(document.pil)
+    matches = index.search(hashes["phash"], k=NEAR_DISTANCE, kind="phash", limit=1)
+    if not matches:
+        return _finding()
+    match = matches[0]
+    exact = {match["id"]}
+    for kind in ("ahash", "dhash"):
+        exact &= {entry["id"] for entry in index.search(hashes[kind], k=0, kind=kind)}
+    if match["distance"] == 0 and exact:
+        return _finding("original", "identical_original", match=match)
+    return _finding("original", "near_original", match=match)
+
+
+def dq_check(document, options):
+    import jpeg_forensics
+
+    try:
+        result = jpeg_forensics.analyze_source(document)
+    except ValueError as e:  # Not a JPEG: no compression history to read
+        return _finding(skipped=str(e))
+    detail = {"quality": result["quality"], "tampered_box": result["tampered_box"],
+              "tampered_regions": result["tampered_regions"][:5]}
+    if result["tampered_regions"]:
+        return _finding("tampered", "dq_regions", **detail)
+    if result["double_compressed"]:
+        return _finding("original", "dq_consistent", **detail)
+    return _finding(**detail)
+
+
+def ocr_check(document, options):
+    import tempered
+
+    regions = tempered.detect_tampered_regions(document)
+    if regions:
+        return _finding("tampered", "ocr_regions", regions=regions[:5])
+    return _finding("original", "ocr_clean")
+
+
+def model_check(document, options):
+    import ocr
+    import unilm_idp_detection
+
+    words, coords = ocr.word_boxes(document, config=unilm_idp_detection.OCR_CONFIG,
+                                   preprocess=unilm_idp_detection.OCR_PREPROCESS)
+    if not words:
+        return _finding(skipped="no words")
+    # Batched, and a failure raises into the check's error rather than retrying word by word
+    top_labels, _ = unilm_idp_detection.classify_words(words)
+    tampered_words = [{"word": word, "bbox": box} for word, box in zip(words, coords)
+                      if top_labels.get(word.strip()) == "tampered"]
+    if tampered_words:
+        return _finding("tampered", "model_words", tampered_words=tampered_words)
+    return _finding("original", "model_clean")
+
+
+STAGES = {
+    "exif": exif_check,
+    "hash": hash_check,
+    "dq": dq_check,
+    "ocr": ocr_check,
+    "model": model_check,
+}
+
+
+def triage(source, doc_type=None, policies=None, **options):
+    """
+    Run the checks of the document type's policy on `source` (bytes, path
+    or Document) until one verdict is sure enough. Returns {"verdict",
+    "confidence", "decided_by" (the check that settled it, None when none
+    did), "doc_type", "checks" (one record per check run, with its
+    seconds), "skipped" (checks the early exit saved), "errors" ({check:
+    error} for checks that raised)}. A check that fails is recorded with its
+    error and the cascade goes on; the result cache does not store a result
+    with errors.
+    """
+    doc_type = doc_type or DEFAULT_DOC_TYPE
+    policies = policies or load_policies()
+    if doc_type not in policies:
+        raise ValueError(f"Unknown document type {doc_type!r}, expected one of: {', '.join(policies)}")
+    policy = policies[doc_type]
+    if isinstance(source, str):
+        source = Document.open(source)
+    elif not isinstance(source, Document):
+        source = Document(source)
+
+    # Noisy-OR per verdict: the chance that not every finding for it is wrong
+    doubt = {"tampered": 1.0, "original": 1.0}
+    checks, decided_by = [], None
+    names = policy["stages"]
+    for position, name in enumerate(names):
+        start = time.perf_counter()
+        try:
+            with stage(f"triage.{name}"):
+                finding = STAGES[name](source, options)
+        except Exception as e:
+            finding = _finding(error=f"{type(e).__name__}: {e}")
+        checks.append(dict(finding, check=name, seconds=round(time.perf_counter() - start, 6)))
+        if finding["verdict"]:
+            doubt[finding["verdict"]] *= 1 - finding["confidence"]
+        sure = [verdict for verdict in doubt if 1 - doubt[verdict] >= policy[verdict]]
+        if sure:
+            decided_by = name
+            break
+
+    confidence = {verdict: 1 - remaining for verdict, remaining in doubt.items()}
+    verdict = max(confidence, key=confidence.get) if any(confidence.values()) else None
+    return {
+        "verdict": verdict,
+        "confidence": round(confidence[verdict], 4) if verdict else 0.0,
+        "decided_by": decided_by,
+        "doc_type": doc_type,
+        "checks": checks,
+        "skipped": names[len(checks):],
+        "errors": {check["check"]: check["error"] for check in checks if "error" in check},
+    }
+
+
+def summarize(results):
+    """
+    Compute spent and saved over a batch of triage() results. A skipped
+    check is priced at its mean time over the documents where it ran
+    without error, or at ESTIMATED_SECONDS when it never did.
+    """
+    runs = {}
+    for result in results:
+        for check in result["checks"]:
+            if "error" not in check:
+                runs.setdefault(check["check"], []).append(check["seconds"])
+    cost = {name: sum(seconds) / len(seconds) if seconds else ESTIMATED_SECONDS[name]
+            for name, seconds in ((name, runs.get(name, [])) for name in STAGES)}
+
+    spent = sum(check["seconds"] for result in results for check in result["checks"])
+    saved = sum(cost[name] for result in results for name in result["skipped"])
+    return {
+        "documents": len(results),
+        "verdicts": dict(collections.Counter(result["verdict"] or "none" for result in results)),
+        "decided_by": dict(collections.Counter(result["decided_by"] or "none" for result in results)),
+        "spent_s": round(spent, 3),
+        "saved_s": round(saved, 3),
+        "saved_fraction": round(saved / (spent + saved), 4) if spent + saved else 0.0,
+        "check_cost_s": {name: round(seconds, 4) for name, seconds in cost.items()},
+        "estimated_costs": [name for name in STAGES if name not in runs],
+        "checks_skipped": {name: sum(name in result["skipped"] for result in results) for name in STAGES},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--doc-type", default=DEFAULT_DOC_TYPE)
+    parser.add_argument("--originals", default=ORIGINALS_INDEX, help="hash_index.py .npz of verified originals")
+    args = parser.parse_args()
+
+    results = []
+    for path in args.paths:
+        result = triage(path, doc_type=args.doc_type, originals_index=args.originals)
+        print(json.dumps(dict(result, path=path), default=str))
+        results.append(result)
+    print(json.dumps(summarize(results), indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
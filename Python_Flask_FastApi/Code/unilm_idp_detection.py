@@ -1,60 +1,129 @@
+import logging
+import math
+import time
+
 import requests
-from transformers import pipeline
 import cv2
 import pytesseract
 import numpy as np
 import matplotlib.pyplot as plt
 
+import document
+import ocr
+from instrument import stage
+from model_registry import get_classifier
+
 # Update this to your Tesseract path
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
-# Load the Hugging Face pipeline for text classification (you can use other models or zero-shot classification)
-classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+# The zero-shot classifier (facebook/bart-large-mnli by default) is loaded lazily
+# on first use by model_registry and kept warm; see model_registry.preload/serve.
+
+logger = logging.getLogger("idp.tampered_words")
+
+TAMPER_LABELS = ["tampered", "original"]
+DEFAULT_BATCH_SIZE = 32  # (word, label) pairs per forward pass in batched mode
+
+# Tesseract settings shared by text extraction and word boxes, so both come from one cached OCR pass
+OCR_CONFIG = r'--oem 3 --psm 6'
+OCR_PREPROCESS = 'binary'  # Grayscale + fixed threshold at 150
 
 # Function to extract text using Tesseract OCR
 def extract_text(image_path):
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-    custom_oem_psm_config = r'--oem 3 --psm 6'
-    extracted_text = pytesseract.image_to_string(thresh, config=custom_oem_psm_config)
+    # A Document keeps the thresholded view, so find_words_coords reuses it instead of thresholding again
+    with stage("tampered_words.imread"):
+        image = image_path if isinstance(image_path, document.Document) else document.Document.open(image_path)
+    extracted_text = ocr.image_to_text(image, config=OCR_CONFIG, preprocess=OCR_PREPROCESS)
     return extracted_text, image
 
+# Function to classify many words in batches with one pipeline call
+def classify_words(words, labels=TAMPER_LABELS, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Classify words with the zero-shot pipeline in fixed-size, padded batches.
+    Identical words are classified only once, and words are sorted by length
+    so each batch pads to a similar sequence length.
+    Returns ({word: top_label}, report) where report holds latency/throughput.
+    """
+    start = time.perf_counter()
+    unique_words = sorted({word.strip() for word in words if word.strip()}, key=len)
+
+    top_labels = {}
+    if unique_words:
+        with stage("tampered_words.load_model"):
+            classifier = get_classifier()
+        # Tokenization and the forward passes both happen inside the pipeline call
+        with stage("tampered_words.classify"):
+            results = classifier(unique_words, candidate_labels=labels, batch_size=batch_size)
+        if isinstance(results, dict):  # A single input comes back unwrapped
+            results = [results]
+        for result in results:
+            top_labels[result['sequence']] = result['labels'][0]
+
+    elapsed = time.perf_counter() - start
+    pairs = len(unique_words) * len(labels)
+    report = {
+        'words': len(words),
+        'unique_words': len(unique_words),
+        'batch_size': batch_size,
+        'batches': math.ceil(pairs / batch_size) if batch_size else 0,
+        'forward_pairs': pairs,
+        'seconds': round(elapsed, 4),
+        'words_per_second': round(len(words) / elapsed, 2) if elapsed > 0 else None,
+    }
+    return top_labels, report
+
 # Function to detect tampered words using Hugging Face
-def detect_tampered_words(extracted_text, words, coords):
-    labels = ["tampered", "original"]
+def detect_tampered_words(extracted_text, words, coords, batch_size=DEFAULT_BATCH_SIZE, return_report=False):
+    """
+    Returns the coordinates of words classified as tampered.
+    With a `batch_size` the words are classified in batches (see classify_words)
+    and a failure raises; pass batch_size=None for the old one-call-per-word mode.
+    """
+    labels = TAMPER_LABELS
     tampered_coords = []
+    report = None
 
     # Check if words is empty
     if not words:
-        print("No words extracted from the image.")
-        return tampered_coords
+        logger.info("No words extracted from the image")
+        return (tampered_coords, report) if return_report else tampered_coords
+
+    if batch_size:
+        top_labels, report = classify_words(words, labels, batch_size=batch_size)
+        for word, coord in zip(words, coords):
+            if top_labels.get(word.strip()) == 'tampered':
+                tampered_coords.append(coord)
+        return (tampered_coords, report) if return_report else tampered_coords
 
     # Use Hugging Face to classify each word in the extracted text
-    for word, coord in zip(words, coords):
-        if word.strip():  # Ensure the word is not empty
-            print(f"Classifying word: {word}")  # Debug print
-            try:
-                result = classifier(word, candidate_labels=labels)
-                label = result['labels'][0]  # Get the top predicted label
-                if label == 'tampered':
-                    tampered_coords.append(coord)
-            except Exception as e:
-                print(f"Error classifying word '{word}': {e}")
-
-    return tampered_coords
+    with stage("tampered_words.load_model"):
+        classifier = get_classifier()
+    start = time.perf_counter()
+    with stage("tampered_words.classify"):
+        for word, coord in zip(words, coords):
+            if word.strip():  # Ensure the word is not empty
+                try:
+                    result = classifier(word, candidate_labels=labels)
+                    label = result['labels'][0]  # Get the top predicted label
+                    if label == 'tampered':
+                        tampered_coords.append(coord)
+                except Exception:
+                    logger.exception("Error classifying word %r", word)
+
+    elapsed = time.perf_counter() - start
+    report = {
+        'words': len(words),
+        'batch_size': None,
+        'seconds': round(elapsed, 4),
+        'words_per_second': round(len(words) / elapsed, 2) if elapsed > 0 else None,
+    }
+    return (tampered_coords, report) if return_report else tampered_coords
 
 # Function to find words and their bounding boxes
 def find_words_coords(image):
-    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-    words = []
-    coords = []
-    for i in range(len(data['text'])):
-        if int(data['conf'][i]) > 0:  # Only consider words with non-zero confidence
-            word = data['text'][i]
-            x, y, w, h = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-            words.append(word)
-            coords.append((x, y, w, h))
+    # Reuses the cached OCR result from extract_text instead of running Tesseract again
+    with stage("tampered_words.word_boxes"):
+        words, coords = ocr.word_boxes(image, config=OCR_CONFIG, preprocess=OCR_PREPROCESS, min_conf=0)
     return words, coords
 
 # Function to apply pixelation effect on tampered words
@@ -74,8 +143,9 @@ def pixelate_region(image, x, y, w, h, pixel_size=10):
 
 # Function to highlight tampered words and pixelate them
 def highlight_and_pixelate_tampered_words(image, coords):
-    pixelated_image = image.copy()  # Copy to modify the pixelated version
-    highlighted_image = image.copy()  # Copy to modify the highlighted version
+    """Returns (highlighted copy, pixelated copy), both in colour like the input."""
+    pixelated_image = document.as_array(image).copy()  # Copy to modify the pixelated version
+    highlighted_image = document.as_array(image).copy()  # Copy to modify the highlighted version
     
     for coord in coords:
         x, y, w, h = coord
@@ -89,8 +159,8 @@ def highlight_and_pixelate_tampered_words(image, coords):
 
 # Function to apply infrared effect on the image (specifically the pixelated one)
 def apply_infrared_effect(image):
-    # Convert to grayscale and increase red tones for infrared look
-    infrared_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    # Convert to grayscale (if not already) and increase red tones for infrared look
+    infrared_image = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     infrared_image = cv2.applyColorMap(infrared_image, cv2.COLORMAP_JET)
     return infrared_image
 
@@ -105,34 +175,38 @@ def main(image_path):
     words, coords = find_words_coords(image)
 
     # Step 3: Detect tampered words using Hugging Face model
-    tampered_coords = detect_tampered_words(extracted_text, words, coords)
-    
+    tampered_coords, report = detect_tampered_words(extracted_text, words, coords, return_report=True)
+    if report:
+        print(f"Classification report: {report}")
+
     if tampered_coords:
         print(f"Tampered words detected at coordinates: {tampered_coords}")
     else:
         print("No tampered words detected.")
 
     # Step 4: Highlight and pixelate the tampered words in the image
-    highlighted_image, pixelated_image = highlight_and_pixelate_tampered_words(image, tampered_coords)
+    with stage("tampered_words.highlight"):
+        highlighted_image, pixelated_image = highlight_and_pixelate_tampered_words(image, tampered_coords)
 
-    # Step 5: Apply infrared effect to the pixelated image
-    infrared_pixelated_image = apply_infrared_effect(pixelated_image)
+        # Step 5: Apply infrared effect to the pixelated image
+        infrared_pixelated_image = apply_infrared_effect(pixelated_image)
 
     # Step 6: Display the images in separate windows
-    plt.figure(figsize=(12, 6))
+    with stage("tampered_words.render"):
+        plt.figure(figsize=(12, 6))
     
-    # Show the highlighted image
-    plt.subplot(1, 2, 1)
-    highlighted_image_rgb = cv2.cvtColor(highlighted_image, cv2.COLOR_BGR2RGB)  # Convert from BGR to RGB
-    plt.imshow(highlighted_image_rgb)
-    plt.title("Highlighted Tampered Words")
-    plt.axis('off')
+        # Show the highlighted image
+        plt.subplot(1, 2, 1)
+        highlighted_image_rgb = cv2.cvtColor(highlighted_image, cv2.COLOR_BGR2RGB)  # Convert from BGR to RGB
+        plt.imshow(highlighted_image_rgb)
+        plt.title("Highlighted Tampered Words")
+        plt.axis('off')
     
-    # Show the infrared pixelated image
-    plt.subplot(1, 2, 2)
-    plt.imshow(infrared_pixelated_image)
-    plt.title("Pixelated Tampered Words (Infrared Effect)")
-    plt.axis('off')
+        # Show the infrared pixelated image
+        plt.subplot(1, 2, 2)
+        plt.imshow(infrared_pixelated_image)
+        plt.title("Pixelated Tampered Words (Infrared Effect)")
+        plt.axis('off')
     
     plt.show()
 
@@ -0,0 +1,216 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+from difflib import SequenceMatcher
+
+# Order-aware word diff between the OCR of an original and a suspect image (patience diff,
+# Myers for gaps without unique words). OCR noise is matched fuzzily; any change to a word
+# with digits is reported.
+
+FUZZY_RATIO = 0.8  # Similarity above which two alphabetic words count as the same word
+LOW_CONF = 60  # Below this OCR confidence a looser similarity is accepted
+LOW_CONF_RATIO = 0.6
+MAX_EDITS = 1000  # Myers gives up beyond this many edits in one gap (the gap becomes one replacement)
+
+_PUNCTUATION = re.compile(r"^[^\w]+|[^\w]+$")
+# Letters Tesseract commonly reads in place of digits, applied only to words that contain digits
+_DIGIT_CONFUSABLES = str.maketrans({"o": "0", "i": "1", "l": "1", "|": "1"})
+
+
+def normalize(word):
+    """Comparison key: lower case without surrounding punctuation."""
+    return _PUNCTUATION.sub("", word.lower()) or word
+
+
+def _has_digit(word):
+    return any(char.isdigit() for char in word)
+
+
+def same_word(original, tampered, conf=100):
+    """True when two OCR words differ only by OCR noise."""
+    a, b = normalize(original), normalize(tampered)
+    if a == b:
+        return True
+    if _has_digit(a) or _has_digit(b):
+        # Amounts, dates and ids must match exactly, up to letter/digit confusion
+        return a.translate(_DIGIT_CONFUSABLES) == b.translate(_DIGIT_CONFUSABLES)
+    if min(len(a), len(b)) < 4:
+        return False
+    ratio = SequenceMatcher(None, a, b).ratio()
+    return ratio >= FUZZY_RATIO or (conf < LOW_CONF and ratio >= LOW_CONF_RATIO)
+
+
+def _longest_increasing(pairs):
+    """Longest subsequence of (i, j) pairs (sorted by i) with increasing j."""
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        position = bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[position] = j
+            tail_index[position] = index
+        previous[index] = tail_index[position - 1] if position else None
+    result = []
+    index = tail_index[-1] if tail_index else None
+    while index is not None:
+        result.append(pairs[index])
+        index = previous[index]
+    return result[::-1]
+
+
+def _myers(a, b, a0, a1, b0, b1):
+    """Matched (i, j) pairs of a[a0:a1] and b[b0:b1], or [] past MAX_EDITS."""
+    n, m = a1 - a0, b1 - b0
+    v = {1: 0}
+    trace = []
+    for d in range(min(n + m, MAX_EDITS) + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m, a0, b0)
+    return []
+
+
+def _backtrack(trace, x, y, a0, b0):
+    matches = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if d == 0:
+            previous_x = previous_y = 0
+        else:
+            previous_k = k + 1 if k == -d or (k != d and v[k - 1] < v[k + 1]) else k - 1
+            previous_x = v[previous_k]
+            previous_y = previous_x - previous_k
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+            matches.append((a0 + x, b0 + y))
+        x, y = previous_x, previous_y
+    return matches[::-1]
+
+
+def _align(a, b, a0, a1, b0, b1, matches):
+    """Append matched (i, j) pairs for a[a0:a1] vs b[b0:b1] to `matches`, in order."""
+    while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+        matches.append((a0, b0))
+        a0 += 1
+        b0 += 1
+    suffix = []
+    while a0 < a1 and b0 < b1 and a[a1 - 1] == b[b1 - 1]:
+        a1 -= 1
+        b1 -= 1
+        suffix.append((a1, b1))
+    if a0 < a1 and b0 < b1:
+        counts_a = Counter(a[a0:a1])
+        counts_b = Counter(b[b0:b1])
+        positions_b = {b[j]: j for j in range(b0, b1) if counts_b[b[j]] == 1}
+        pairs = [(i, positions_b[a[i]]) for i in range(a0, a1)
+                 if counts_a[a[i]] == 1 and a[i] in positions_b]
+        anchors = _longest_increasing(pairs)
+        if anchors:
+            for i, j in anchors:
+                _align(a, b, a0, i, b0, j, matches)
+                matches.append((i, j))
+                a0, b0 = i + 1, j + 1
+            _align(a, b, a0, a1, b0, b1, matches)
+        else:
+            matches.extend(_myers(a, b, a0, a1, b0, b1))
+    matches.extend(reversed(suffix))
+
+
+def diff_words(original, tampered):
+    """
+    Opcodes for two word lists, like difflib: (tag, i1, i2, j1, j2) with
+    tag in "equal", "replace", "delete", "insert" (exact key comparison).
+    """
+    a = [normalize(word) for word in original]
+    b = [normalize(word) for word in tampered]
+    matches = []
+    _align(a, b, 0, len(a), 0, len(b), matches)
+
+    opcodes = []
+    i = j = 0
+    for match_i, match_j in matches + [(len(a), len(b))]:
+        if i < match_i and j < match_j:
+            opcodes.append(("replace", i, match_i, j, match_j))
+        elif i < match_i:
+            opcodes.append(("delete", i, match_i, j, j))
+        elif j < match_j:
+            opcodes.append(("insert", i, i, j, match_j))
+        if match_i < len(a):
+            if opcodes and opcodes[-1][0] == "equal":
+                tag, i1, _, j1, _ = opcodes.pop()
+                opcodes.append(("equal", i1, match_i + 1, j1, match_j + 1))
+            else:
+                opcodes.append(("equal", match_i, match_i + 1, match_j, match_j + 1))
+        i, j = match_i + 1, match_j + 1
+    return opcodes
+
+
+def _as_words(side):
+    """(words, boxes, confs) from an ocr.run_ocr result or plain text."""
+    if isinstance(side, str):
+        words = side.split()
+        return words, [None] * len(words), [100.0] * len(words)
+    return side["words"], side["boxes"], side["confs"]
+
+
+def diff_ocr(original, tampered):
+    """
+    Word changes from an original to a suspect document. Each side is an
+    ocr.run_ocr result (or plain text, without boxes). Returns
+    {"changes": [{"op", "word", "box", "original", "original_box"}],
+     "matched", "fuzzy_matched", "original_words", "tampered_words"}.
+    Deleted words carry no box on the suspect image.
+    """
+    a_words, a_boxes, _ = _as_words(original)
+    b_words, b_boxes, b_confs = _as_words(tampered)
+
+    changes = []
+    matched = fuzzy = 0
+
+    def change(op, i=None, j=None):
+        changes.append({
+            "op": op,
+            "word": b_words[j] if j is not None else None,
+            "box": b_boxes[j] if j is not None else None,
+            "original": a_words[i] if i is not None else None,
+            "original_box": a_boxes[i] if i is not None else None,
+        })
+
+    for tag, i1, i2, j1, j2 in diff_words(a_words, b_words):
+        if tag == "equal":
+            matched += i2 - i1
+            continue
+        # Pair the stretch word by word; leftovers are pure inserts/deletes
+        paired = min(i2 - i1, j2 - j1)
+        for offset in range(paired):
+            i, j = i1 + offset, j1 + offset
+            if same_word(a_words[i], b_words[j], b_confs[j]):
+                fuzzy += 1
+            else:
+                change("replace", i, j)
+        for j in range(j1 + paired, j2):
+            change("insert", j=j)
+        for i in range(i1 + paired, i2):
+            change("delete", i=i)
+
+    return {
+        "changes": changes,
+        "matched": matched,
+        "fuzzy_matched": fuzzy,
+        "original_words": len(a_words),
+        "tampered_words": len(b_words),
+    }
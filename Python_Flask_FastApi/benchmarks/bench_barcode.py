@@ -0,0 +1,107 @@
+"""
+Benchmark: barcode/QR decode rate and latency, whole-page decode vs barcodes.read_barcodes.
+
+    python benchmarks/bench_barcode.py
+    python benchmarks/bench_barcode.py --kinds aadhaar --sizes a4-150 a4-300 --seeds 10
+
+Pages are the "qr" and "aadhaar" fixtures (see fixtures.py), each also
+rotated, blurred and washed out. "legacy" is what /verify-code did before:
+pyzbar on the whole colour page. Where the zbar library is not installed
+OpenCV's QR detector on the whole colour page stands in for it, and the
+header says so. A page counts as decoded when its QR payload is among the
+results. Latency is the median over seeds of one call, decode of the
+upload excluded.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+
+import barcodes  # noqa: E402
+import fixtures  # noqa: E402
+
+
+def legacy_zbar(page):
+    return [code.data for code in barcodes._zbar().decode(page)]
+
+
+def legacy_opencv(page):
+    ok, decoded, _, _ = cv2.QRCodeDetector().detectAndDecodeBytesMulti(page)
+    return [bytes(data) for data in decoded] if ok else []
+
+
+def region_first(page):
+    return [code["bytes"] for code in barcodes.read_barcodes(page)]
+
+
+def rotated(page):
+    # Rotated on a canvas large enough to keep the corners, as a skewed scan would be
+    height, width = page.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), 15, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    size = int(np.ceil(width * cos + height * sin)), int(np.ceil(width * sin + height * cos))
+    matrix[:, 2] += (size[0] - width) / 2.0, (size[1] - height) / 2.0
+    return cv2.warpAffine(page, matrix, size, borderValue=(250, 250, 250))
+
+
+def blurred(page):
+    side = max(3, int(max(page.shape[:2]) / 600) | 1)
+    return cv2.GaussianBlur(page, (side, side), 0)
+
+
+def low_contrast(page):
+    return cv2.convertScaleAbs(page, alpha=0.35, beta=150)
+
+
+VARIANTS = {"clean": lambda page: page, "rotated": rotated, "blurred": blurred, "low-contrast": low_contrast}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kinds", nargs="+", default=["qr", "aadhaar"], choices=["qr", "aadhaar"])
+    parser.add_argument("--sizes", nargs="+", default=["a4-72", "a4-150", "a4-300", "a4-600"],
+                        choices=list(fixtures.SIZES))
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--seeds", type=int, default=5)
+    args = parser.parse_args()
+
+    legacy = legacy_zbar if barcodes._zbar() is not None else legacy_opencv
+    print(f"legacy: {'pyzbar' if legacy is legacy_zbar else 'OpenCV QR (zbar library not installed)'}, whole colour page")
+    print(f"{'kind':>8} {'size':>7} {'variant':>12} {'legacy ok':>9} {'legacy ms':>9} {'new ok':>7} {'new ms':>7}")
+    totals = {"legacy": [0, []], "new": [0, []]}
+    for kind in args.kinds:
+        for size in args.sizes:
+            for variant in args.variants:
+                rows = {"legacy": [0, []], "new": [0, []]}
+                for seed in range(args.seeds):
+                    fixture = fixtures.make_fixture(kind, size, seed)
+                    page = VARIANTS[variant](fixtures.decode(fixture))
+                    payload = fixture["truth"]["payload"].encode("latin-1")
+                    for name, reader in (("legacy", legacy), ("new", region_first)):
+                        start = time.perf_counter()
+                        found = reader(page)
+                        rows[name][1].append((time.perf_counter() - start) * 1000)
+                        rows[name][0] += payload in found
+                for name, (ok, times) in rows.items():
+                    totals[name][0] += ok
+                    totals[name][1].extend(times)
+                print(f"{kind:>8} {size:>7} {variant:>12} {rows['legacy'][0]:>5}/{args.seeds:<3} "
+                      f"{statistics.median(rows['legacy'][1]):>9.0f} {rows['new'][0]:>3}/{args.seeds:<3} "
+                      f"{statistics.median(rows['new'][1]):>7.0f}")
+
+    pages = len(totals["new"][1])
+    for name, (ok, times) in totals.items():
+        print(f"{name}: decoded {ok}/{pages} ({100.0 * ok / pages:.0f}%), median {np.median(times):.0f} ms, "
+              f"p95 {np.percentile(times, 95):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
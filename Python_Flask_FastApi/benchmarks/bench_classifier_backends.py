@@ -0,0 +1,119 @@
+"""
+Benchmark: the tamper word classifier on the fp32, int8 and onnx backends.
+
+    python benchmarks/bench_classifier_backends.py
+    python benchmarks/bench_classifier_backends.py --threads 1 4 --repeat 5
+    python benchmarks/bench_classifier_backends.py --model /models/bart-large-mnli
+
+Each backend loads in a fresh interpreter. Reports load time, warm ms/word,
+RSS and peak, agreement and max score difference with fp32, and (for the
+default small trained stand-in, tiny_model.py) accuracy on its made-up rule.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.join(HERE, "..", "Code")
+
+sys.path.insert(0, HERE)
+
+import fixtures  # noqa: E402
+import tiny_model  # noqa: E402
+
+PROBE = r"""
+import json, resource, sys, time
+sys.path.insert(0, {code_dir!r})
+import model_registry
+import unilm_idp_detection
+
+words = {words!r}
+t0 = time.perf_counter()
+classifier = model_registry.get_classifier()
+load_s = time.perf_counter() - t0
+best = None
+for _ in range({repeat!r}):
+    t0 = time.perf_counter()
+    results = classifier(words, candidate_labels=unilm_idp_detection.TAMPER_LABELS,
+                         batch_size=unilm_idp_detection.DEFAULT_BATCH_SIZE)
+    seconds = time.perf_counter() - t0
+    best = seconds if best is None else min(best, seconds)
+with open("/proc/self/status") as status:
+    rss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+scores = {{result["sequence"]: dict(zip(result["labels"], result["scores"])) for result in results}}
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Linux: kilobytes
+print(json.dumps({{"load_s": load_s, "seconds": best, "rss_mb": rss_kb / 1024, "peak_mb": peak_kb / 1024, "scores": scores}}))
+"""
+
+
+def word_set():
+    names = [part for name in fixtures.NAMES for part in name.lower().split()]
+    return list(tiny_model.VOCABULARY) + names + ["2024", "15/08/1991", "12,450.00", "560001"]
+
+
+def probe(model, backend, threads, words, repeat, onnx_dir):
+    env = dict(os.environ, IDP_CLASSIFIER_MODEL=model, IDP_CLASSIFIER_BACKEND=backend,
+               IDP_CLASSIFIER_THREADS=str(threads), IDP_ONNX_DIR=onnx_dir,
+               HF_HUB_OFFLINE="1", TRANSFORMERS_VERBOSITY="error")
+    env.pop("IDP_INFERENCE_ADDRESS", None)
+    process = subprocess.run(
+        [sys.executable, "-c", PROBE.format(code_dir=CODE_DIR, words=words, repeat=repeat)],
+        env=env, capture_output=True, text=True,
+    )
+    if process.returncode:
+        return {"error": process.stderr.strip().splitlines()[-1]}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(scores, reference):
+    top = {word: max(labels, key=labels.get) for word, labels in scores.items()}
+    reference_top = {word: max(labels, key=labels.get) for word, labels in reference.items()}
+    agree = sum(top[word] == reference_top[word] for word in reference) / len(reference)
+    max_diff = max(abs(scores[word][label] - reference[word][label])
+                   for word in reference for label in reference[word])
+    known = [word for word in top if word in tiny_model.VOCABULARY]
+    accuracy = sum(top[word] == tiny_model.expected_label(word) for word in known) / max(len(known), 1)
+    return agree, max_diff, accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Local model directory (default: a small trained stand-in)")
+    parser.add_argument("--backends", nargs="+", default=["fp32", "int8", "onnx"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="0: torch's default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--d-model", type=int, default=256, help="Width of the stand-in model")
+    parser.add_argument("--layers", type=int, default=4, help="Encoder and decoder layers of the stand-in")
+    args = parser.parse_args()
+
+    model = args.model
+    if not model:
+        path = os.path.join(tempfile.gettempdir(), f"idp-trained-nli-{args.d_model}x{args.layers}")
+        print(f"building {path} (once)")
+        model = tiny_model.build_tiny_model(path, d_model=args.d_model, layers=args.layers, train_steps=150)
+    words = word_set()
+    onnx_dir = tempfile.mkdtemp()
+
+    print(f"model: {model}, {len(words)} words")
+    print(f"{'backend':>8} {'threads':>7} {'load s':>7} {'ms/word':>8} {'RSS MB':>7} {'peak MB':>8} {'agree':>6} "
+          f"{'max diff':>9} {'accuracy':>9}")
+    for threads in args.threads:
+        reference = None
+        for backend in args.backends:
+            result = probe(model, backend, threads, words, args.repeat, onnx_dir)
+            if "error" in result:
+                print(f"{backend:>8} {threads:>7}  skipped: {result['error']}")
+                continue
+            if reference is None:
+                reference = result["scores"]  # The first backend listed (fp32 by default) is the baseline
+            agree, max_diff, accuracy = compare(result["scores"], reference)
+            print(f"{backend:>8} {threads:>7} {result['load_s']:>7.2f} "
+                  f"{1000 * result['seconds'] / len(words):>8.2f} {result['rss_mb']:>7.0f} {result['peak_mb']:>8.0f} {agree:>6.1%} "
+                  f"{max_diff:>9.4f} {'' if args.model else f'{accuracy:.1%}':>9}")
+
+
+if __name__ == "__main__":
+    main()
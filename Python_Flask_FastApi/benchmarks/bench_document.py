@@ -0,0 +1,87 @@
+"""
+Benchmark: several detectors on one upload, each decoding it vs one shared Document.
+
+    python benchmarks/bench_document.py
+    python benchmarks/bench_document.py --sizes a4-300 a4-600 --repeat 5
+
+The pixel detectors that need no Tesseract (ELA, dark-white regions,
+table boxes, table grid, barcodes) run back to back on the same "card"
+fixture. "separate" is how they ran before: each gets the upload bytes
+and decodes and converts it on its own. "shared" hands all of them one
+Document, so the page is decoded once and gray/HSV/blur/downscaled views
+are computed once. Times are medians; the last column is what the
+Document holds after all detectors ran.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+sys.path.insert(0, os.path.join(HERE, "..", "images"))
+
+import fixtures  # noqa: E402
+from document import Document  # noqa: E402
+
+
+def _decode(data):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def detectors():
+    import bank_statement
+    import barcodes
+    import ela
+    import table_structure
+    import tempered
+
+    # name -> (run on upload bytes, decoding as before; run on a Document)
+    return {
+        "ela": (lambda data: ela.analyze_source(data), lambda doc: ela.analyze_source(doc)),
+        "tamper": (lambda data: tempered.dark_white_regions(_decode(data)), lambda doc: tempered.dark_white_regions(doc)),
+        "tables": (lambda data: bank_statement.detect_table_boxes(_decode(data), scale=0.5),
+                   lambda doc: bank_statement.detect_table_boxes(doc, scale=0.5)),
+        "structure": (lambda data: table_structure.extract_tables(_decode(data), read_text=False),
+                      lambda doc: table_structure.extract_tables(doc, read_text=False)),
+        "barcode": (lambda data: barcodes.read_barcodes(_decode(data), fallbacks=False),
+                    lambda doc: barcodes.read_barcodes(doc.gray, fallbacks=False)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["a4-150", "a4-300"], choices=list(fixtures.SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = detectors()
+    print(f"detectors: {', '.join(runs)}")
+    print(f"{'size':>7} {'separate s':>10} {'shared s':>9} {'speedup':>8} {'decodes':>8} {'views MB':>9}")
+    for size in args.sizes:
+        data = fixtures.make_fixture("card", size)["data"]
+        separate, shared = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for run, _ in runs.values():
+                run(data)
+            separate.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            document = Document(data)
+            for _, run in runs.values():
+                run(document)
+            shared.append(time.perf_counter() - start)
+        report = document.memory_report()
+        separate_s, shared_s = statistics.median(separate), statistics.median(shared)
+        print(f"{size:>7} {separate_s:>10.3f} {shared_s:>9.3f} {separate_s / shared_s:>7.2f}x "
+              f"{report['computed'].get('bgr', 0):>4} vs {len(runs)} {report['total_bytes'] / 2 ** 20:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: vectorized ELA engine vs the old per-pixel Python loop.
+
+    python benchmarks/bench_ela.py
+    python benchmarks/bench_ela.py --sizes 640x480 4000x3000 --legacy-max-mp 1
+
+The legacy path is quadratic-ish in interpreter steps, so by default it is
+only run on images up to --legacy-max-mp megapixels.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageChops, ImageEnhance
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Code"))
+
+import ela  # noqa: E402
+
+
+def make_document(width, height, seed=0):
+    """A JPEG-compressed page with a never-compressed patch pasted in (the 'edit')."""
+    rng = np.random.default_rng(seed)
+    base = np.full((height, width, 3), 235, np.uint8)
+    base += rng.integers(0, 12, size=base.shape, dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(base).save(buffer, format="JPEG", quality=70)
+    page = np.asarray(Image.open(buffer).convert("RGB")).copy()
+
+    ph, pw = max(height // 10, 8), max(width // 5, 8)
+    y, x = height // 2, width // 3
+    page[y:y + ph, x:x + pw] = rng.integers(0, 255, size=(ph, pw, 3), dtype=np.uint8)
+    return Image.fromarray(page)
+
+
+def recompress(image, quality=90):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    buffer.seek(0)
+    return Image.open(buffer).convert("RGB")
+
+
+def legacy_ela(original, recompressed, threshold=30):
+    """The original detect_based_on_pixel loop, kept verbatim for comparison."""
+    diff = ImageChops.difference(original, recompressed)
+    diff = ImageEnhance.Brightness(diff).enhance(20)
+    diff_pixels = diff.load()
+    width, height = diff.size
+    tampered_regions = []
+    for x in range(width):
+        for y in range(height):
+            r, g, b = diff_pixels[x, y]
+            if r > threshold or g > threshold or b > threshold:
+                tampered_regions.append((x, y))
+    if not tampered_regions:
+        return None
+    return (
+        min(tampered_regions, key=lambda p: p[0])[0],
+        min(tampered_regions, key=lambda p: p[1])[1],
+        max(tampered_regions, key=lambda p: p[0])[0],
+        max(tampered_regions, key=lambda p: p[1])[1],
+    )
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=parse_size,
+                        default=[(320, 240), (1024, 768), (2048, 1536), (4000, 3000)])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy-max-mp", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'size':>12} {'MP':>6} {'legacy s':>10} {'numpy s':>10} {'speedup':>9} {'regions':>8}")
+    for width, height in args.sizes:
+        original = make_document(width, height)
+        recompressed = recompress(original)
+        megapixels = width * height / 1e6
+
+        fast = best_of(lambda: ela.analyze(original, recompressed), args.repeat)
+        regions = len(ela.analyze(original, recompressed)["tampered_regions"])
+
+        if megapixels <= args.legacy_max_mp:
+            slow = best_of(lambda: legacy_ela(original, recompressed), 1)
+            slow_text, speedup = f"{slow:10.3f}", f"{slow / fast:8.1f}x"
+        else:
+            slow_text, speedup = f"{'skipped':>10}", f"{'-':>9}"
+
+        print(f"{width:>5}x{height:<6} {megapixels:6.2f} {slow_text} {fast:10.4f} {speedup} {regions:8d}")
+
+
+if __name__ == "__main__":
+    main()
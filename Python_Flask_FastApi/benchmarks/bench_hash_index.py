@@ -0,0 +1,81 @@
+"""
+Benchmark: perceptual-hash index query latency against archive size.
+
+    python benchmarks/bench_hash_index.py
+    python benchmarks/bench_hash_index.py --sizes 100000 1000000 5000000 -k 4 8 12
+
+Archives are random 64-bit hashes; each query is a stored hash with a few
+bits flipped, so every query has at least one true match. Results are
+checked against a brute-force scan, and the multi-index lookup is timed
+against that linear scan.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Code"))
+
+import hash_index  # noqa: E402
+
+
+def build_index(size, seed=0):
+    rng = np.random.default_rng(seed)
+    hashes = {kind: rng.integers(0, 2 ** 64, size=size, dtype=np.uint64) for kind in hash_index.HASH_KINDS}
+    index = hash_index.HashIndex()
+    start = time.perf_counter()
+    index.add_many([str(i) for i in range(size)], hashes)
+    return index, time.perf_counter() - start
+
+
+def make_queries(index, count, flips, seed=1):
+    rng = np.random.default_rng(seed)
+    stored = index.hashes()[rng.integers(0, len(index), size=count)]
+    queries = []
+    for value in stored:
+        for bit in rng.choice(64, size=flips, replace=False):
+            value ^= np.uint64(1) << np.uint64(bit)
+        queries.append(int(value))
+    return queries
+
+
+def brute_force(index, query, k):
+    distances = np.bitwise_count(index.hashes() ^ np.uint64(query))
+    return set(np.flatnonzero(distances <= k).tolist())
+
+
+def time_queries(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("-k", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'entries':>10} {'build':>8} {'k':>3} {'index ms':>9} {'scan ms':>9} {'speedup':>8} {'recall':>7}")
+    for size in args.sizes:
+        index, build_seconds = build_index(size)
+        for k in args.k:
+            queries = make_queries(index, args.queries, flips=max(k // 2, 1))
+            found = expected = 0
+            for query in queries:
+                truth = brute_force(index, query, k)
+                hits = {int(match["id"]) for match in index.search(query, k=k, limit=len(index))}
+                found += len(hits & truth)
+                expected += len(truth)
+            index_ms = time_queries(lambda q: index.search(q, k=k), queries)
+            scan_ms = time_queries(lambda q: brute_force(index, q, k), queries)
+            print(f"{size:>10} {build_seconds:>7.2f}s {k:>3} {index_ms:>9.3f} {scan_ms:>9.3f} "
+                  f"{scan_ms / index_ms:>7.1f}x {found / expected:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: DCT-domain double-quantization analysis vs ELA on edited JPEG cards.
+
+    python benchmarks/bench_jpeg_forensics.py
+    python benchmarks/bench_jpeg_forensics.py --sizes a4-150 a4-600 --seeds 12
+
+"top hit": the largest region overlaps the edited box with IoU >= 0.3;
+"box hit": the same for tampered_box. Times are medians per page.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+
+import fixtures  # noqa: E402
+
+MIN_IOU = 0.3
+
+
+def iou(box, found):
+    """IoU of an (x, y, w, h) box with an {x1, y1, x2, y2} region (0 when nothing was found)."""
+    if not found:
+        return 0.0
+    x, y, w, h = box
+    width = max(0, min(x + w, found["x2"]) - max(x, found["x1"]))
+    height = max(0, min(y + h, found["y2"]) - max(y, found["y1"]))
+    inter = width * height
+    return inter / (w * h + (found["x2"] - found["x1"]) * (found["y2"] - found["y1"]) - inter)
+
+
+def detectors():
+    import ela
+    import jpeg_forensics
+
+    return {"ela": ela.analyze_source, "jpeg-dq": jpeg_forensics.analyze_source}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["a4-72", "a4-150", "a4-300"], choices=list(fixtures.SIZES))
+    parser.add_argument("--seeds", type=int, default=8)
+    args = parser.parse_args()
+
+    runs = detectors()
+    print(f"{'size':>7} {'detector':>8} {'s/page':>8} {'top hit':>8} {'box hit':>8} {'regions':>8}")
+    for size in args.sizes:
+        cards = [fixtures.make_fixture("card", size, seed) for seed in range(args.seeds)]
+        for name, run in runs.items():
+            times, top_hits, box_hits, regions = [], 0, 0, []
+            for card in cards:
+                start = time.perf_counter()
+                result = run(card["data"])
+                times.append(time.perf_counter() - start)
+                edited = card["truth"]["edited_box"]
+                found = result["tampered_regions"]
+                top_hits += iou(edited, found[0] if found else None) >= MIN_IOU
+                box_hits += iou(edited, result["tampered_box"]) >= MIN_IOU
+                regions.append(len(found))
+            print(f"{size:>7} {name:>8} {statistics.median(times):>8.3f} {top_hits:>4}/{len(cards):<3} "
+                  f"{box_hits:>4}/{len(cards):<3} {statistics.median(regions):>8g}")
+
+
+if __name__ == "__main__":
+    main()
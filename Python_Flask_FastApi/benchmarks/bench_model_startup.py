@@ -0,0 +1,70 @@
+"""
+Benchmark: import / first-call / warm-call cost of the tamper word classifier.
+
+    python benchmarks/bench_model_startup.py
+
+"eager" reproduces the old behaviour (the pipeline built while importing
+unilm_idp_detection); "lazy" is the model registry. Every measurement runs
+in a fresh interpreter against a tiny locally built model, so it works
+offline. Point --model at a real checkpoint to measure that instead.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.join(HERE, "..", "Code")
+
+sys.path.insert(0, HERE)
+
+from tiny_model import build_tiny_model  # noqa: E402
+
+PROBE = r"""
+import json, sys, time
+sys.path.insert(0, {code_dir!r})
+t0 = time.perf_counter()
+import unilm_idp_detection
+import model_registry
+if {eager!r}:
+    model_registry.get_classifier()
+t1 = time.perf_counter()
+unilm_idp_detection.classify_words(["name", "amount"])
+t2 = time.perf_counter()
+unilm_idp_detection.classify_words(["total", "date"])
+t3 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_call_s": t2 - t1, "warm_call_s": t3 - t2}}))
+"""
+
+
+def probe(model, eager):
+    env = dict(os.environ, IDP_CLASSIFIER_MODEL=model, HF_HUB_OFFLINE="1", TRANSFORMERS_VERBOSITY="error")
+    env.pop("IDP_INFERENCE_ADDRESS", None)
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(code_dir=CODE_DIR, eager=eager)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Local model directory (default: a tiny generated one)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    model = args.model or build_tiny_model(os.path.join(tempfile.gettempdir(), "idp-tiny-nli"))
+
+    print(f"model: {model}")
+    print(f"{'mode':>6} {'import s':>10} {'first call s':>13} {'warm call s':>12}")
+    for eager in (True, False):
+        runs = [probe(model, eager) for _ in range(args.repeat)]
+        best = {key: min(run[key] for run in runs) for key in ("import_s", "first_call_s", "warm_call_s")}
+        name = "eager" if eager else "lazy"
+        print(f"{name:>6} {best['import_s']:10.3f} {best['first_call_s']:13.3f} {best['warm_call_s']:12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: coarse-to-fine detection, recall vs speedup per scale.
+
+    python benchmarks/bench_pyramid.py
+    python benchmarks/bench_pyramid.py --pages 10 --scales 1 0.5 0.25 0.125
+
+Builds a fixture set of A4 pages at 300 dpi with planted ground truth:
+ruled tables (table detector), off-white pasted patches on a grey page
+(dark-white background detector) and never-compressed patches in a JPEG
+page (ELA regions). Each detector runs at every scale; a planted object
+counts as found when a detection overlaps it with IoU >= 0.5. Scale 1.0
+is the plain full-resolution path and the baseline for the speedup.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+sys.path.insert(0, os.path.join(HERE, "..", "images"))
+
+import bank_statement  # noqa: E402
+import ela  # noqa: E402
+import tempered  # noqa: E402
+
+PAGE_SIZE = (2480, 3508)  # A4 at 300 dpi (width, height)
+
+
+def _random_boxes(rng, count, width, height, min_size, max_size):
+    boxes = []
+    while len(boxes) < count:
+        w, h = rng.integers(min_size, max_size, size=2)
+        x, y = rng.integers(50, width - w - 50), rng.integers(50, height - h - 50)
+        if all(x + w + 40 < bx or bx + bw + 40 < x or y + h + 40 < by or by + bh + 40 < y
+               for bx, by, bw, bh in boxes):
+            boxes.append((int(x), int(y), int(w), int(h)))
+    return boxes
+
+
+def make_table_page(rng):
+    width, height = PAGE_SIZE
+    page = np.full((height, width, 3), 255, np.uint8)
+    boxes = _random_boxes(rng, 3, width, height, 300, 900)
+    for x, y, w, h in boxes:
+        for row in np.linspace(y, y + h, rng.integers(4, 12)).astype(int):
+            cv2.line(page, (x, row), (x + w, row), (0, 0, 0), 2)
+        for column in np.linspace(x, x + w, rng.integers(3, 7)).astype(int):
+            cv2.line(page, (column, y), (column, y + h), (0, 0, 0), 2)
+    return page, boxes
+
+
+def make_tamper_page(rng):
+    width, height = PAGE_SIZE
+    page = np.full((height, width, 3), 170, np.uint8)  # Grey page: not "dark white"
+    page += rng.integers(0, 8, size=page.shape, dtype=np.uint8)
+    boxes = _random_boxes(rng, 6, width, height, 60, 400)
+    for x, y, w, h in boxes:
+        page[y:y + h, x:x + w] = 225
+        cv2.putText(page, "1,234.00", (x + 5, y + h // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (20, 20, 20), 2)
+    return page, boxes
+
+
+def make_ela_page(rng):
+    width, height = PAGE_SIZE
+    base = np.full((height, width, 3), 235, np.uint8)
+    base += rng.integers(0, 12, size=base.shape, dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(base).save(buffer, format="JPEG", quality=70)
+    page = np.asarray(Image.open(buffer).convert("RGB")).copy()
+    boxes = _random_boxes(rng, 4, width, height, 40, 300)
+    for x, y, w, h in boxes:
+        page[y:y + h, x:x + w] = rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8)
+    return Image.fromarray(page), boxes
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    overlap_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    overlap_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = overlap_w * overlap_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def recall(truth, found):
+    return sum(1 for box in truth if any(iou(box, other) >= 0.5 for other in found)), len(truth)
+
+
+def detect_tables(page, scale):
+    return bank_statement.detect_table_boxes(page, scale=scale)
+
+
+def detect_patches(page, scale):
+    return tempered.dark_white_regions(page, scale=scale)
+
+
+def detect_ela(page, scale):
+    result = ela.analyze_source(page, coarse_scale=scale)
+    return [(r["x1"], r["y1"], r["x2"] - r["x1"], r["y2"] - r["y1"]) for r in result["tampered_regions"]]
+
+
+DETECTORS = {
+    "tables": (make_table_page, detect_tables),
+    "tamper": (make_tamper_page, detect_patches),
+    "ela": (make_ela_page, detect_ela),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5, help="Fixture pages per detector")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5, 0.25, 0.125])
+    parser.add_argument("--detectors", default=",".join(DETECTORS))
+    args = parser.parse_args()
+
+    print(f"{'detector':>8} {'scale':>6} {'ms/page':>9} {'speedup':>8} {'recall':>7}")
+    for name in args.detectors.split(","):
+        make_page, detect = DETECTORS[name]
+        rng = np.random.default_rng(0)
+        fixtures = [make_page(rng) for _ in range(args.pages)]
+        baseline = None
+        for scale in args.scales:
+            found = total = 0
+            start = time.perf_counter()
+            detections = [detect(page, scale) for page, _ in fixtures]
+            elapsed = (time.perf_counter() - start) / len(fixtures) * 1000
+            for (_, truth), boxes in zip(fixtures, detections):
+                hits, count = recall(truth, boxes)
+                found += hits
+                total += count
+            baseline = baseline or elapsed
+            print(f"{name:>8} {scale:>6.3f} {elapsed:>9.1f} {baseline / elapsed:>7.2f}x {found / total:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: table structure extraction throughput (pages/sec) and grid accuracy.
+
+    python benchmarks/bench_tables.py
+    python benchmarks/bench_tables.py --size a4-300 --pages 20 --workers 4
+
+Streams a multi-page TIFF of "table" fixtures through pages.analyze_pages
+with the old "tables" detector and with "structure". Without Tesseract the
+structure pass runs without cell OCR and the cell columns are left blank.
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import time
+
+import cv2
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+
+import fixtures  # noqa: E402
+import pages  # noqa: E402
+import table_structure  # noqa: E402
+
+
+def statement(size, count):
+    """A multi-page TIFF of `count` table pages and the fixtures' ground truth per page."""
+    frames, truth = [], []
+    for seed in range(count):
+        fixture = fixtures.make_fixture("table", size, seed)
+        frames.append(Image.fromarray(cv2.cvtColor(fixtures.decode(fixture), cv2.COLOR_BGR2RGB)))
+        truth.append(fixture["truth"])
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="TIFF", save_all=True, append_images=frames[1:], compression="tiff_lzw")
+    return buffer.getvalue(), truth
+
+
+def score(records, truth):
+    grids = cells = cells_ok = 0
+    for record in records:
+        expected = truth[record["page"] - 1]
+        tables = record["results"].get("structure", {}).get("tables", [])
+        grids += [[table["n_rows"], table["n_columns"]] for table in tables] == expected["grids"]
+        for table, values in zip(tables, expected["values"]):
+            if "amounts" not in table or [table["n_rows"], table["n_columns"]] != [len(values), len(values[0])]:
+                continue
+            for row, planted in zip(table["amounts"], values):
+                for found, value in zip(row, planted):
+                    cells += 1
+                    cells_ok += found == table_structure.parse_amount(value)
+    return grids, cells, cells_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="a4-150", choices=list(fixtures.SIZES))
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=pages.DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    data, truth = statement(args.size, args.pages)
+    read_text = shutil.which("tesseract") is not None
+    if not read_text:
+        print("tesseract not installed: structure runs without cell OCR")
+        pages.PAGE_ANALYZERS["structure"] = lambda image: {
+            "tables": table_structure.extract_tables(image, read_text=False)}
+
+    print(f"{args.pages} pages of {args.size}, {args.workers} workers")
+    print(f"{'analyzer':>10} {'seconds':>8} {'pages/s':>8} {'grids ok':>9} {'cells ok':>9}")
+    for analyzer in ("tables", "structure"):
+        start = time.perf_counter()
+        records = list(pages.analyze_pages(data, [analyzer], workers=args.workers))
+        elapsed = time.perf_counter() - start
+        errors = [record["errors"] for record in records if record["errors"]]
+        if errors:
+            print(f"{analyzer}: {errors[0]}")
+        if analyzer == "structure":
+            grids, cells, cells_ok = score(records, truth)
+            grid_text = f"{grids}/{len(records)}"
+            cell_text = f"{cells_ok}/{cells}" if read_text else "-"
+        else:
+            grid_text = cell_text = "-"
+        print(f"{analyzer:>10} {elapsed:>8.2f} {len(records) / elapsed:>8.2f} {grid_text:>9} {cell_text:>9}")
+
+
+if __name__ == "__main__":
+    main()
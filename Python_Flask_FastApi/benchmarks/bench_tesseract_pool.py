@@ -0,0 +1,116 @@
+"""
+Benchmark: OCR calls per second, a tesseract process per call vs the engine pool.
+
+    python benchmarks/bench_tesseract_pool.py
+    python benchmarks/bench_tesseract_pool.py --size a4-300 --threads 1 4 --crops 400
+
+Workloads: whole "page"s (--psm 3) and single table cells ("crop", --psm 6).
+"same": calls whose words equal the subprocess run's; "correct": cells read
+as the value printed in them. A backend that is not installed is skipped.
+"""
+import argparse
+import concurrent.futures
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytesseract
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+
+import fixtures  # noqa: E402
+import tesseract_pool  # noqa: E402
+
+CONFIGS = {"page": "--psm 3", "crop": "--psm 6"}
+
+
+def workloads(size, pages, crops):
+    """{"page": [(gray page, None)], "crop": [(gray cell, printed value)]}."""
+    page_images, cells = [], []
+    seed = 0
+    while len(page_images) < pages or len(cells) < crops:
+        fixture = fixtures.make_fixture("table", size, seed)
+        seed += 1
+        page = cv2.cvtColor(fixtures.decode(fixture), cv2.COLOR_BGR2GRAY)
+        if len(page_images) < pages:
+            page_images.append((page, None))
+        truth = fixture["truth"]
+        for (x, y, w, h), (rows, columns), values in zip(truth["tables"], truth["grids"], truth["values"]):
+            xs = np.linspace(x, x + w, columns + 1).astype(int)
+            ys = np.linspace(y, y + h, rows + 1).astype(int)
+            for row in range(rows):
+                for column in range(columns):
+                    # Inset past the ruling so a cell holds only its text
+                    inset = max(2, (ys[1] - ys[0]) // 10)
+                    cell = page[ys[row] + inset:ys[row + 1] - inset, xs[column] + inset:xs[column + 1] - inset]
+                    cells.append((cell.copy(), values[row][column]))
+    return {"page": page_images, "crop": cells[:crops]}
+
+
+def words(data):
+    return [word.strip() for word, conf in zip(data["text"], data["conf"]) if float(conf) >= 0 and word.strip()]
+
+
+def subprocess_call(image, config):
+    return pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+
+
+def run(call, images, config, threads):
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(lambda item: words(call(item[0], config)), images))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="a4-150", choices=list(fixtures.SIZES))
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--crops", type=int, default=200)
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    backends = {}
+    if shutil.which(pytesseract.pytesseract.tesseract_cmd):
+        backends["subprocess"] = subprocess_call
+    else:
+        print("tesseract not installed: subprocess skipped")
+    if tesseract_pool.available():
+        backends["pool"] = lambda image, config: tesseract_pool.get_pool().run(image, config=config)
+    else:
+        print("tesserocr not installed: pool skipped (pip install tesserocr)")
+    if not backends:
+        return
+
+    data = workloads(args.size, args.pages, args.crops)
+    if "pool" in backends:
+        start = time.perf_counter()
+        for config in CONFIGS.values():
+            tesseract_pool.get_pool().warm(config=config, count=max(args.threads))
+        print(f"pool warm-up: {tesseract_pool.get_pool().stats()['engines']} engines "
+              f"in {time.perf_counter() - start:.2f} s")
+
+    print(f"{'workload':>8} {'backend':>10} {'threads':>7} {'calls':>6} {'seconds':>8} {'calls/s':>8} "
+          f"{'same':>6} {'correct':>8}")
+    for workload, images in data.items():
+        for threads in args.threads:
+            reference = None
+            for name, call in backends.items():
+                results, seconds = run(call, images, CONFIGS[workload], threads)
+                reference = reference or results
+                same = sum(result == expected for result, expected in zip(results, reference)) / len(results)
+                correct = ""
+                if workload == "crop":
+                    hits = sum(" ".join(result) == value for result, (_, value) in zip(results, images))
+                    correct = f"{hits / len(images):.1%}"
+                print(f"{workload:>8} {name:>10} {threads:>7} {len(images):>6} {seconds:>8.2f} "
+                      f"{len(images) / seconds:>8.1f} {same:>6.1%} {correct:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: full-page vs tiled (bounded-memory) pixel analyzers, peak memory and time.
+
+    python benchmarks/bench_tiles.py                      # A3 at 600 dpi
+    python benchmarks/bench_tiles.py --size 4960x7016 --budget-mb 32
+
+Each (analyzer, mode) runs in a fresh process; "delta" is the peak RSS above
+the resident size when the analysis started. The spill goes to
+IDP_TILE_SPILL_DIR, which should be disk-backed (a tmpfs counts as memory).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+sys.path.insert(0, os.path.join(HERE, "..", "images"))
+
+import fixtures  # noqa: E402
+import suite  # noqa: E402
+
+A3_600DPI = (7016, 9921)
+
+
+def run_mode(args):
+    analyzer, tiled, size, budget_mb = args
+    import ela
+    import tempered
+
+    fixture = fixtures.make_fixture("card", size)
+    page = fixtures.decode(fixture) if analyzer == "tamper" else fixture["data"]
+    rss_before = suite.rss_mb()
+    suite.reset_peak_rss()
+
+    start = time.perf_counter()
+    if analyzer == "ela":
+        if tiled:
+            result = ela.analyze_tiled(page, budget_mb=budget_mb)
+        else:
+            result = ela.analyze_source(page, tiled=False)
+        found = result["tampered_regions"]
+        tiles_used = result.get("tiles", 1)
+    else:
+        if tiled:
+            found = tempered.dark_white_regions_tiled(page, budget_mb=budget_mb)
+        else:
+            found = tempered.dark_white_regions(page)
+        tiles_used = None
+    elapsed = time.perf_counter() - start
+
+    peak = suite.peak_rss_mb()
+    return {"analyzer": analyzer, "mode": "tiled" if tiled else "full", "seconds": elapsed, "tiles": tiles_used,
+            "rss_before_mb": rss_before, "peak_rss_mb": peak, "found": found}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default=f"{A3_600DPI[0]}x{A3_600DPI[1]}", help="Page WIDTHxHEIGHT in pixels")
+    parser.add_argument("--budget-mb", type=float, default=64, help="Working memory per tile")
+    parser.add_argument("--analyzers", nargs="+", default=["ela", "tamper"], choices=["ela", "tamper"])
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+
+    cases = [(name, tiled, size, args.budget_mb) for name in args.analyzers for tiled in (False, True)]
+    print(f"{size[0]}x{size[1]} ({size[0] * size[1] / 1e6:.0f} MP), tile budget {args.budget_mb:g} MB")
+    print(f"{'analyzer':>8} {'mode':>6} {'seconds':>8} {'tiles':>6} {'peak MB':>8} {'delta MB':>9} {'found':>6} {'same':>5}")
+    full = {}
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(run_mode, cases, chunksize=1):
+            name = result["analyzer"]
+            if result["mode"] == "full":
+                full[name] = result["found"]
+                same = ""
+            else:
+                same = "yes" if result["found"] == full.get(name) else "NO"
+            delta = result["peak_rss_mb"] - (result["rss_before_mb"] or 0)
+            print(f"{name:>8} {result['mode']:>6} {result['seconds']:>8.2f} {result['tiles'] or '-':>6} "
+                  f"{result['peak_rss_mb']:>8.0f} {delta:>9.0f} {len(result['found']):>6} {same:>5}")
+
+
+if __name__ == "__main__":
+    main()
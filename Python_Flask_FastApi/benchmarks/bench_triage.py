@@ -0,0 +1,99 @@
+"""
+Benchmark: the triage cascade vs running every check on every document.
+
+    python benchmarks/bench_triage.py
+    python benchmarks/bench_triage.py --size a4-300 --count 10
+
+The batch mixes edited cards with and without an editor EXIF tag and table
+pages on and off the originals index. "full" runs every check, "cascade" is
+the id_card policy. Without Tesseract the OCR checks are priced at
+triage.ESTIMATED_SECONDS.
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import piexif
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+
+import fixtures  # noqa: E402
+import hash_index  # noqa: E402
+import triage  # noqa: E402
+from document import Document  # noqa: E402
+
+EXPECTED = {"editor": "tampered", "known": "original", "edited": "tampered", "unknown": None}
+
+
+def with_software(data, software):
+    exif = piexif.dump({"0th": {piexif.ImageIFD.Software: software.encode()}})
+    output = io.BytesIO()
+    piexif.insert(exif, data, output)
+    return output.getvalue()
+
+
+def batch(size, count, index_path):
+    documents = []
+    index = hash_index.HashIndex(index_path)
+    for seed in range(count):
+        card = fixtures.make_fixture("card", size, seed)
+        documents.append(("editor", with_software(card["data"], "Adobe Photoshop 25.1 (Windows)")))
+        documents.append(("edited", fixtures.make_fixture("card", size, seed + count)["data"]))
+        known = fixtures.make_fixture("table", size, seed)["data"]
+        index.add(f"table-{seed}", Document(known).pil)
+        documents.append(("known", known))
+        documents.append(("unknown", fixtures.make_fixture("table", size, seed + 1000)["data"]))
+    index.save()
+    index.close()
+    return documents
+
+
+def run(documents, policies, index_path):
+    results = []
+    start = time.perf_counter()
+    for _, data in documents:
+        results.append(triage.triage(data, doc_type="id_card", policies=policies, originals_index=index_path))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="a4-150", choices=list(fixtures.SIZES))
+    parser.add_argument("--count", type=int, default=5, help="Documents of each kind")
+    args = parser.parse_args()
+
+    if shutil.which("tesseract") is None:
+        print("tesseract not installed: checks that OCR fail, and what skipping them saves is estimated")
+    folder = tempfile.mkdtemp()
+    try:
+        index_path = os.path.join(folder, "originals.npz")
+        documents = batch(args.size, args.count, index_path)
+        cascade = triage.load_policies()
+        full = dict(cascade, id_card=dict(cascade["id_card"], tampered=2.0, original=2.0))
+
+        print(f"{len(documents)} documents of {args.size}")
+        print(f"{'run':>8} {'wall s':>7} {'spent s':>8} {'saved s':>8} {'saved':>6} {'correct':>8}  decided by")
+        for name, policies in (("full", full), ("cascade", cascade)):
+            results, wall = run(documents, policies, index_path)
+            summary = triage.summarize(results)
+            # Unknown pages carry no planted edit: only the other kinds are scored
+            scored = [(EXPECTED[kind], result["verdict"]) for (kind, _), result in zip(documents, results)
+                      if EXPECTED[kind]]
+            correct = sum(expected == verdict for expected, verdict in scored)
+            decided = ", ".join(f"{check}={count}" for check, count in sorted(summary["decided_by"].items()))
+            print(f"{name:>8} {wall:>7.2f} {summary['spent_s']:>8.2f} {summary['saved_s']:>8.2f} "
+                  f"{summary['saved_fraction']:>6.0%} {correct:>4}/{len(scored):<3}  {decided}")
+        if summary["estimated_costs"]:
+            print(f"saved time on {', '.join(summary['estimated_costs'])} is estimated, not measured")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: word diff engine vs difflib on dense documents.
+
+    python benchmarks/bench_word_diff.py
+    python benchmarks/bench_word_diff.py --words 1000 10000 100000 --edit-rate 0.01
+
+Each "document" is a word sequence drawn from a statement-like vocabulary
+(lots of repeated words, unique amounts); the suspect copy has a fraction
+of its words replaced, inserted or deleted. Reports diff time and how many
+of the planted edits were reported.
+"""
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Code"))
+
+import word_diff  # noqa: E402
+
+VOCABULARY = ["Date", "Description", "Amount", "Balance", "Credit", "Debit", "UPI", "NEFT", "transfer",
+              "to", "from", "Rs", "INR", "salary", "rent", "ATM", "withdrawal", "Total", "Opening", "Closing"]
+
+
+def make_document(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) if rng.random() < 0.7 else f"{rng.randint(1, 99999)}.{rng.randint(0, 99):02d}"
+            for _ in range(count)]
+
+
+def tamper(words, rate, seed=1):
+    rng = random.Random(seed)
+    tampered = list(words)
+    edits = max(int(len(words) * rate), 1)
+    for _ in range(edits):
+        position = rng.randrange(len(tampered))
+        action = rng.random()
+        if action < 0.6:
+            tampered[position] = f"{rng.randint(1, 99999)}.{rng.randint(0, 99):02d}"
+        elif action < 0.8:
+            tampered.insert(position, f"{rng.randint(1, 99999)}.{rng.randint(0, 99):02d}")
+        else:
+            del tampered[position]
+    return tampered, edits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, nargs="+", default=[1000, 10000, 50000, 200000])
+    parser.add_argument("--edit-rate", type=float, default=0.005)
+    parser.add_argument("--difflib-max", type=int, default=50000, help="Skip difflib above this many words")
+    args = parser.parse_args()
+
+    print(f"{'words':>8} {'edits':>6} {'diff s':>8} {'words/s':>10} {'reported':>9} {'difflib s':>10}")
+    for count in args.words:
+        original = make_document(count)
+        tampered, edits = tamper(original, args.edit_rate)
+
+        start = time.perf_counter()
+        result = word_diff.diff_ocr(" ".join(original), " ".join(tampered))
+        elapsed = time.perf_counter() - start
+
+        reference = "-"
+        if count <= args.difflib_max:
+            start = time.perf_counter()
+            difflib.SequenceMatcher(None, original, tampered, autojunk=False).get_opcodes()
+            reference = f"{time.perf_counter() - start:.3f}"
+
+        print(f"{count:>8} {edits:>6} {elapsed:>8.3f} {count / elapsed:>10.0f} {len(result['changes']):>9} {reference:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Synthetic forged-document fixtures (card, table, qr, aadhaar), generated deterministically.
+
+    python benchmarks/fixtures.py /tmp/fixtures
+    python benchmarks/fixtures.py /tmp/fixtures --sizes thumb a4-300 --seed 3
+
+Every fixture carries its ground truth (edited box, table boxes, QR payload)
+so the benchmarks can check that a faster path still finds the same things.
+"""
+import argparse
+import gzip
+import json
+import os
+
+import cv2
+import numpy as np
+
+SIZES = {
+    "thumb": (248, 351),
+    "a4-72": (595, 842),
+    "a4-150": (1240, 1754),
+    "a4-300": (2480, 3508),
+    "a4-600": (4960, 7016),
+}
+FIRST_QUALITIES = (70, 75, 80, 85)  # Quality of the "original" save
+RESAVE_QUALITIES = (90, 95)  # Quality of the save after the edit
+
+NAMES = ["Ravi Kumar", "Anita Sharma", "Suresh Patel", "Meena Iyer", "Arjun Singh", "Kavya Nair"]
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _text(image, text, x, y, scale, thickness=None, color=(20, 20, 20)):
+    thickness = thickness or max(1, int(round(scale * 2)))
+    cv2.putText(image, text, (int(x), int(y)), FONT, scale, color, thickness, cv2.LINE_AA)
+    (width, height), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+    return int(x), int(y) - height, width, height + baseline
+
+
+def _encode(image, ext, quality=None):
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if quality else []
+    ok, encoded = cv2.imencode(ext, image, params)
+    if not ok:
+        raise ValueError(f"Could not encode {ext}")
+    return encoded.tobytes()
+
+
+def _decode(data):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def make_card(width, height, rng):
+    """An ID card whose name was edited after the first JPEG save."""
+    unit = width / 1000.0
+    card = np.empty((height, width, 3), np.uint8)
+    card[:] = (235, 215, 190)  # Light blue: saturated enough not to read as "dark white"
+    card += rng.integers(0, 6, size=card.shape, dtype=np.uint8)
+
+    _text(card, "GOVERNMENT OF INDIA", 60 * unit, 90 * unit, 1.6 * unit)
+    photo = (int(60 * unit), int(160 * unit), int(220 * unit), int(280 * unit))
+    cv2.rectangle(card, photo[:2], (photo[0] + photo[2], photo[1] + photo[3]), (120, 120, 120), -1)
+
+    x = 320 * unit
+    name, new_name = rng.choice(NAMES, size=2, replace=False)
+    _text(card, "Name:", x, 200 * unit, 1.0 * unit)
+    name_box = _text(card, str(name), x + 130 * unit, 200 * unit, 1.0 * unit)
+    _text(card, f"DOB: {rng.integers(1, 28):02d}/{rng.integers(1, 12):02d}/{rng.integers(1950, 2005)}",
+          x, 270 * unit, 1.0 * unit)
+    _text(card, str(rng.choice(["Male", "Female"])), x, 340 * unit, 1.0 * unit)
+    number = " ".join(f"{n:04d}" for n in rng.integers(0, 10000, size=3))
+    _text(card, number, 250 * unit, height - 80 * unit, 1.4 * unit)
+
+    first_quality = int(rng.choice(FIRST_QUALITIES))
+    forged = _decode(_encode(card, ".jpg", first_quality))
+
+    # The edit: an off-white patch over the old name, with the new one typed on it
+    pad = max(2, int(8 * unit))
+    bx, by, bw, bh = name_box
+    patch = (bx - pad, by - pad, max(bw, cv2.getTextSize(str(new_name), FONT, 1.0 * unit, 1)[0][0]) + 2 * pad, bh + 2 * pad)
+    px, py, pw, ph = patch
+    forged[py:py + ph, px:px + pw] = 232
+    _text(forged, str(new_name), bx, 200 * unit, 1.0 * unit)
+
+    resave_quality = int(rng.choice(RESAVE_QUALITIES))
+    return {
+        "kind": "card",
+        "format": ".jpg",
+        "data": _encode(forged, ".jpg", resave_quality),
+        "size": [width, height],
+        "truth": {"edited_box": list(patch), "original_name": str(name), "edited_name": str(new_name),
+                  "qualities": [first_quality, resave_quality]},
+    }
+
+
+def make_table_page(width, height, rng):
+    """A statement page with one to three ruled tables of text cells."""
+    unit = width / 1000.0
+    page = np.full((height, width, 3), 255, np.uint8)
+    _text(page, "ACCOUNT STATEMENT", 60 * unit, 80 * unit, 1.2 * unit)
+
+    boxes, grids, values = [], [], []
+    top = 140 * unit
+    for _ in range(int(rng.integers(1, 4))):
+        rows, columns = int(rng.integers(4, 12)), int(rng.integers(3, 6))
+        row_height = 45 * unit
+        x, y, w, h = int(60 * unit), int(top), int(880 * unit), int(rows * row_height)
+        if y + h > height - 40 * unit:
+            break
+        thickness = max(1, int(round(2 * unit)))
+        for row in np.linspace(y, y + h, rows + 1).astype(int):
+            cv2.line(page, (x, row), (x + w, row), (0, 0, 0), thickness)
+        for column in np.linspace(x, x + w, columns + 1).astype(int):
+            cv2.line(page, (column, y), (column, y + h), (0, 0, 0), thickness)
+        table_values = []
+        for row in range(rows):
+            table_values.append([])
+            for column in range(columns):
+                value = f"{rng.integers(1, 99999):,}.{rng.integers(0, 100):02d}"
+                _text(page, value, x + column * w / columns + 8 * unit, y + (row + 0.7) * row_height, 0.6 * unit)
+                table_values[-1].append(value)
+        boxes.append([x, y, w, h])
+        grids.append([rows, columns])
+        values.append(table_values)
+        top = y + h + 80 * unit
+
+    return {"kind": "table", "format": ".png", "data": _encode(page, ".png"), "size": [width, height],
+            "truth": {"tables": boxes, "grids": grids, "values": values}}
+
+
+def make_qr_page(width, height, rng):
+    """A page with some text and one embedded QR code, JPEG-saved."""
+    unit = width / 1000.0
+    page = np.full((height, width, 3), 250, np.uint8)
+    _text(page, "e-KYC DOCUMENT", 60 * unit, 80 * unit, 1.2 * unit)
+    for line in range(6):
+        _text(page, f"Reference {rng.integers(10 ** 7, 10 ** 8)}", 60 * unit, (160 + 50 * line) * unit, 0.8 * unit)
+
+    payload = f"name={rng.choice(NAMES)};uid=XXXX-XXXX-{rng.integers(0, 10000):04d};dob={rng.integers(1950, 2005)}"
+    params = cv2.QRCodeEncoder_Params()
+    params.correction_level = cv2.QRCodeEncoder_CORRECT_LEVEL_M
+    modules = cv2.QRCodeEncoder.create(params).encode(payload)  # One pixel per module, quiet zone included
+    side = max(modules.shape[0] * 2, int(300 * unit))
+    code = cv2.resize(modules, (side, side), interpolation=cv2.INTER_NEAREST)
+    x, y = width - side - int(60 * unit), max(0, int(140 * unit))
+    side = min(side, height - y)
+    page[y:y + side, x:x + side] = code[:side, :side, None]
+
+    quality = int(rng.choice(RESAVE_QUALITIES))
+    return {"kind": "qr", "format": ".jpg", "data": _encode(page, ".jpg", quality), "size": [width, height],
+            "truth": {"payload": payload, "box": [x, y, side, side]}}
+
+
+def _secure_qr(fields, photo, signature):
+    # The secure QR layout: "V2", 0xFF-separated text fields, photo, signature; gzip, then a decimal big integer
+    data = b"\xff".join([b"V2"] + [field.encode("latin-1") for field in fields]) + b"\xff" + photo + signature
+    return str(int.from_bytes(gzip.compress(data, mtime=0), "big"))
+
+
+def make_aadhaar_card(width, height, rng):
+    """An Aadhaar-style card whose secure QR code carries the printed details."""
+    unit = width / 1000.0
+    card = np.full((height, width, 3), 248, np.uint8)
+    _text(card, "GOVERNMENT OF INDIA", 60 * unit, 90 * unit, 1.6 * unit)
+    photo = (int(60 * unit), int(160 * unit), int(220 * unit), int(280 * unit))
+    cv2.rectangle(card, photo[:2], (photo[0] + photo[2], photo[1] + photo[3]), (120, 120, 120), -1)
+
+    name = str(rng.choice(NAMES))
+    dob = f"{rng.integers(1, 28):02d}/{rng.integers(1, 12):02d}/{rng.integers(1950, 2005)}"
+    gender = str(rng.choice(["Male", "Female"]))
+    number = [f"{n:04d}" for n in rng.integers(0, 10000, size=3)]
+    x = 320 * unit
+    _text(card, name, x, 200 * unit, 1.0 * unit)
+    _text(card, f"DOB: {dob}", x, 260 * unit, 0.9 * unit)
+    _text(card, gender.upper(), x, 320 * unit, 0.9 * unit)
+    _text(card, f"XXXX XXXX {number[2]}", 250 * unit, height - 80 * unit, 1.4 * unit)
+
+    reference = number[2] + "20190101120000123"
+    fields = ["0", reference, name, dob.replace("/", "-"), gender[0], "S/O Ramesh", "Pune", "", "12", "Kothrud",
+              "411038", "Kothrud", "Maharashtra", "MG Road", "Haveli", "Pune", "1234"]
+    payload = _secure_qr(fields, rng.integers(0, 256, size=300, dtype=np.uint8).tobytes(),
+                         rng.integers(0, 256, size=256, dtype=np.uint8).tobytes())
+    modules = cv2.QRCodeEncoder.create().encode(payload)
+    side = min(max(modules.shape[0] * 3, int(320 * unit)), height - int(40 * unit), width // 3)
+    code = cv2.resize(modules, (side, side), interpolation=cv2.INTER_NEAREST)
+    qx, qy = width - side - int(40 * unit), int(20 * unit)
+    card[qy:qy + side, qx:qx + side] = code[:, :, None]
+
+    quality = int(rng.choice(RESAVE_QUALITIES))
+    return {"kind": "aadhaar", "format": ".jpg", "data": _encode(card, ".jpg", quality), "size": [width, height],
+            "truth": {"payload": payload, "box": [qx, qy, side, side], "name": name, "dob": dob, "gender": gender,
+                      "aadhaar_last4": number[2]}}
+
+
+KINDS = {"card": make_card, "table": make_table_page, "qr": make_qr_page, "aadhaar": make_aadhaar_card}
+
+
+def make_fixture(kind, size, seed=0):
+    """The fixture of `kind` at `size` (a SIZES name or a (width, height) pair) for `seed`."""
+    width, height = SIZES[size] if isinstance(size, str) else size
+    return KINDS[kind](width, height, np.random.default_rng(seed))
+
+
+def decode(fixture):
+    """The fixture as a BGR array, as cv2.imread would return it."""
+    return _decode(fixture["data"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir")
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--kinds", nargs="+", default=list(KINDS), choices=list(KINDS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = []
+    for kind in args.kinds:
+        for size in args.sizes:
+            fixture = make_fixture(kind, size, args.seed)
+            filename = f"{kind}-{size}{fixture['format']}"
+            with open(os.path.join(args.output_dir, filename), "wb") as output:
+                output.write(fixture["data"])
+            manifest.append({"file": filename, "kind": kind, "size": fixture["size"], "truth": fixture["truth"]})
+            print(f"{filename}: {len(fixture['data']) / 1024:.0f} KiB")
+    with open(os.path.join(args.output_dir, "truth.json"), "w") as output:
+        json.dump(manifest, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
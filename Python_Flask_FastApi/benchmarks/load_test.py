@@ -0,0 +1,88 @@
+"""
+Load test for the HTTP analyzers (Flask apps or the FastAPI service).
+
+    # FastAPI:  cd Code && uvicorn api:app --port 8000
+    python benchmarks/load_test.py http://localhost:8000/verify-code images/idcard.jpg --field image
+    # Flask:    cd Code && python text_extraction.py
+    python benchmarks/load_test.py http://localhost:5000/verify-code images/idcard.jpg --field image
+
+Sends --requests uploads with --concurrency in flight and reports
+throughput, p50/p90/p99 latency and the status-code mix (429s show the
+service shedding load instead of queueing without bound).
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import time
+
+import httpx
+import numpy as np
+
+
+async def worker(client, url, field, filename, payload, queue, latencies, statuses):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, files={field: (filename, payload)})
+            statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(url, path, field, requests, concurrency, timeout):
+    with open(path, "rb") as file:
+        payload = file.read()
+
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    latencies = []
+    statuses = collections.Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, url, field, os.path.basename(path), payload, queue, latencies, statuses)
+            for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+
+    values = np.array(latencies) * 1000
+    return {
+        "url": url,
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p90_ms": round(float(np.percentile(values, 90)), 1),
+        "p99_ms": round(float(np.percentile(values, 99)), 1),
+        "statuses": {str(code): count for code, count in statuses.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url")
+    parser.add_argument("file", help="Document to upload")
+    parser.add_argument("--field", default="file", help="Multipart field name (verify-code uses 'image')")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        result = asyncio.run(run(args.url, args.file, args.field, args.requests, concurrency, args.timeout))
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
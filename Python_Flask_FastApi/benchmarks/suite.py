@@ -0,0 +1,259 @@
+"""
+Benchmark suite: every analyzer over synthetic fixtures, thumbnail to A4 at 600 dpi.
+
+    python benchmarks/suite.py                       # run and compare with the baseline
+    python benchmarks/suite.py --save                # run and record a new baseline
+    python benchmarks/suite.py --analyzers ela tables --sizes thumb a4-300 --repeat 5
+
+Each case runs in a fresh process (median/p95/cold latency, throughput, RSS
+and peak). Exits 1 when a median or peak RSS grew past --threshold compared
+with the baseline, which is only meaningful on the machine that recorded it.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Code"))
+sys.path.insert(0, os.path.join(HERE, "..", "images"))
+
+import fixtures  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+LATENCY_MARGIN = 0.005  # Seconds a case may grow by regardless of the threshold
+RSS_MARGIN_MB = 16.0
+
+
+def _require_tesseract():
+    import pytesseract
+    pytesseract.get_tesseract_version()
+
+
+def _require_zbar():
+    import pyzbar.pyzbar  # noqa: F401  (raises ImportError when the zbar library is missing)
+
+
+def _run_ela(fixture):
+    import detect_based_on_pixel
+    result = detect_based_on_pixel.error_level_analysis(fixture["data"], output_dir=None)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+
+def _run_tamper(fixture):
+    import tempered
+    return tempered.detect_tampering(fixtures.decode(fixture))
+
+
+def _run_tables(fixture):
+    import bank_statement
+    return bank_statement.process_image(fixtures.decode(fixture))
+
+
+def _run_barcode(fixture):
+    import text_extraction
+    return text_extraction.detect_and_verify_barcode(fixture["data"], {})
+
+
+def _run_words(fixture):
+    import unilm_idp_detection
+    return unilm_idp_detection.find_words_coords(fixtures.decode(fixture))
+
+
+# name -> (fixture kind, native dependency check, call)
+ANALYZERS = {
+    "ela": ("card", None, _run_ela),
+    "tamper": ("card", _require_tesseract, _run_tamper),
+    "tables": ("table", None, _run_tables),
+    "barcode": ("qr", _require_zbar, _run_barcode),
+    "words": ("card", _require_tesseract, _run_words),
+}
+
+
+def status_kb(field):
+    # Linux only; None elsewhere
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Resets VmHWM so the peak only covers the timed run (Linux 4.0+); best effort elsewhere
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    peak = status_kb("VmHWM")
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 1024 if sys.platform == "darwin" else peak  # Bytes on macOS, KiB on Linux
+    return peak / 1024.0
+
+
+def rss_mb():
+    rss = status_kb("VmRSS")
+    return rss / 1024.0 if rss is not None else None
+
+
+def run_case(args):
+    """One (analyzer, size) case; runs in its own process."""
+    name, size, repeat, seed = args
+    kind, requires, call = ANALYZERS[name]
+    case = {"analyzer": name, "size": size}
+    try:
+        if requires is not None:
+            requires()
+    except Exception as e:
+        return dict(case, skipped=f"{type(e).__name__}: {e}")
+
+    os.chdir(tempfile.mkdtemp(prefix="idp-bench-"))  # Analyzers that write outputs write them here
+    fixture = fixtures.make_fixture(kind, size, seed)
+    width, height = fixture["size"]
+
+    quiet = io.StringIO()
+    timings = []
+    try:
+        with contextlib.redirect_stdout(quiet):
+            start = time.perf_counter()
+            call(fixture)  # Cold: imports the analyzer and loads anything it loads lazily
+            cold = time.perf_counter() - start
+            rss_before = rss_mb()
+            reset_peak_rss()
+            ocr = sys.modules.get("ocr")
+            for _ in range(repeat):
+                if ocr is not None:
+                    ocr.clear_cache()  # Time real OCR, not the LRU cache
+                start = time.perf_counter()
+                call(fixture)
+                timings.append(time.perf_counter() - start)
+    except Exception as e:
+        return dict(case, error=f"{type(e).__name__}: {e}")
+
+    median = float(np.median(timings))
+    return dict(
+        case,
+        width=width,
+        height=height,
+        input_kib=round(len(fixture["data"]) / 1024, 1),
+        runs=len(timings),
+        cold_s=round(cold, 5),
+        median_s=round(median, 5),
+        p95_s=round(float(np.percentile(timings, 95)), 5),
+        pages_per_s=round(1 / median, 3) if median else None,
+        megapixels_per_s=round(width * height / 1e6 / median, 3) if median else None,
+        rss_before_mb=round(rss_before, 1) if rss_before is not None else None,
+        peak_rss_mb=round(peak_rss_mb(), 1),
+    )
+
+
+def run_suite(analyzers, sizes, repeat=3, seed=0):
+    cases = [(name, size, repeat, seed) for name in analyzers for size in sizes]
+    # A fresh process per case: peak RSS and import state never leak between cases
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(run_case, cases, chunksize=1):
+            yield result
+
+
+def _key(case):
+    return f"{case['analyzer']}@{case['size']}"
+
+
+def compare(results, baseline, threshold):
+    """Regressions of `results` against the baseline cases: a list of messages."""
+    previous = {_key(case): case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in results:
+        old = previous.get(_key(case))
+        if old is None or "median_s" not in case or "median_s" not in old:
+            continue
+        checks = (("median_s", LATENCY_MARGIN, "s"), ("peak_rss_mb", RSS_MARGIN_MB, " MB"))
+        for field, margin, unit in checks:
+            new_value, old_value = case.get(field), old.get(field)
+            if new_value is None or old_value is None:
+                continue
+            if new_value > old_value * (1 + threshold) and new_value - old_value > margin:
+                regressions.append(f"{_key(case)} {field}: {old_value}{unit} -> {new_value}{unit} "
+                                   f"(+{(new_value / old_value - 1) * 100:.0f}%)")
+    return regressions
+
+
+def _machine():
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analyzers", nargs="+", default=list(ANALYZERS), choices=list(ANALYZERS))
+    parser.add_argument("--sizes", nargs="+", default=list(fixtures.SIZES), choices=list(fixtures.SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (after the cold call)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative growth (0.2 = 20%%)")
+    parser.add_argument("--output", help="Also write this run's results to a JSON file")
+    args = parser.parse_args()
+
+    print(f"{'analyzer':>8} {'size':>7} {'median ms':>10} {'p95 ms':>9} {'cold ms':>9} "
+          f"{'pages/s':>8} {'MP/s':>7} {'peak MB':>8}")
+    results = []
+    for case in run_suite(args.analyzers, args.sizes, max(1, args.repeat), args.seed):
+        results.append(case)
+        label = f"{case['analyzer']:>8} {case['size']:>7}"
+        if "skipped" in case or "error" in case:
+            status = "skipped" if "skipped" in case else "error"
+            print(f"{label} {status}: {case.get('skipped') or case.get('error')}")
+            continue
+        print(f"{label} {case['median_s'] * 1000:>10.1f} {case['p95_s'] * 1000:>9.1f} {case['cold_s'] * 1000:>9.1f} "
+              f"{case['pages_per_s']:>8.2f} {case['megapixels_per_s']:>7.1f} {case['peak_rss_mb']:>8.1f}")
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "machine": _machine(), "seed": args.seed,
+              "repeat": args.repeat, "cases": results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.save:
+        with open(args.baseline, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to record one")
+        return 0
+    with open(args.baseline) as source:
+        baseline = json.load(source)
+    if baseline.get("machine") != _machine():
+        print("Warning: the baseline was recorded on a different machine or Python")
+    regressions = compare(results, baseline, args.threshold)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Build a tiny, randomly initialised BART zero-shot (NLI) model on disk.
+
+The benchmarks use it instead of facebook/bart-large-mnli so they run
+offline and in seconds. Its predictions are meaningless; only cost and
+agreement between backends are measured with it.
+
+With train_steps the model is first fitted to a made-up rule (TAMPERED
+words are "tampered", the rest "original"). A random network's scores
+are near ties that any rounding flips; a trained one has the margins of a
+real checkpoint, so quantization agreement and accuracy mean something.
+
+    python benchmarks/tiny_model.py /tmp/tiny-nli
+"""
+import os
+import sys
+
+WORDS = (
+    "this example is tampered original name date amount total balance bank account "
+    "credit debit government india aadhaar male female dob address pin year of birth"
+).split()
+VOCABULARY = WORDS + [str(digit) for digit in range(10)]
+TAMPERED = set(VOCABULARY[::2])  # The made-up rule train_steps fits
+
+
+def expected_label(word):
+    return "tampered" if word in TAMPERED else "original"
+
+
+def build_tiny_model(path, d_model=64, layers=2, seed=0, train_steps=0):
+    """
+    Write a tiny BART sequence-classification model + tokenizer to `path`
+    (once), fitted to expected_label() for `train_steps` steps if given.
+    """
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import BartConfig, BartForSequenceClassification, PreTrainedTokenizerFast
+
+    torch.manual_seed(seed)
+    vocab = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3}
+    for word in VOCABULARY:
+        vocab.setdefault(word, len(vocab))
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A </s>",
+        pair="<s> $A </s> </s> $B </s>",
+        special_tokens=[("<s>", 0), ("</s>", 2)],
+    )
+    fast_tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>",
+        pad_token="<pad>", unk_token="<unk>", model_max_length=128,
+    )
+
+    config = BartConfig(
+        vocab_size=len(vocab), d_model=d_model,
+        encoder_layers=layers, decoder_layers=layers,
+        encoder_attention_heads=4, decoder_attention_heads=4,
+        encoder_ffn_dim=d_model * 4, decoder_ffn_dim=d_model * 4,
+        max_position_embeddings=128, num_labels=3,
+        id2label={0: "contradiction", 1: "neutral", 2: "entailment"},
+        label2id={"contradiction": 0, "neutral": 1, "entailment": 2},
+        pad_token_id=1, bos_token_id=0, eos_token_id=2, decoder_start_token_id=2,
+        dropout=0.0,  # Lets the few train_steps converge
+    )
+    model = BartForSequenceClassification(config)
+    if train_steps:
+        _train(model, fast_tokenizer, train_steps)
+    model.save_pretrained(path)
+    fast_tokenizer.save_pretrained(path)
+    return path
+
+
+def _train(model, tokenizer, steps):
+    import torch
+
+    # The pairs the zero-shot pipeline builds: entailment for the right label, contradiction for the other
+    premises, hypotheses, targets = [], [], []
+    for word in VOCABULARY:
+        for label in ("tampered", "original"):
+            premises.append(word)
+            hypotheses.append(f"This example is {label}.")
+            targets.append(2 if label == expected_label(word) else 0)
+    inputs = tokenizer(premises, hypotheses, return_tensors="pt", padding=True)
+    targets = torch.tensor(targets)
+
+    optimizer = torch.optim.AdamW(model.parameters(), lr=5e-4)
+    warmup = torch.optim.lr_scheduler.LambdaLR(optimizer, lambda step: min(1.0, (step + 1) / 20))
+    model.train()
+    for _ in range(steps):
+        loss = model(**inputs, labels=targets).loss
+        if loss.item() < 0.01:
+            break
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        warmup.step()
+    model.eval()
+
+
+if __name__ == "__main__":
+    print(build_tiny_model(sys.argv[1] if len(sys.argv) > 1 else "tiny-nli"))
@@ -1,16 +1,31 @@
 import imagehash
 from PIL import Image, ImageDraw, ImageFont
-import pytesseract
+import piexif
 import os
+import sys
 import cv2
 import numpy as np
 import tkinter as tk
 from tkinter import messagebox
 
+# Shared analyzers live in ../Code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Code"))
+import hash_index
+import ocr
+import word_diff
+from document import Document
+
+# Hashes this many bits apart or fewer are treated as the same picture
+# (recompression and resizing flip a few bits; real edits flip more)
+HASH_DISTANCE = 4
+# Index of verified originals to look the tampered image up in, if any
+ORIGINALS_INDEX = os.environ.get("IDP_ORIGINALS_INDEX")
+
 # Function to compute the hash of an image
 def get_image_hash(image_path):
-    image = Image.open(image_path)
-    return imagehash.average_hash(image)
+    # A Document reuses its one decode for the hash and the OCR
+    image = image_path.pil if isinstance(image_path, Document) else Image.open(image_path)
+    return imagehash.phash(image)
 
 # Function to extract EXIF metadata from an image
 def get_exif_metadata(image_path):
@@ -35,11 +50,25 @@ def compare_image_files(original_image_path, tampered_image_path):
     print(f"Original Image Hash: {original_hash}")
     print(f"Tampered Image Hash: {tampered_hash}")
     
-    if original_hash != tampered_hash:
-        return "Images are different, tampering detected based on hash!"
+    # ImageHash subtraction is the Hamming distance between the two hashes
+    distance = original_hash - tampered_hash
+    if distance > HASH_DISTANCE:
+        return f"Images are different ({distance} bits apart), tampering detected based on hash!"
+    elif distance:
+        return f"Images are near-identical based on hash ({distance} bits apart)."
     else:
         return "Images are identical based on hash."
 
+# Function to find verified originals that look like the given image
+def find_known_originals(image_path, index_path=ORIGINALS_INDEX, k=hash_index.DEFAULT_DISTANCE):
+    if not index_path or not os.path.exists(index_path):
+        return []
+    index = hash_index.HashIndex(index_path, readonly=True)
+    try:
+        return index.lookup(image_path.pil if isinstance(image_path, Document) else image_path, k=k)
+    finally:
+        index.close()
+
 # Function to compare EXIF metadata
 def compare_exif_metadata(original_image_path, tampered_image_path):
     # Get EXIF metadata for both images
@@ -51,38 +80,31 @@ def compare_exif_metadata(original_image_path, tampered_image_path):
     else:
         return "EXIF metadata is the same for both images."
 
-# Function to extract text from an image using OCR
+# Function to extract words, boxes and confidences from an image using OCR
 def extract_text_from_image(image_path):
-    image = Image.open(image_path)
-    text = pytesseract.image_to_string(image)
-    return text
+    # One cached image_to_data pass gives both the text and the word boxes
+    image = image_path if isinstance(image_path, Document) else cv2.imread(image_path)
+    return ocr.run_ocr(image, preprocess="gray")
 
-# Function to find tampered words by comparing original and tampered texts
-def find_tampered_words(original_text, tampered_text):
-    original_words = set(original_text.split())
-    tampered_words = set(tampered_text.split())
-    tampered_diff = tampered_words - original_words
-    
-    return tampered_diff
+# Function to find tampered words by aligning the original and tampered OCR word by word
+def find_tampered_words(original_ocr, tampered_ocr):
+    # Order-aware diff: repeated and moved words count, OCR noise does not.
+    # Plain strings work too, but then the changes carry no boxes.
+    diff = word_diff.diff_ocr(original_ocr, tampered_ocr)
+    return [change for change in diff["changes"] if change["op"] != "delete"]
 
 # Function to highlight tampered words in the image
 def highlight_tampered_words(original_image_path, tampered_image_path, tampered_words):
     # Open the tampered image using OpenCV
     image = cv2.imread(tampered_image_path)
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Extract text and its bounding boxes
-    h, w = image.shape[:2]
-    boxes = pytesseract.image_to_boxes(gray_image)
     
-    # Highlight the tampered words on the image
-    for b in boxes.splitlines():
-        b = b.split()
-        word = b[0]
-        
-        if word in tampered_words:
-            x, y, w1, h1 = int(b[1]), int(b[2]), int(b[3]), int(b[4])
-            cv2.rectangle(image, (x, h - y), (w1, h - h1), (0, 255, 0), 2)  # Highlight in green
+    # Each change carries the box of the word on the tampered image
+    for change in tampered_words:
+        if change["box"] is None:
+            continue
+        x, y, w, h = change["box"]
+        color = (0, 255, 0) if change["op"] == "insert" else (0, 0, 255)  # Green: added, red: altered
+        cv2.rectangle(image, (x, y), (x + w, y + h), color, 2)
     
     # Save the image with highlights
     highlighted_image_path = "highlighted_tampered_image.png"
@@ -106,21 +128,33 @@ def main():
     original_image_path = input("Enter the path of the original image: ")
     tampered_image_path = input("Enter the path of the tampered image: ")
     
+    # Decode each image once; hashing, index lookup and OCR share the decoded pages
+    original_document = Document.open(original_image_path)
+    tampered_document = Document.open(tampered_image_path)
+    
     # Compare images by hash
-    hash_comparison_result = compare_image_files(original_image_path, tampered_image_path)
+    hash_comparison_result = compare_image_files(original_document, tampered_document)
+    
+    # Look the image up among the verified originals (if an index is configured)
+    known_originals = find_known_originals(tampered_document)
+    if known_originals:
+        hash_comparison_result += "\nClosest known originals: " + ", ".join(
+            f"{match['id']} ({match['distance']} bits)" for match in known_originals[:3])
     
     # Compare EXIF metadata (if available)
     exif_comparison_result = compare_exif_metadata(original_image_path, tampered_image_path)
     
     # Extract text from both images using OCR
-    original_text = extract_text_from_image(original_image_path)
-    tampered_text = extract_text_from_image(tampered_image_path)
+    original_ocr = extract_text_from_image(original_document)
+    tampered_ocr = extract_text_from_image(tampered_document)
     
     # Find tampered words
-    tampered_words = find_tampered_words(original_text, tampered_text)
+    tampered_words = find_tampered_words(original_ocr, tampered_ocr)
     
     if tampered_words:
-        tampered_words_message = "Tampered words detected in the tampered image:\n" + "\n".join(tampered_words)
+        tampered_words_message = "Tampered words detected in the tampered image:\n" + "\n".join(
+            f"{change['original']} -> {change['word']}" if change["op"] == "replace" else f"+ {change['word']}"
+            for change in tampered_words)
     else:
         tampered_words_message = "No tampered words detected."
     
@@ -132,4 +166,5 @@ def main():
     highlight_tampered_words(original_image_path, tampered_image_path, tampered_words)
 
 # Run the program
-main()
+if __name__ == "__main__":
+    main()
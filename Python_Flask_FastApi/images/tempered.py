@@ -1,6 +1,33 @@
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import cv2
 import numpy as np
-import pytesseract
+
+# Shared analyzers live in ../Code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Code"))
+import document
+import ocr
+import pyramid
+import tiles
+from instrument import stage
+from pyramid import merge_boxes
+
+MIN_REGION_AREA = 100  # Contours smaller than this (in pixels) are noise, not edits
+MAX_REGION_RATIO = 0.5  # A region covering more of the page than this is the page background
+REGION_PADDING = 4  # Pixels added around each region before cropping
+REGION_OCR_CONFIG = "--psm 6"  # Each montage is a single uniform block of text
+REGION_BATCH_SIZE = 32  # Regions OCR'd together in one Tesseract call
+MONTAGE_GAP = 20  # White rows between stacked crops in a batch
+TILE_BYTES_PER_PIXEL = 16  # Working memory per window pixel in tiled mode: HSV copy, mask, labels
+
+# Region OCR pools by worker count, kept for the life of the process: workers
+# are spawned once and keep their OCR cache and Tesseract engines between documents
+_region_pools = {}
+_region_pools_lock = threading.Lock()
 
 def preprocess_image(image_path):
     """Preprocess the image for better analysis (grayscale and noise filtering)."""
@@ -14,8 +41,8 @@ def preprocess_image(image_path):
 
 def detect_dark_white_background(image):
     """Detect regions with dark white (light gray or off-white) backgrounds."""
-    # Convert the image to HSV color space for better detection of light/dark colors
-    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    # Convert the image to HSV color space for better detection of light/dark colors (memoized on a Document)
+    hsv_image = document.view(image, "hsv")
     
     # Define the range for light gray (dark white) color in HSV space
     # We target a range of low-saturation light colors that are darker than pure white
@@ -31,23 +58,138 @@ def extract_text_from_image(image, mask=None):
     """Extract text using OCR, optionally with a mask to focus on tampered regions."""
     if mask is not None:
         # Apply the mask to the image to focus on tampered areas
+        image = document.as_array(image)
         image = cv2.bitwise_and(image, image, mask=mask)
     
-    # Use pytesseract to perform OCR on the image (or masked image) and extract text
-    text = pytesseract.image_to_string(image)
+    # Use the shared, cached OCR layer on the image (or masked image) and extract text
+    text = ocr.image_to_text(image)
     return text.strip()
 
-def detect_tampering(image_path):
-    """Detect tampering in a single image based on dark white background anomalies."""
+def find_candidate_regions(mask, min_area=MIN_REGION_AREA, max_ratio=MAX_REGION_RATIO, padding=REGION_PADDING):
+    """Bounding boxes of mask contours, filtered by area and merged where they overlap."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    blobs = ((cv2.contourArea(contour), cv2.boundingRect(contour)) for contour in contours)
+    return _candidate_boxes(blobs, mask.shape, min_area, max_ratio, padding)
+
+def _candidate_boxes(blobs, shape, min_area, max_ratio, padding):
+    """Padded, merged boxes of (area, (x, y, w, h)) blobs that are neither specks nor page background."""
+    height, width = shape[:2]
+    boxes = []
+    for area, (x, y, w, h) in blobs:
+        if area < min_area:
+            continue
+        if w * h > max_ratio * width * height:
+            continue
+        x1, y1 = max(x - padding, 0), max(y - padding, 0)
+        x2, y2 = min(x + w + padding, width), min(y + h + padding, height)
+        boxes.append((x1, y1, x2 - x1, y2 - y1))
+
+    return merge_boxes(boxes)
+
+def _ocr_montage(crops):
+    """OCR a batch of crops with one Tesseract call (see ocr.ocr_crops)."""
+    return ocr.ocr_crops(crops, config=REGION_OCR_CONFIG, gap=MONTAGE_GAP)
+
+def _region_pool(workers):
+    with _region_pools_lock:
+        pool = _region_pools.get(workers)
+        if pool is None:
+            pool = _region_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+def ocr_regions(image, boxes, batch_size=REGION_BATCH_SIZE, workers=0):
+    """
+    OCR only the cropped regions, `batch_size` crops per Tesseract call,
+    optionally spread over a process pool of `workers` (reused between
+    calls). Returns [{"bbox", "text"}].
+    """
+    image = document.as_array(image)
+    crops = [image[y:y + h, x:x + w] for x, y, w, h in boxes]
+    batches = [crops[i:i + batch_size] for i in range(0, len(crops), batch_size)]
+
+    if workers and len(batches) > 1:
+        pool = _region_pool(workers)
+        try:
+            batch_texts = list(pool.map(_ocr_montage, batches))
+        except BrokenProcessPool:
+            # A worker died: the next call starts a fresh pool
+            with _region_pools_lock:
+                if _region_pools.get(workers) is pool:
+                    del _region_pools[workers]
+            raise
+    else:
+        batch_texts = [_ocr_montage(batch) for batch in batches]
+
+    texts = [text for batch in batch_texts for text in batch]
+    return [{"bbox": tuple(int(v) for v in box), "text": text} for box, text in zip(boxes, texts)]
+
+def dark_white_regions(image, min_area=MIN_REGION_AREA, scale=pyramid.DEFAULT_SCALE):
+    """
+    Candidate boxes of dark-white background, in full-resolution coordinates.
+    With scale < 1 the colour mask is built on a downscaled copy first and
+    only candidate areas are re-masked at full resolution (see pyramid.py).
+    """
+    # Page-sized background is dropped at the coarse level too, exactly as at full resolution
+    scale = pyramid.snap_scale(scale)
+    candidates = lambda coarse: find_candidate_regions(coarse, min_area=min_area * scale * scale * 0.5, padding=0)
+    mask = pyramid.coarse_to_fine_mask(image, detect_dark_white_background, candidates, scale=scale)
+    return find_candidate_regions(mask, min_area=min_area)
+
+def dark_white_regions_tiled(image, min_area=MIN_REGION_AREA, budget_mb=tiles.TILE_BUDGET_MB):
+    """
+    dark_white_regions with bounded memory for very large pages: the colour
+    mask is built and labelled one tile at a time and blobs crossing tile
+    seams are merged (see tiles.py). The mask is per pixel, so tiles need
+    no overlap. A blob's area is its pixel count rather than its contour
+    area, which leaves out holes such as the text on a patch.
+    """
+    image = document.as_array(image)
+    height, width = image.shape[:2]
+    merger = tiles.SeamMerger(height, width)
+    tile = tiles.tile_size(TILE_BYTES_PER_PIXEL, overlap=1, budget_mb=budget_mb)
+    for core, window in tiles.grid(height, width, tile, overlap=1):
+        x1, y1, x2, y2 = window
+        merger.add(core, window, detect_dark_white_background(image[y1:y2, x1:x2]) > 0)
+    blobs = ((blob["area"], (blob["x1"], blob["y1"], blob["x2"] - blob["x1"], blob["y2"] - blob["y1"]))
+             for blob in merger.components())
+    return _candidate_boxes(blobs, image.shape, min_area, MAX_REGION_RATIO, REGION_PADDING)
+
+def detect_tampered_regions(image, min_area=MIN_REGION_AREA, batch_size=REGION_BATCH_SIZE, workers=0,
+                            scale=pyramid.DEFAULT_SCALE):
+    """
+    Dark-white background regions of an image with the text OCR'd from each one.
+    Pages above tiles.TILE_THRESHOLD_MP are masked tile by tile.
+    """
+    with stage("tamper.regions"):
+        if tiles.should_tile(*image.shape[:2]):
+            boxes = dark_white_regions_tiled(image, min_area=min_area)
+        else:
+            boxes = dark_white_regions(image, min_area=min_area, scale=scale)
+    with stage("tamper.region_ocr"):
+        return ocr_regions(image, boxes, batch_size=batch_size, workers=workers)
+
+def detect_tampering(image_path, region_ocr=True, min_area=MIN_REGION_AREA, workers=0):
+    """
+    Detect tampering in a single image based on dark white background anomalies.
+    By default only the cropped candidate regions are OCR'd (region_ocr=True);
+    region_ocr=False keeps the old masked OCR per contour, on the contour's bounding box.
+    """
     try:
-        # Preprocess the image
-        image = cv2.imread(image_path)
-        
-        # Detect dark white background regions (potential tampered areas)
-        dark_white_background_mask = detect_dark_white_background(image)
+        # Accepts a path, an already decoded BGR image (e.g. a rasterized PDF page) or a Document
+        with stage("tamper.decode"):
+            image = cv2.imread(image_path) if isinstance(image_path, str) else image_path
+        if image is None:
+            raise FileNotFoundError(f"Error: The image at {image_path} could not be loaded. Please check the path.")
         
-        # Find contours of the dark white background regions
-        contours, _ = cv2.findContours(dark_white_background_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if region_ocr:
+            regions = detect_tampered_regions(image, min_area=min_area, workers=workers)
+            contours = [region["bbox"] for region in regions]
+        else:
+            # Detect dark white background regions (potential tampered areas)
+            dark_white_background_mask = detect_dark_white_background(image)
+            
+            # Find contours of the dark white background regions
+            contours, _ = cv2.findContours(dark_white_background_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         tampered_words = []  # List to store potentially tampered words
         
@@ -57,22 +199,30 @@ def detect_tampering(image_path):
             print(f"Number of tampered regions found: {len(contours)}")
             
             # Extract original text from the full image
-            original_text = extract_text_from_image(image)
+            with stage("tamper.full_ocr"):
+                original_text = extract_text_from_image(image)
             print("Original Text Extracted: ", original_text)
             
             # Extract text from tampered regions based on detected dark white background
             tampered_texts = []
-            for contour in contours:
-                # Create a mask for each tampered region
-                mask = np.zeros(image.shape[:2], dtype=np.uint8)
-                cv2.drawContours(mask, [contour], -1, 255, -1)
-                
-                # Extract the region of interest (ROI) based on the contour
-                tampered_text = extract_text_from_image(image, mask)
-                
-                if tampered_text.strip():  # Check if any text was found in the tampered region
-                    tampered_texts.append(tampered_text)
-                    print(f"Tampered Region Text: {tampered_text}")
+            if region_ocr:
+                for region in regions:
+                    if region["text"].strip():
+                        tampered_texts.append(region["text"])
+                        print(f"Tampered Region Text {region['bbox']}: {region['text']}")
+            else:
+                for contour in contours:
+                    # Create a mask for each tampered region, only as large as its bounding box
+                    x, y, w, h = cv2.boundingRect(contour)
+                    mask = np.zeros((h, w), dtype=np.uint8)
+                    cv2.drawContours(mask, [contour], -1, 255, -1, offset=(-x, -y))
+                    
+                    # Extract the region of interest (ROI) based on the contour
+                    tampered_text = extract_text_from_image(document.as_array(image)[y:y + h, x:x + w], mask)
+                    
+                    if tampered_text.strip():  # Check if any text was found in the tampered region
+                        tampered_texts.append(tampered_text)
+                        print(f"Tampered Region Text: {tampered_text}")
             
             # Find anomalies in extracted text (detecting outliers)
             if tampered_texts:
@@ -105,10 +255,11 @@ def detect_tampering(image_path):
         return False
 
 # Example usage:
-image_path = input("Enter the path to the image: ")  # Path to the potentially tampered image
+if __name__ == "__main__":
+    image_path = input("Enter the path to the image: ")  # Path to the potentially tampered image
 
-# Check if tampering is detected
-is_tampered = detect_tampering(image_path)
+    # Check if tampering is detected
+    is_tampered = detect_tampering(image_path)
 
-# Close any open windows after processing
-cv2.destroyAllWindows()
+    # Close any open windows after processing
+    cv2.destroyAllWindows()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules are imported by bare name, as the app and the benchmarks do
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Code"))
+sys.path.insert(0, os.path.join(ROOT, "images"))
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import hash_index
+
+
+def random_hashes(rng, count):
+    return {kind: rng.integers(0, 2 ** 64, count, dtype=np.uint64) for kind in hash_index.HASH_KINDS}
+
+
+def near(rng, value, bits):
+    # Flip `bits` distinct bits of one packed hash
+    for bit in rng.choice(64, bits, replace=False):
+        value ^= np.uint64(1) << np.uint64(bit)
+    return value
+
+
+def brute_force(index, query, k, kind=hash_index.DEFAULT_KIND):
+    distances = [bin(int(value) ^ int(query)).count("1") for value in index.hashes(kind)]
+    return sorted((index.ids[row], distance) for row, distance in enumerate(distances) if distance <= k)
+
+
+def found(index, query, k):
+    return sorted((match["id"], match["distance"]) for match in index.search(query, k=k, limit=len(index)))
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    # Small sizes so the chunk tables, the tail and its merge are all used
+    monkeypatch.setattr(hash_index, "LINEAR_SCAN_SIZE", 0)
+    monkeypatch.setattr(hash_index, "TAIL_MERGE_SIZE", 64)
+
+
+@pytest.mark.parametrize("k", [0, 3, 8, 11])
+def test_search_equals_brute_force(tables, k):
+    rng = np.random.default_rng(k)
+    index = hash_index.HashIndex()
+    hashes = random_hashes(rng, 2000)
+    index.add_many([f"bulk{row}" for row in range(2000)], hashes)
+    # Single inserts land in the tail, then get merged into the tables
+    phash = hashes[hash_index.DEFAULT_KIND]
+    for row in range(300):
+        base = phash[rng.integers(len(phash))]
+        index.add(f"near{row}", hashes={kind: int(near(rng, base, rng.integers(0, 12))) for kind in hash_index.HASH_KINDS})
+    assert index._sorted_size < len(index)  # Part of it still in the tail
+
+    for query in list(phash[:20]) + [near(rng, value, 5) for value in phash[20:40]]:
+        assert found(index, query, k) == brute_force(index, query, k)
+
+
+def test_merged_tables_equal_a_rebuild(tables):
+    rng = np.random.default_rng(1)
+    index = hash_index.HashIndex()
+    index.add_many([str(row) for row in range(500)], random_hashes(rng, 500))
+    for row in range(200):
+        index.add(f"new{row}", hashes={kind: int(value[0]) for kind, value in random_hashes(rng, 1).items()})
+    index._update_tables()
+    merged = {kind: [array.copy() for array in table] for kind, table in index._tables.items()}
+    index._build_tables()
+    for kind in hash_index.HASH_KINDS:
+        for merged_array, rebuilt_array in zip(merged[kind], index._tables[kind]):
+            np.testing.assert_array_equal(merged_array, rebuilt_array)
+
+
+def test_journal_replays_inserts_after_the_snapshot(tmp_path):
+    rng = np.random.default_rng(2)
+    path = str(tmp_path / "originals.npz")
+    index = hash_index.HashIndex(path)
+    index.add_many(["a", "b"], random_hashes(rng, 2))
+    index.save()
+    hashes = {kind: int(value[0]) for kind, value in random_hashes(rng, 1).items()}
+    index.add("c", hashes=hashes)
+    index.close()
+
+    reopened = hash_index.HashIndex(path, readonly=True)
+    assert reopened.ids == ["a", "b", "c"]
+    assert reopened.search(hashes[hash_index.DEFAULT_KIND], k=0) == [{"id": "c", "distance": 0}]
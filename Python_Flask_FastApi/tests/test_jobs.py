@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+import jobs
+
+LEASE = 0.05
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setitem(jobs.ANALYZERS, "echo", lambda data, report: {"length": len(data)})
+    return jobs.JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=LEASE, max_attempts=3)
+
+
+def test_submit_deduplicates_the_same_bytes(store):
+    job_id, deduplicated = store.submit(b"page", "echo")
+    assert not deduplicated
+    assert store.submit(b"page", "echo") == (job_id, True)
+    assert store.submit(b"other page", "echo")[0] != job_id
+    with pytest.raises(ValueError):
+        store.submit(b"page", "no such analyzer")
+
+
+def test_expired_lease_is_claimed_again_until_max_attempts(store):
+    job_id, _ = store.submit(b"page", "echo")
+    for attempt in range(1, 4):
+        job = store.claim(f"worker{attempt}")
+        assert job["id"] == job_id
+        assert store.get(job_id)["attempts"] == attempt
+        assert store.claim("other") is None  # Leased: nobody else gets it
+        time.sleep(LEASE * 2)  # The worker dies without renewing its lease
+
+    assert store.claim("worker4") is None
+    job = store.get(job_id)
+    assert (job["status"], job["error"]) == ("failed", "Worker crashed or timed out")
+    # Submitting a failed job again queues it afresh
+    assert store.submit(b"page", "echo") == (job_id, True)
+    assert store.claim("worker5")["id"] == job_id
+
+
+def test_heartbeat_keeps_the_lease(store):
+    job_id, _ = store.submit(b"page", "echo")
+    store.claim("worker")
+    for _ in range(4):
+        time.sleep(LEASE / 2)
+        store.heartbeat(job_id, "worker")
+    assert store.claim("other") is None
+    assert store.get(job_id)["attempts"] == 1
+
+
+def test_failures_are_retried_then_recorded(store):
+    job_id, _ = store.submit(b"page", "echo")
+    for attempt in range(1, 4):
+        store.claim("worker")
+        assert store.fail(job_id, "worker", f"OSError: attempt {attempt}")
+    job = store.get(job_id)
+    assert (job["status"], job["error"]) == ("failed", "OSError: attempt 3")
+    assert store.claim("worker") is None
+
+
+def test_permanent_errors_are_not_retried(store, monkeypatch):
+    def undecodable(data, report):
+        raise ValueError("Could not decode the upload")
+
+    monkeypatch.setitem(jobs.ANALYZERS, "undecodable", undecodable)
+    job_id, _ = store.submit(b"junk", "undecodable")
+    jobs.run_worker(store.db_path, worker="test", stop_when_idle=True)
+    job = store.get(job_id)
+    assert (job["status"], job["attempts"]) == ("failed", 1)
+    assert job["error"] == "ValueError: Could not decode the upload"
+
+
+def test_a_lapsed_worker_cannot_overwrite_the_new_attempt(store):
+    job_id, _ = store.submit(b"page", "echo")
+    store.claim("slow")
+    time.sleep(LEASE * 2)
+    store.claim("fresh")
+    assert not store.complete(job_id, "slow", {"length": 0})
+    assert not store.fail(job_id, "slow", "TimeoutError: too late")
+    job = store.get(job_id)
+    assert (job["status"], job["worker"], job["attempts"], job["result"]) == ("running", "fresh", 2, None)
+    assert store.complete(job_id, "fresh", {"length": 4})
+    assert store.get(job_id)["result"] == {"length": 4}
+
+
+def test_worker_runs_jobs_by_priority(store):
+    low, _ = store.submit(b"low", "echo", priority=0)
+    high, _ = store.submit(b"high!", "echo", priority=5)
+    assert store.claim("worker")["id"] == high
+    store.complete(high, "worker", {"length": 5})
+    jobs.run_worker(store.db_path, worker="test", stop_when_idle=True)
+    assert store.get(low)["result"] == {"length": 3}
+    assert store.counts() == {"done": 2}
+    assert [event["status"] for event in store.events(low)] == ["queued", "running", "done"]
@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+import pytest
+
+import jpeg_forensics
+
+EDIT = (200, 200, 456, 328)  # x1, y1, x2, y2 of the retyped patch
+
+
+def encode(image, ext=".jpg", quality=95):
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext == ".jpg" else []
+    return cv2.imencode(ext, image, params)[1].tobytes()
+
+
+def page(seed):
+    rng = np.random.default_rng(seed)
+    image = cv2.GaussianBlur((rng.normal(0, 25, (640, 640, 3)) + 200).clip(0, 255).astype(np.uint8), (5, 5), 0)
+    for line in range(30):
+        cv2.putText(image, "Account 12,450.00 Ravi", (10, 20 + line * 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20, 20, 20), 1)
+    return image
+
+
+def edited(image):
+    """Saved at 70, a figure pasted over and retyped, saved again at 95."""
+    first = cv2.imdecode(np.frombuffer(encode(image, quality=70), np.uint8), cv2.IMREAD_COLOR)
+    x1, y1, x2, y2 = EDIT
+    first[y1:y2, x1:x2] = 230
+    cv2.putText(first, "99,999.00", (x1 + 10, y1 + 80), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (20, 20, 20), 2)
+    return encode(first, quality=95)
+
+
+@pytest.mark.parametrize("first_step, step", [(10, 4), (7, 3), (12, 5), (5, 2)])
+def test_estimator_finds_the_first_step(first_step, step):
+    rng = np.random.default_rng(first_step)
+    coefficients = rng.laplace(0, 15, 50000)
+
+    def histogram(values):
+        bins = np.clip(values, -jpeg_forensics.HISTOGRAM_RANGE, jpeg_forensics.HISTOGRAM_RANGE)
+        return np.bincount(bins + jpeg_forensics.HISTOGRAM_RANGE, minlength=2 * jpeg_forensics.HISTOGRAM_RANGE + 1)
+
+    double = np.rint(np.rint(coefficients / first_step) * first_step / step).astype(int)
+    single = np.rint(coefficients / step).astype(int)
+    evidence, found = jpeg_forensics.estimate_first_step(histogram(double), step)
+    assert found == first_step
+    assert jpeg_forensics.estimate_first_step(histogram(single), step)[0] < evidence / 10
+
+
+@pytest.mark.parametrize("quality", [50, 70, 95])
+def test_quality_is_read_from_the_tables(quality):
+    header = jpeg_forensics.parse_jpeg(encode(page(0), quality=quality))
+    table = header["tables"][header["components"][0]["table"]]
+    assert jpeg_forensics.estimate_quality(table) == quality
+    assert (header["width"], header["height"]) == (640, 640)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_retyped_patch_is_found(seed):
+    result = jpeg_forensics.analyze_source(edited(page(seed)))
+    assert result["double_compressed"]
+    assert result["quality"] == 95
+    assert result["tampered_regions"]
+    x1, y1, x2, y2 = EDIT
+    for region in result["tampered_regions"]:
+        assert x1 <= region["x1"] < region["x2"] <= x2 and y1 <= region["y1"] < region["y2"] <= y2
+
+
+def test_single_save_is_clean():
+    result = jpeg_forensics.analyze_source(encode(page(0)))
+    assert not result["double_compressed"]
+    assert result["tampered_regions"] == []
+
+
+def test_rejects_anything_but_a_jpeg():
+    with pytest.raises(ValueError):
+        jpeg_forensics.analyze_source(encode(page(0), ".png"))
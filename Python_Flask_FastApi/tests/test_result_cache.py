@@ -0,0 +1,15 @@
+import result_cache
+
+
+def test_deterministic_answers_are_cached_and_transient_failures_are_not(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / "results.sqlite3"))
+    no_barcode = {"error": "No barcode detected", "status": "failure"}
+    ocr_failed = {"status": "success", "verification": {"error": "OCR failed: tesseract is not installed"}}
+    check_failed = {"verdict": "original", "errors": {"hash": "OSError: no index"}}
+    clean = {"verdict": "original", "errors": {}}
+    for name, value in [("a", no_barcode), ("b", ocr_failed), ("c", check_failed), ("d", clean)]:
+        cache.put(result_cache.make_key(name.encode(), "barcode"), "barcode", value)
+
+    reopened = result_cache.ResultCache(str(tmp_path / "results.sqlite3"))
+    stored = {name: reopened.get(result_cache.make_key(name.encode(), "barcode")) for name in "abcd"}
+    assert stored == {"a": no_barcode, "b": None, "c": None, "d": clean}
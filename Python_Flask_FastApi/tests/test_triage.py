@@ -0,0 +1,97 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import triage
+
+PAGE = cv2.imencode(".png", np.full((32, 32, 3), 255, np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    """Fake checks a..d returning the findings in `findings`; `ran` lists the ones called."""
+    findings, ran = {}, []
+
+    def check(name):
+        def run(document, options):
+            ran.append(name)
+            finding = findings.get(name, {})
+            if isinstance(finding, Exception):
+                raise finding
+            return dict(finding, verdict=finding.get("verdict"), confidence=finding.get("confidence", 0.0))
+        return run
+
+    monkeypatch.setattr(triage, "STAGES", {name: check(name) for name in "abcd"})
+    monkeypatch.setattr(triage, "ESTIMATED_SECONDS", {name: 1.0 for name in "abcd"})
+    return findings, ran
+
+
+POLICIES = {"test": {"stages": ["a", "b", "c", "d"], "tampered": 0.85, "original": 0.95}}
+
+
+def test_stops_at_the_first_sure_verdict(checks):
+    findings, ran = checks
+    findings["b"] = {"verdict": "tampered", "confidence": 0.9}
+    findings["c"] = {"verdict": "original", "confidence": 0.99}
+    result = triage.triage(PAGE, "test", POLICIES)
+    assert ran == ["a", "b"]
+    assert (result["verdict"], result["confidence"], result["decided_by"]) == ("tampered", 0.9, "b")
+    assert result["skipped"] == ["c", "d"]
+    assert result["errors"] == {}
+    assert [check["check"] for check in result["checks"]] == ["a", "b"]
+
+
+def test_confidences_combine_noisy_or(checks):
+    findings, ran = checks
+    findings["a"] = {"verdict": "tampered", "confidence": 0.6}
+    findings["b"] = {"verdict": "tampered", "confidence": 0.5}  # 1 - 0.4 * 0.5 = 0.8: not yet sure
+    findings["c"] = {"verdict": "tampered", "confidence": 0.5}  # 1 - 0.4 * 0.5 * 0.5 = 0.9
+    result = triage.triage(PAGE, "test", POLICIES)
+    assert ran == ["a", "b", "c"]
+    assert (result["verdict"], result["confidence"], result["decided_by"]) == ("tampered", 0.9, "c")
+
+
+def test_undecided_runs_every_check_and_survives_errors(checks):
+    findings, ran = checks
+    findings["a"] = RuntimeError("no index")
+    findings["c"] = {"verdict": "original", "confidence": 0.5}
+    result = triage.triage(PAGE, "test", POLICIES)
+    assert ran == ["a", "b", "c", "d"]
+    assert result["checks"][0]["error"] == "RuntimeError: no index"
+    assert result["errors"] == {"a": "RuntimeError: no index"}
+    assert (result["verdict"], result["decided_by"], result["skipped"]) == ("original", None, [])
+
+
+def test_summarize_prices_skipped_checks(checks):
+    findings, _ = checks
+    findings["a"] = {"verdict": "tampered", "confidence": 0.9}
+    result = triage.triage(PAGE, "test", POLICIES)
+    result["checks"][0]["seconds"] = 0.5
+    summary = triage.summarize([result])
+    assert summary["spent_s"] == 0.5
+    assert summary["checks_skipped"] == {"a": 0, "b": 1, "c": 1, "d": 1}
+    assert summary["estimated_costs"] == ["b", "c", "d"]
+    assert (summary["saved_s"], summary["saved_fraction"]) == (3.0, round(3 / 3.5, 4))
+
+
+def test_unknown_doc_type_and_stages_are_rejected(checks, tmp_path):
+    with pytest.raises(ValueError):
+        triage.triage(PAGE, "passport", POLICIES)
+    policy_file = tmp_path / "policies.json"
+    policy_file.write_text(json.dumps({"test": {"stages": ["a", "ocr"], "tampered": 0.8, "original": 0.9}}))
+    with pytest.raises(ValueError):
+        triage.load_policies(str(policy_file))
+
+
+def test_cache_params_follow_the_index_and_policies(tmp_path):
+    index, policy_file = tmp_path / "originals.npz", tmp_path / "policies.json"
+    policy_file.write_text("{}")
+    before = triage.cache_params("id_card", str(index), str(policy_file))
+    assert before["doc_type"] == "id_card" and "originals" not in before
+    index.write_bytes(b"snapshot")
+    with_index = triage.cache_params("id_card", str(index), str(policy_file))
+    assert "originals" in with_index
+    policy_file.write_text('{"id_card": {}}')
+    assert triage.cache_params("id_card", str(index), str(policy_file))["policies"] != with_index["policies"]
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+import word_diff
+
+
+def apply_opcodes(original, tampered, opcodes):
+    """Rebuild the target from the source and the opcodes, checking they tile both sides."""
+    result, i, j = [], 0, 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == "equal":
+            assert [word_diff.normalize(w) for w in original[i1:i2]] == \
+                   [word_diff.normalize(w) for w in tampered[j1:j2]]
+            result.extend(tampered[j1:j2])
+        elif tag in ("replace", "insert"):
+            result.extend(tampered[j1:j2])
+        i, j = i2, j2
+    assert (i, j) == (len(original), len(tampered))
+    return result
+
+
+def mutate(words, rng, edits):
+    words = list(words)
+    for _ in range(edits):
+        position = rng.randrange(len(words) + 1)
+        action = rng.choice(("insert", "delete", "replace"))
+        if action == "insert" or not words:
+            words.insert(position, rng.choice(("total", "12,450.00", "name", "x")))
+        elif action == "delete" and position < len(words):
+            del words[position]
+        elif position < len(words):
+            words[position] = str(rng.randrange(10000))
+    return words
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_opcodes_reconstruct_the_target(seed):
+    rng = random.Random(seed)
+    vocabulary = ["account", "balance", "date", "the", "of", "amount", "rs", "credit", "debit", "1,000"]
+    original = [rng.choice(vocabulary) for _ in range(rng.randrange(0, 300))]
+    tampered = mutate(original, rng, rng.randrange(0, 20))
+    assert apply_opcodes(original, tampered, word_diff.diff_words(original, tampered)) == tampered
+
+
+def test_myers_gives_up_into_one_replacement(monkeypatch):
+    # No unique anchors and more edits than MAX_EDITS: the gap is reported as one replacement
+    monkeypatch.setattr(word_diff, "MAX_EDITS", 2)
+    original, tampered = ["a", "b", "c"] * 4, ["c", "b", "a"] * 4
+    assert word_diff.diff_words(original, tampered) == [("replace", 0, 12, 0, 12)]
+
+
+def test_diff_ocr_reports_digit_changes_but_not_ocr_noise():
+    result = word_diff.diff_ocr("Total amount 1,250.00 paid", "Tota1 amount 7,250.00 paid")
+    assert [(change["op"], change["original"], change["word"]) for change in result["changes"]] == \
+           [("replace", "1,250.00", "7,250.00")]
+    assert result["fuzzy_matched"] == 1